@@ -8,9 +8,11 @@ Testing Knuth's 1976 algorithm.
 """
 
 import json
-# For checking runtime:
+import os
+import itertools
+import math
 import time
-starttime = time.time()
+from concurrent.futures import ProcessPoolExecutor
 
 def make_code(pegs = 4, colors = 6):
     """
@@ -69,57 +71,351 @@ def make_possible_keys(pegs=4, colors=6):
 
 
 
+def iterate_full_samplespace(pegs=4, colors=6):
+    """
+    Given number of pegs and colors, generates the codes (lists) of the full sample space
+    one at a time and in the order of make_full_samplespace (i.e., lexicographically)
+    """
+    for code in itertools.product(range(colors), repeat=pegs):
+        yield list(code)
+
+
 def make_full_samplespace(pegs=4, colors=6):
     """
     Given number of pegs and colors, returns full sample space as list of lists
     (i.e., what the hidden code may be at beginning of game)
     """
-    # the samplespace will be constructed stepwise:
-    # always with the right number of colors, but first with 0 pegs,
-    # then 1 peg, then 2 pegs, then 3 pegs, etc.
-    # make initial samplespace (corresponding to pegs = 1)
-    samplespace = [[color] for color in range(colors)]
-    # do while samplespace corresponds to too few pegs:
-    while len(samplespace[0])< pegs:
-        size = len(samplespace) # number of codes in current samplespace
-        # increase current samplespace to one for 1 more number of pegs:
-        for repeats in range(size): # do 'size' times, i.e., for each code in current samplespace
-            code = samplespace.pop(0) # remove the (now) first code 
-            for color in range(colors): #  make 'colors' new codes with one more peg
-                # by adding the different colors at the end of the code and then adding them to the samplespace
-                samplespace.append(code + [color])
-    return samplespace
+    return list(iterate_full_samplespace(pegs, colors))
+
+
+class LazySamplespace:
+    """
+    The full sample space for given number of pegs and colors without storing the codes
+    Supports len, iteration (in the order of make_full_samplespace), access by code number
+    (cf. code_to_int), and 'in', so it can be used instead of the list of all codes
+    """
+    def __init__(self, pegs=4, colors=6):
+        self.pegs = pegs
+        self.colors = colors
+
+    def __len__(self):
+        return self.colors**self.pegs
+
+    def __iter__(self):
+        return iterate_full_samplespace(self.pegs, self.colors)
+
+    def __getitem__(self, number):
+        if isinstance(number, slice):
+            return [int_to_code(index, self.pegs, self.colors) for index in range(*number.indices(len(self)))]
+        if number < 0:
+            number += len(self)
+        if not 0 <= number < len(self):
+            raise IndexError('code number out of range')
+        return int_to_code(number, self.pegs, self.colors)
+
+    def __contains__(self, code):
+        return len(code) == self.pegs and all(0 <= color < self.colors for color in code)
+
+    def index(self, code):
+        if code not in self:
+            raise ValueError('{} is not a code'.format(code))
+        return code_to_int(code, self.colors)
+
+# from this number of codes on, test_game_randomized doesn't keep a list of all codes
+LAZY_SAMPLESPACE_SIZE = 10**5
+
+
+def code_to_int(code, colors=6):
+    """
+    Returns the number of a code, i.e., its index in make_full_samplespace
+    (the code read as a number in base 'colors' with the first peg as the most significant digit)
+    """
+    number = 0
+    for color in code:
+        number = number*colors + color
+    return number
+
+
+def int_to_code(number, pegs=4, colors=6):
+    """
+    Returns the code (list) with the given number, cf. code_to_int
+    """
+    code = [0]*pegs
+    for index in range(pegs-1, -1, -1):
+        number, code[index] = divmod(number, colors)
+    return code
     
 
-def maximal_error(guess, samplespace, possible_keys):
+def make_key_table(pegs=4, colors=6):
     """
-    For determining the best guess (using Knuth's algorithm)
-    The function that for a given guess calculates the maximal error (i.e., size 
-    of preimage of a given key) associated with it relative to a given samplespace
+    Returns the keys for all pairs of codes as a bytearray of length n*n (n = colors**pegs),
+    where the entry at code*n + guess is the index in make_possible_keys of calculate_key(code, guess)
+    and codes are numbered as in code_to_int (about 1.7 MB for the standard game)
     """
-    maximum = 0
+    full_samplespace = make_full_samplespace(pegs, colors)
+    key_index = {key: index for index, key in enumerate(make_possible_keys(pegs, colors))}
+    n = len(full_samplespace)
+    key_table = bytearray(n*n)
+    for code_number, code in enumerate(full_samplespace):
+        for guess_number in range(code_number, n): # keys are symmetric in code and guess
+            index = key_index[calculate_key(code, full_samplespace[guess_number])]
+            key_table[code_number*n + guess_number] = index
+            key_table[guess_number*n + code_number] = index
+    return key_table
+
+
+def key_table_row(guess, key_table):
+    """
+    Returns the keys (as indices in make_possible_keys) of all codes against the guess (a number),
+    i.e., the row of the key table belonging to the guess
+    """
+    n = math.isqrt(len(key_table))
+    return memoryview(key_table)[guess*n:(guess+1)*n]
+
+
+def make_partition_index(key_table, possible_keys):
+    """
+    Returns the partitionings of the full samplespace given by all guesses as bitsets:
+    entry [guess][key] is an int with bit no. code set when the code (a number) gives the key
+    (an index in possible_keys) against the guess, so narrowing a samplespace (as a bitset)
+    after a guess is a single &, and its size is a bit count
+    """
+    n = math.isqrt(len(key_table))
+    partition_index = []
+    for guess in range(n):
+        row = key_table_row(guess, key_table)
+        masks = [bytearray((n + 7) // 8) for key in possible_keys]
+        for code in range(n):
+            masks[row[code]][code >> 3] |= 1 << (code & 7)
+        partition_index.append([int.from_bytes(mask, 'little') for mask in masks])
+    return partition_index
+
+
+def bits_to_codes(bits):
+    """
+    Returns the list of code numbers (in increasing order) in a samplespace given as a bitset
+    """
+    codes = []
+    while bits:
+        lowest = bits & -bits
+        codes.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return codes
+
+
+def partition_sizes(guess, samplespace, possible_keys, key_table=None):
+    """
+    The partitioning of a samplespace given by a guess: returns the list of the sizes
+    of the preimages of the keys (in the order of possible_keys)
+    If a key table (cf. make_key_table) is given, the guess and the codes in the samplespace are numbers
+    """
+    if key_table is not None:
+        row = key_table_row(guess, key_table)
+        partitioning = [0]*len(possible_keys)
+        for code in samplespace:
+            partitioning[row[code]] += 1
+        return partitioning
     partitioning = {key:0 for key in possible_keys}
     # for each possible key, we count the number of codes in samplespace that
     # is in the preimage of that key related to calculate_key(-,guess)
     for code in samplespace:
         partitioning[calculate_key(code,guess)] += 1
-    # we find the key with the largest preimage:
-    for key in possible_keys:
-        maximum = max(maximum, partitioning[key])
-    return maximum
+    return [partitioning[key] for key in possible_keys]
+
+
+def maximal_error(guess, samplespace, possible_keys, key_table=None, bound=None):
+    """
+    For determining the best guess (using Knuth's algorithm)
+    The function that for a given guess calculates the maximal error (i.e., size 
+    of preimage of a given key) associated with it relative to a given samplespace
+    If a key table (cf. make_key_table) is given, the guess and the codes in the samplespace are numbers
+    If a bound is given, counting stops as soon as a preimage reaches it, and then the returned number
+    is the bound (so the max error is at least the bound) rather than the max error
+    """
+    if bound is None:
+        # we find the key with the largest preimage:
+        return max(partition_sizes(guess, samplespace, possible_keys, key_table))
+    if key_table is not None:
+        row = key_table_row(guess, key_table)
+        partitioning = [0]*len(possible_keys)
+        for code in samplespace:
+            key = row[code]
+            partitioning[key] += 1
+            if partitioning[key] >= bound:
+                return bound
+        return max(partitioning)
+    partitioning = {key:0 for key in possible_keys}
+    for code in samplespace:
+        key = calculate_key(code, guess)
+        partitioning[key] += 1
+        if partitioning[key] >= bound:
+            return bound
+    return max(partitioning.values())
+
+
+def bounded_best_guess(candidates, samplespace, possible_keys, key_table=None):
+    """
+    Returns the guess among the candidates chosen by Knuth's algorithm together with its max error
+    (the same as looping through all the candidates in order, cf. best_guess), but with branch and bound:
+    the candidates in the samplespace are tried first, a candidate is dropped as soon as one of its
+    preimages is as large as the best max error so far (it would lose the tie-break), and the search
+    stops once a guess reaches the smallest possible max error ceil(len(samplespace)/no. of keys)
+    """
+    if isinstance(samplespace, (LazySamplespace, range)):
+        # these answer 'in' without listing their codes:
+        is_member = samplespace.__contains__
+    elif key_table is not None:
+        members = set(samplespace)
+        is_member = members.__contains__
+    else:
+        members = set(map(tuple, samplespace))
+        is_member = lambda guess: tuple(guess) in members
+    lower_bound = -(-len(samplespace) // len(possible_keys))
+    # the first guess with the smallest max error among the samplespace:
+    result = None
+    max_error = float('inf')
+    for guess in candidates:
+        if is_member(guess):
+            error = maximal_error(guess, samplespace, possible_keys, key_table, max_error)
+            if error < max_error:
+                result = guess
+                max_error = error
+                if max_error <= lower_bound:
+                    return result, max_error
+    # a guess outside the samplespace is only chosen if its max error is smaller:
+    for guess in candidates:
+        if not is_member(guess):
+            error = maximal_error(guess, samplespace, possible_keys, key_table, max_error)
+            if error < max_error:
+                result = guess
+                max_error = error
+                if max_error <= lower_bound:
+                    break
+    return result, max_error
+
+
+# Strategies for choosing the guess: each reduces the partition sizes of a guess
+# to a score, and the guess with the smallest score is chosen
+
+def knuth_score(sizes):
+    """
+    Knuth's min-max: the size of the largest preimage (the max error)
+    """
+    return max(sizes)
+
+def expected_size_score(sizes):
+    """
+    The expected size of the next samplespace (times the size of the current one)
+    """
+    return sum(size*size for size in sizes)
+
+def entropy_score(sizes):
+    """
+    Minus the entropy of the partitioning (times the size of the samplespace, plus a constant)
+    """
+    return sum(size*math.log(size) for size in sorted(sizes) if size > 0)
+
+def most_parts_score(sizes):
+    """
+    Minus the number of non-empty preimages
+    """
+    return -sum(1 for size in sizes if size > 0)
 
+STRATEGIES = {'knuth': knuth_score, 'expected size': expected_size_score,
+              'entropy': entropy_score, 'most parts': most_parts_score}
 
-def best_guess(samplespace, full_samplespace, possible_keys):
+
+def symmetry_classes(full_samplespace, guesses, colors=None):
+    """
+    Returns the codes that are smallest (lexicographically) in their class, where two codes
+    are in the same class if a permutation of the pegs and of the colors fixing every previous
+    guess maps one to the other. Such a permutation maps the samplespace to itself, so codes
+    in the same class have the same max error and are all in the samplespace or all not.
+    """
+    pegs = len(full_samplespace[0])
+    if colors is None:
+        colors = full_samplespace[-1][0] + 1
+    used = set(color for guess in guesses for color in guess)
+    unused = [color for color in range(colors) if color not in used] # colors that can be permuted freely
+    # find the permutations of the pegs that (together with a permutation of the used colors) fix every guess:
+    symmetries = []
+    for permutation in itertools.permutations(range(pegs)):
+        recoloring = {}
+        for guess in guesses:
+            for index in range(pegs):
+                if recoloring.setdefault(guess[index], guess[permutation[index]]) != guess[permutation[index]]:
+                    break
+            else:
+                continue
+            break
+        else:
+            if len(set(recoloring.values())) == len(recoloring): # a permutation of the colors
+                symmetries.append((permutation, recoloring))
+    if len(symmetries) == 1 and len(unused) < 2: # only the identity
+        return full_samplespace
+    canonical_codes = set()
+    for code in full_samplespace:
+        canonical = None
+        for permutation, recoloring in symmetries:
+            image = [0]*pegs
+            for index in range(pegs):
+                image[permutation[index]] = recoloring.get(code[index], code[index])
+            # the free colors are renamed in order of appearance:
+            renaming = {}
+            for index in range(pegs):
+                if image[index] not in used:
+                    if image[index] not in renaming:
+                        renaming[image[index]] = unused[len(renaming)]
+                    image[index] = renaming[image[index]]
+            if canonical is None or image < canonical:
+                canonical = image
+        canonical_codes.add(tuple(canonical))
+    return [list(code) for code in sorted(canonical_codes)]
+
+
+def best_guess(samplespace, full_samplespace, possible_keys, guesses=None, key_table=None, strategy='knuth'):
     """
     Returns the best guess given a current samplespace (using Knuth's algorithm)
+    together with its max error
+    With another strategy (cf. STRATEGIES), the guess with the smallest score is returned
+    together with its score; the ties are broken as in Knuth's algorithm
+    If the previous guesses are given, only one guess from each of their symmetry classes
+    is considered (cf. symmetry_classes), which gives the same result
+    If a key table (cf. make_key_table) is given, the samplespace, the previous guesses and the
+    returned guess are code numbers (while full_samplespace is still the list of all codes)
     """
+    score = STRATEGIES[strategy]
     if len(samplespace) < 3:
         return samplespace[0], None
+    elif key_table is not None:
+        colors = full_samplespace[-1][0] + 1
+        if guesses is not None:
+            candidates = [code_to_int(code, colors) for code in
+                          symmetry_classes(full_samplespace, [full_samplespace[guess] for guess in guesses], colors)]
+        else:
+            candidates = range(len(full_samplespace))
+        if strategy == 'knuth':
+            return bounded_best_guess(candidates, samplespace, possible_keys, key_table)
+        members = set(samplespace)
+        result = None
+        max_error = float('inf')
+        for guess in candidates:
+            error = score(partition_sizes(guess, samplespace, possible_keys, key_table))
+            if error < max_error:
+                max_error = error
+                result = guess
+            elif error == max_error and guess in members and result not in members:
+                result = guess
+        return result, max_error
     else:
         result = []
         max_error = float('inf')
+        if guesses is not None:
+            full_samplespace = symmetry_classes(full_samplespace, guesses)
+        if strategy == 'knuth':
+            return bounded_best_guess(full_samplespace, samplespace, possible_keys)
         for guess in full_samplespace:
-            error = maximal_error(guess, samplespace, possible_keys)
+            error = score(partition_sizes(guess, samplespace, possible_keys))
             if error < max_error:
                 max_error = error
                 result = guess
@@ -127,73 +423,399 @@ def best_guess(samplespace, full_samplespace, possible_keys):
                 result = guess
         return result, max_error
 
-# def update_samplespace(samplespace, guess, key):
-#     """
-#     Updating a samplespace given a guess and the resulting key
-#     """
-#     return [code for code in samplespace if calculate_key(code, guess) == key]
+def update_samplespace(samplespace, guess, key, key_table=None):
+    """
+    Updating a samplespace given a guess and the resulting key
+    If a key table (cf. make_key_table) is given, the codes and the guess are numbers
+    and the key is its index in make_possible_keys
+    """
+    if key_table is not None:
+        row = key_table_row(guess, key_table)
+        return [code for code in samplespace if row[code] == key]
+    return [code for code in samplespace if calculate_key(code, guess) == key]
+
+
+def update_samplespace_bits(samplespace_bits, guess, key, partition_index):
+    """
+    Updating a samplespace given as a bitset (cf. make_partition_index) given a guess and the resulting key
+    """
+    return samplespace_bits & partition_index[guess][key]
 
 
-def computer_as_codebreaker(hidden_code, first_guess, full_samplespace, possible_keys, pegs=4, colors=6):
+def computer_as_codebreaker(hidden_code, first_guess, full_samplespace, possible_keys, pegs=4, colors=6, tree=None,
+                            key_table=None, partition_index=None, strategy='knuth'):
+    """
+    Plays one game against the hidden code and returns the number of guesses used
+    The guesses are chosen by Knuth's algorithm or by another strategy (cf. STRATEGIES)
+    If a strategy tree (cf. make_strategy_tree) is given, the guesses are looked up in it
+    instead of being searched for
+    If a key table (cf. make_key_table) is given, the hidden code and the first guess are code numbers,
+    and if also a partition index (cf. make_partition_index) is given, the samplespace is narrowed with bitsets
+    """
     counter = 1
+    if key_table is not None and tree is None:
+        solved = possible_keys.index((pegs, 0))
+        guess = first_guess
+        guesses = [guess]
+        row = key_table_row(guess, key_table)
+        key = row[hidden_code] # the codemaker's reply
+        if partition_index is not None:
+            samplespace_bits = update_samplespace_bits(-1, guess, key, partition_index) # -1 has all bits set
+            samplespace = bits_to_codes(samplespace_bits)
+        else:
+            samplespace = update_samplespace(range(len(full_samplespace)), guess, key, key_table)
+        while key != solved:
+            counter += 1
+            guess = best_guess(samplespace, full_samplespace, possible_keys, guesses, key_table, strategy)[0]
+            guesses.append(guess)
+            row = key_table_row(guess, key_table)
+            key = row[hidden_code]
+            if partition_index is not None:
+                samplespace_bits = update_samplespace_bits(samplespace_bits, guess, key, partition_index)
+                samplespace = bits_to_codes(samplespace_bits)
+            else:
+                samplespace = update_samplespace(samplespace, guess, key, key_table)
+        return counter
+    if key_table is not None:
+        hidden_code = int_to_code(hidden_code, pegs, colors)
+    if tree is not None:
+        node = tree
+        key = calculate_key(hidden_code, node['guess'])
+        while key[0] < pegs:
+            counter += 1
+            node = node['children'][key]
+            key = calculate_key(hidden_code, node['guess'])
+        return counter
     guess = first_guess
+    guesses = [guess]
     key = calculate_key(hidden_code, guess) # the codemaker's reply
     black = key[0]
-    samplespace = [code for code in full_samplespace if calculate_key(code, guess) == key] # the codebreaker's new possibilites
+    samplespace = update_samplespace(full_samplespace, guess, key) # the codebreaker's new possibilites
     while black < pegs:
         # print("Guess: {}\tKey: {}".format(guess, key))
         counter += 1
-        guess = best_guess(samplespace, full_samplespace, possible_keys)[0] # the codebreaker's guess
+        guess = best_guess(samplespace, full_samplespace, possible_keys, guesses, None, strategy)[0] # the codebreaker's guess
+        guesses.append(guess)
         key = calculate_key(hidden_code, guess) # the codemaker's reply
         black = key[0]
-        samplespace = [code for code in samplespace if calculate_key(code, guess) == key] # the codebreaker's new possibilites
+        samplespace = update_samplespace(samplespace, guess, key) # the codebreaker's new possibilites
     # print("Code {} guessed in {} attempts.".format(hidden_code, counter))
     return counter
 
-def test_game_randomized(tests, pegs=4, colors=6):
+
+def make_strategy_tree(pegs=4, colors=6, samplespace=None, full_samplespace=None, possible_keys=None, guesses=(),
+                       strategy='knuth'):
+    """
+    Builds the decision tree of Knuth's algorithm (or another strategy, cf. STRATEGIES), i.e., the guess
+    made in every possible state of the game (the guess depends only on the keys received so far)
+    Returns nested dicts {'guess': code, 'children': {key: subtree}}
+    where the key with all black pegs has no subtree
+    """
+    if full_samplespace is None:
+        full_samplespace = make_full_samplespace(pegs, colors)
+    if possible_keys is None:
+        possible_keys = make_possible_keys(pegs, colors)
+    if samplespace is None:
+        samplespace = full_samplespace
+    guess = best_guess(samplespace, full_samplespace, possible_keys, guesses, None, strategy)[0]
+    partitioning = {}
+    for code in samplespace:
+        key = calculate_key(code, guess)
+        if key[0] < pegs:
+            partitioning.setdefault(key, []).append(code)
+    children = {}
+    for key in possible_keys: # keep the children in the order of the keys
+        if key in partitioning:
+            children[key] = make_strategy_tree(pegs, colors, partitioning[key], full_samplespace, possible_keys,
+                                               guesses + (guess,), strategy)
+    return {'guess': guess, 'children': children}
+
+
+def strategy_tree_filename(pegs=4, colors=6, directory='strategy_trees', strategy='knuth'):
+    """
+    Returns the name of the file holding the strategy tree for the given number of pegs and colors
+    """
+    return os.path.join(directory, '{}_tree_{}x{}.json'.format(strategy.replace(' ', '_'), pegs, colors))
+
+
+def save_strategy_tree(tree, pegs=4, colors=6, filename=None, strategy='knuth'):
+    """
+    Writes a strategy tree to file in a compact format:
+    a node is [code number of guess, {index of key in make_possible_keys: node}]
+    """
+    if filename is None:
+        filename = strategy_tree_filename(pegs, colors, strategy=strategy)
+    possible_keys = make_possible_keys(pegs, colors)
+    key_index = {key: index for index, key in enumerate(possible_keys)}
+    def compact(node):
+        return [code_to_int(node['guess'], colors),
+                {key_index[key]: compact(child) for key, child in node['children'].items()}]
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = '{}.{}.tmp'.format(filename, os.getpid()) # renamed when complete, so processes can save at once
+    with open(temporary, 'w') as file:
+        json.dump({'Pegs': pegs, 'Colors': colors, 'Strategy': strategy, 'Tree': compact(tree)}, file,
+                  separators=(',', ':'))
+    os.replace(temporary, filename)
+
+
+def load_strategy_tree(pegs=4, colors=6, filename=None, strategy='knuth'):
+    """
+    Reads the strategy tree for the given number of pegs and colors from file
+    The tree is built (and saved) first if the file doesn't exist
+    """
+    if filename is None:
+        filename = strategy_tree_filename(pegs, colors, strategy=strategy)
+    if not os.path.exists(filename):
+        tree = make_strategy_tree(pegs, colors, strategy=strategy)
+        save_strategy_tree(tree, pegs, colors, filename, strategy)
+        return tree
+    with open(filename, 'r') as file:
+        data = json.load(file)
+    if (data['Pegs'], data['Colors'], data['Strategy']) != (pegs, colors, strategy):
+        raise ValueError('Strategy tree in {} is for {} pegs and {} colors with strategy {}'.format(
+            filename, data['Pegs'], data['Colors'], data['Strategy']))
+    possible_keys = make_possible_keys(pegs, colors)
+    def expand(node):
+        return {'guess': int_to_code(node[0], pegs, colors),
+                'children': {possible_keys[int(index)]: expand(child) for index, child in node[1].items()}}
+    return expand(data['Tree'])
+
+def test_game_randomized(tests, pegs=4, colors=6, tree=None, key_table=None, strategy='knuth', engine=None):
     """
     Run game with computer as code breaker a given number of times 
     with fixed number of pegs and colors against a random hidden code
     Returns maximum, minimum, and average
-    Uses Knuth's algorithm
+    Uses Knuth's algorithm (looked up in the strategy tree if one is given,
+    and with codes as numbers if a key table is given)
+    If an engine is given (cf. mami_engines.get_engine, e.g. 'auto'), the games are played with it instead,
+    all at once (cf. mami_montecarlo.play_batch, and mami_montecarlo.evaluate for seeded runs until
+    a given precision)
     """
-    full_samplespace = make_full_samplespace(pegs, colors)
+    if engine is not None:
+        import mami_engines
+        import mami_montecarlo
+        engine = mami_engines.get_engine(engine, pegs, colors)
+        first_guess = engine.best_guess(engine.full_samplespace())[0]
+        all_times = mami_montecarlo.play_batch(engine, [code_to_int(make_code(pegs, colors), colors)
+                                                        for i in range(tests)], first_guess)
+        return max(all_times), min(all_times), math.fsum(all_times)/tests
+    if colors**pegs < LAZY_SAMPLESPACE_SIZE:
+        full_samplespace = make_full_samplespace(pegs, colors)
+    else:
+        full_samplespace = LazySamplespace(pegs, colors)
     possible_keys = make_possible_keys(pegs, colors)
-    first_guess = best_guess(full_samplespace, full_samplespace, possible_keys)[0]
+    if tree is not None:
+        first_guess = tree['guess']
+    else:
+        first_guess = best_guess(full_samplespace, full_samplespace, possible_keys, [], None, strategy)[0]
+    if key_table is not None:
+        first_guess = code_to_int(first_guess, colors)
     maximum = 0
     minimum = float('inf')
     sum = 0
     for i in range(tests):
-        times = computer_as_codebreaker(make_code(pegs, colors), first_guess, full_samplespace, possible_keys, pegs, colors)
+        hidden_code = make_code(pegs, colors)
+        if key_table is not None:
+            hidden_code = code_to_int(hidden_code, colors)
+        times = computer_as_codebreaker(hidden_code, first_guess, full_samplespace, possible_keys, pegs, colors, tree,
+                                        key_table, None, strategy)
         sum += times
-        if times > maximum:
-            maximum = times
-        elif times < minimum:
-            minimum = times
+        maximum = max(maximum, times)
+        minimum = min(minimum, times)
     return maximum, minimum, sum/tests
 
-def find_maximum_number_of_guesses(pegs=4, colors=6):
+# number of hidden codes played between calls of on_done in find_maximum_number_of_guesses without workers:
+CHUNK_SIZE = 64
+
+def play_games(hidden_codes, first_guess, full_samplespace, possible_keys, pegs=4, colors=6, tree=None, key_table=None,
+               partition_index=None, strategy='knuth'):
     """
-    Run through all possible hidden codes and return the maximal number of guesses needed
-    for the code breaker
-    Uses Knuth's algorithm
+    Plays one game against each of the hidden codes and returns the list of the numbers of guesses used
+    """
+    return [computer_as_codebreaker(code, first_guess, full_samplespace, possible_keys, pegs, colors, tree, key_table,
+                                    partition_index, strategy)
+            for code in hidden_codes]
+
+# what play_games needs besides the hidden codes, set once in each worker process:
+_worker_game = None
+
+def _init_worker(*game):
+    global _worker_game
+    if isinstance(game[6], tuple): # the key table is in shared memory (cf. mami_shared)
+        import mami_shared
+        game = game[:6] + (mami_shared.attach(game[6]),) + game[7:]
+    _worker_game = game
+
+def _play_games_in_worker(hidden_codes):
+    return play_games(hidden_codes, *_worker_game)
+
+
+def describe_game(pegs=4, colors=6, tree=None, strategy='knuth'):
+    """
+    Returns the first part of the result of find_maximum_number_of_guesses (dict with the numbers of codes
+    and keys, the strategy, the first guess, and its max error) together with the first guess,
+    the full samplespace, and the possible keys
     """
     result = {}
     full_samplespace = make_full_samplespace(pegs, colors)
     result['Possible codes'] = len(full_samplespace)
     possible_keys = make_possible_keys(pegs, colors)
     result['Valid keys'] = len(possible_keys)
-    first_guess, max_error = best_guess(full_samplespace, full_samplespace, possible_keys)
+    result['Strategy'] = strategy
+    if tree is not None:
+        first_guess = tree['guess']
+    else:
+        first_guess = best_guess(full_samplespace, full_samplespace, possible_keys, [], None, strategy)[0]
+    max_error = maximal_error(first_guess, full_samplespace, possible_keys)
     result['Initial guess'] = first_guess
     result['Max error'] = max_error
-    guesses = 0
-    for code in full_samplespace:
-        times = computer_as_codebreaker(code, first_guess, full_samplespace, possible_keys, pegs, colors)
-        if times > guesses:
-            guesses = times
-    result['Guesses'] = guesses
+    return result, first_guess, full_samplespace, possible_keys
+
+def find_maximum_number_of_guesses(pegs=4, colors=6, tree=None, key_table=None, workers=None, partition_index=None,
+                                   strategy='knuth', done=None, on_done=None, engine=None):
+    """
+    Run through all possible hidden codes and return the maximal number of guesses needed
+    for the code breaker
+    Uses Knuth's algorithm or another strategy (cf. STRATEGIES) for the code breaker
+    (looked up in the strategy tree if one is given,
+    and with codes as numbers if a key table is given, narrowing the samplespace
+    with bitsets if also a partition index is given)
+    With workers > 1, the hidden codes are split between that many processes
+    (the first guess, samplespace, and keys are computed once and handed to each worker,
+    and the key table is put in shared memory, so all workers use the same copy; the workers
+    narrow their samplespaces with the key table, as the partition index can't be shared)
+    The hidden codes are played in chunks, and on_done (if given) is called with the list of
+    hidden codes (as numbers, cf. code_to_int) and the list of their numbers of guesses after each chunk
+    Hidden codes already played (e.g. before an interruption) can be given in done as {number: guesses}
+    and are then skipped
+    If an engine is given (cf. mami_engines.get_engine, e.g. 'auto'), the games are played with it
+    in this process instead (Knuth's algorithm only; tree, key_table, workers, and partition_index are not used)
+    """
+    if engine is not None:
+        return _find_maximum_with_engine(pegs, colors, engine, strategy, done, on_done)
+    result, first_guess, full_samplespace, possible_keys = describe_game(pegs, colors, tree, strategy)
+    if key_table is not None:
+        first_guess = code_to_int(first_guess, colors)
+    done = done or {}
+    numbers = [number for number in range(len(full_samplespace)) if number not in done]
+    all_times = list(done.values())
+    def hidden_codes(chunk):
+        return chunk if key_table is not None else [full_samplespace[number] for number in chunk]
+    game = (first_guess, full_samplespace, possible_keys, pegs, colors, tree, key_table, partition_index, strategy)
+    if workers is None or workers <= 1:
+        chunk_size = CHUNK_SIZE
+    else:
+        chunk_size = max(1, -(-len(numbers) // (8*workers))) # several chunks per worker for load balancing
+    chunks = [numbers[start:start+chunk_size] for start in range(0, len(numbers), chunk_size)]
+    executor = None
+    shared_key_table = None
+    try:
+        if workers is None or workers <= 1:
+            chunk_times = (play_games(hidden_codes(chunk), *game) for chunk in chunks)
+        else:
+            if key_table is not None:
+                import mami_shared
+                shared_key_table = mami_shared.SharedTable(key_table)
+                game = game[:6] + (shared_key_table.descriptor(), None, strategy)
+            executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=game)
+            chunk_times = executor.map(_play_games_in_worker, map(hidden_codes, chunks))
+        for chunk, times in zip(chunks, chunk_times):
+            all_times.extend(times)
+            if on_done is not None:
+                on_done(chunk, times)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if shared_key_table is not None:
+            shared_key_table.close()
+    result['Guesses'] = max(all_times)
+    return result
+
+def _find_maximum_with_engine(pegs, colors, engine, strategy='knuth', done=None, on_done=None):
+    """
+    find_maximum_number_of_guesses played with an engine (cf. mami_engines)
+    """
+    import mami_engines
+    if strategy != 'knuth':
+        raise ValueError('The engines only have the knuth strategy, not {}'.format(strategy))
+    engine = mami_engines.get_engine(engine, pegs, colors)
+    result = {}
+    result['Possible codes'] = colors**pegs
+    result['Valid keys'] = len(engine.possible_keys)
+    result['Strategy'] = strategy
+    samplespace = engine.full_samplespace()
+    first_guess = engine.best_guess(samplespace)[0]
+    result['Initial guess'] = engine.to_lists([first_guess])[0]
+    result['Max error'] = int(max(engine.partition_counts(samplespace, [first_guess])[0]))
+    done = done or {}
+    numbers = [number for number in range(colors**pegs) if number not in done]
+    all_times = list(done.values())
+    for start in range(0, len(numbers), CHUNK_SIZE):
+        chunk = numbers[start:start+CHUNK_SIZE]
+        times = mami_engines.play_games(engine, chunk, first_guess)
+        all_times.extend(times)
+        if on_done is not None:
+            on_done(chunk, times)
+    result['Guesses'] = max(all_times)
     return result
     
+def solve_all_codes(pegs=4, colors=6, strategy='knuth', key_table=None):
+    """
+    Plays against all possible hidden codes at once, one guess at a time:
+    at each level, the hidden codes not yet guessed are grouped by the keys they have given
+    (which is exactly the samplespace of the code breaker), one best guess is found for each group,
+    and each group is split by the key the guess gives
+    So best_guess is called once for each state of the game instead of once for each hidden code and turn
+    Returns dict with the maximal and average number of guesses, the histogram {guesses: no. of codes},
+    the hardest hidden codes (those needing the maximal number of guesses), and the number of states
+    """
+    full_samplespace = make_full_samplespace(pegs, colors)
+    possible_keys = make_possible_keys(pegs, colors)
+    if key_table is not None:
+        solved_key = possible_keys.index((pegs, 0))
+        level = [(list(range(len(full_samplespace))), [])]
+    else:
+        solved_key = (pegs, 0)
+        level = [(full_samplespace, [])]
+    histogram = {}
+    hardest_codes = []
+    states = 0
+    guesses_used = 0
+    while level:
+        guesses_used += 1
+        next_level = []
+        solved = []
+        for samplespace, guesses in level:
+            states += 1
+            guess = best_guess(samplespace, full_samplespace, possible_keys, guesses, key_table, strategy)[0]
+            partitioning = {}
+            if key_table is not None:
+                row = key_table_row(guess, key_table)
+                for code in samplespace:
+                    partitioning.setdefault(row[code], []).append(code)
+            else:
+                for code in samplespace:
+                    partitioning.setdefault(calculate_key(code, guess), []).append(code)
+            for key, codes in partitioning.items():
+                if key == solved_key:
+                    solved.extend(codes)
+                else:
+                    next_level.append((codes, guesses + [guess]))
+        if solved:
+            histogram[guesses_used] = len(solved)
+            hardest_codes = solved
+        level = next_level
+    if key_table is not None:
+        hardest_codes = [full_samplespace[code] for code in hardest_codes]
+    return {'Guesses': max(histogram),
+            'Average': sum(guesses*number for guesses, number in histogram.items())/len(full_samplespace),
+            'Histogram': histogram,
+            'Hardest codes': sorted(hardest_codes),
+            'States': states}
+
+
 def find_lower_bound(max_error, pegs):
     """
     Returns coarse lower bound given initial guess's max error and number of pegs
@@ -217,52 +839,20 @@ def json_to_mdtable(headings, jsonlist):
             if heading not in game:
                 print('Issue with headings')
                 return ''
-    line = '|'
-    for heading in headings:
-        line += heading + '|'
-    line += '\n'
-    line += '|'
-    for heading in headings:
-        line += ':--:' + '|'
-    line += '\n'
+    lines = ['|' + '|'.join(headings) + '|',
+             '|' + '|'.join(':--:' for heading in headings) + '|']
     for game in jsonlist:
-        line += '|'
-        for heading in headings:
-            line += str(game[heading]) + '|'
-        line += '\n'
-    return line
+        lines.append('|' + '|'.join(str(game[heading]) for heading in headings) + '|')
+    return '\n'.join(lines) + '\n'
 
     
 # so that it won't be executed when functions are imported in mami_playgame
 if __name__ == '__main__':
-    
-    
-    # Test the smaller game sizes and send the result to output file:            
-    categories = ['Pegs', 'Colors', 'Guesses', 'Initial guess', 'Max error', 
-          'Possible codes', 'Valid keys', 'Lower bound', 'Knuth ok']
-    results = []
-    for pegs in range(2,5):
-        for colors in range(2,7):
-            print('Game: {} pegs, {} colors'.format(pegs, colors))
-            game = find_maximum_number_of_guesses(pegs, colors)
-            game['Pegs'] = pegs
-            game['Colors'] = colors
-            game['Lower bound'] = find_lower_bound(game['Max error'], pegs)
-            game['Knuth ok'] = (game['Lower bound'] == game['Guesses'])
-            results.append(game)
-            print("Runtime (in seconds): {}".format(time.time()-starttime))    
-    with open('mami_output.txt', 'w') as file:
-        file.write(json.dumps(results))
-    
-    # # Make table of result in output file for md file:
-    headings = ['Pegs', 'Colors', 'Guesses', 'Lower bound', 'Initial guess', 'Max error', 
-                  'Possible codes', 'Valid keys']
-    with open('mami_output.txt', 'r') as file:
-        results = json.load(file)
-        with open('mami_table.txt', 'w') as table_file:
-            line = json_to_mdtable(headings, results)
-            table_file.writelines(line)
-
-
+    starttime = time.time() # for checking runtime
+    # Test the smaller game sizes and send the result to output file
+    # (resuming from mami_sweep.jsonl if an earlier run was interrupted, cf. mami_sweep.py),
+    # with the sizes spread over all CPUs largest first (cf. mami_scheduler.py):
+    import mami_sweep
+    import mami_scheduler
+    mami_sweep.write_outputs(mami_scheduler.run_scheduled_sweep(workers=os.cpu_count()))
     print("Runtime (in seconds): {}".format(time.time()-starttime))
-    
\ No newline at end of file
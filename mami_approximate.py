@@ -0,0 +1,127 @@
+"""
+Approximate version of Knuth's algorithm for games too large for best_guess
+(e.g. 5 pegs and 8 colors, or 6 pegs and 9 colors).
+
+Instead of scoring every code as a guess against the whole samplespace, only a sample of
+candidate guesses is scored (codes from the samplespace plus random codes, or one code
+from each symmetry class on the first guess), each against a random sample of the samplespace,
+and within a time budget per turn. The report returned with each guess tells how far its
+max error may be from the best possible. Once the samplespace is small enough, the exact
+best_guess is used instead.
+"""
+
+import math
+import random
+import time
+import mami
+
+
+def first_guess_classes(pegs=4, colors=6):
+    """
+    Returns one code from each symmetry class of the full samplespace (the smallest one lexicographically),
+    i.e., [0, 0, 1, 1] style codes for each way of writing pegs as a sum of at most 'colors' numbers
+    (so the same as mami.symmetry_classes(full_samplespace, []) without running through all codes)
+    """
+    def partitions(number, largest):
+        if number == 0:
+            yield []
+        for part in range(min(number, largest), 0, -1):
+            for rest in partitions(number - part, part):
+                yield [part] + rest
+    classes = []
+    for parts in partitions(pegs, pegs):
+        if len(parts) <= colors:
+            classes.append([color for color, part in enumerate(parts) for peg in range(part)])
+    return sorted(classes)
+
+
+def sampling_error(sample, samplespace_size, no_keys, confidence=0.95, candidates=1):
+    """
+    Returns how far (in number of codes) the size of a preimage estimated from a random sample
+    of the samplespace may be from the true size, for all keys of all the candidate guesses scored
+    at once and with the given confidence (Hoeffding's inequality with a union bound over the keys
+    and candidates, so it also holds for the candidate picked for its smallest estimate)
+    """
+    if sample >= samplespace_size:
+        return 0
+    return samplespace_size*math.sqrt(math.log(2*no_keys*candidates/(1 - confidence))/(2*sample))
+
+
+def best_guess_approximate(samplespace, full_samplespace, possible_keys, guesses, candidates=500, sample=500,
+                           time_budget=None, exact_work=5*10**5, rng=random, confidence=0.95):
+    """
+    Returns a guess with small max error given the current samplespace (approximating Knuth's algorithm)
+    together with a report (dict) on how it was found
+    Scores at most 'candidates' guesses (codes from the samplespace first, then random codes),
+    each against a random sample of at most 'sample' codes from the samplespace,
+    and stops scoring once time_budget seconds have passed (if given)
+    If len(samplespace)*len(full_samplespace) is at most exact_work, mami.best_guess is used instead
+    The report has the estimated max error of the guess, how far that may be from its true max error
+    (with the given confidence, for all the candidates scored at once), the lower bound
+    ceil(len(samplespace)/no. of keys) for any guess, how much larger than the best possible max error
+    that of the guess may be (the gap bound), and (when approximate) the number of candidates scored
+    """
+    start = time.perf_counter()
+    size = len(samplespace)
+    lower_bound = -(-size // len(possible_keys))
+    if size < 3 or size*len(full_samplespace) <= exact_work:
+        guess, max_error = mami.best_guess(samplespace, full_samplespace, possible_keys, guesses)
+        if max_error is None: # one of at most 2 codes
+            max_error = mami.maximal_error(guess, samplespace, possible_keys)
+        return guess, {'Exact': True, 'Max error': max_error, 'Error bound': 0, 'Lower bound': lower_bound,
+                       'Gap bound': 0, 'Time': time.perf_counter() - start}
+    pegs = len(full_samplespace[0])
+    colors = full_samplespace[-1][0] + 1
+    if not guesses:
+        candidate_guesses = first_guess_classes(pegs, colors)
+    else:
+        # codes from the samplespace first (they may be the hidden code), then random codes:
+        candidate_guesses = [samplespace[index] for index in rng.sample(range(size), min(size, candidates // 2))]
+        while len(candidate_guesses) < min(candidates, len(full_samplespace)):
+            candidate_guesses.append(full_samplespace[rng.randrange(len(full_samplespace))])
+    if size <= sample:
+        samplespace_sample = samplespace
+    else:
+        samplespace_sample = [samplespace[index] for index in rng.sample(range(size), sample)]
+    scale = size/len(samplespace_sample)
+    members = set(map(tuple, samplespace)) if size <= 10*sample else None # for the tie-break
+    result = None
+    max_error = float('inf')
+    scored = 0
+    for guess in candidate_guesses:
+        error = mami.maximal_error(guess, samplespace_sample, possible_keys)*scale
+        scored += 1
+        if error < max_error or (error == max_error and members is not None and tuple(guess) in members
+                                 and tuple(result) not in members):
+            max_error = error
+            result = guess
+        if time_budget is not None and time.perf_counter() - start > time_budget:
+            break
+    error_bound = sampling_error(len(samplespace_sample), size, len(possible_keys), confidence, scored)
+    return result, {'Exact': False, 'Max error': max_error, 'Error bound': error_bound, 'Lower bound': lower_bound,
+                    'Gap bound': max(0, max_error + error_bound - lower_bound),
+                    'Candidates scored': scored, 'Time': time.perf_counter() - start}
+
+
+def computer_as_codebreaker_approximate(hidden_code, pegs=4, colors=6, candidates=500, sample=500, time_budget=None,
+                                        exact_work=5*10**5, seed=None):
+    """
+    Plays one game against the hidden code using best_guess_approximate for every guess,
+    without ever keeping a list of all codes
+    Returns the number of guesses used and the list of reports for the guesses
+    """
+    rng = random.Random(seed)
+    full_samplespace = mami.LazySamplespace(pegs, colors)
+    possible_keys = mami.make_possible_keys(pegs, colors)
+    samplespace = full_samplespace
+    guesses = []
+    reports = []
+    key = None
+    while key is None or key[0] < pegs:
+        guess, report = best_guess_approximate(samplespace, full_samplespace, possible_keys, guesses, candidates,
+                                               sample, time_budget, exact_work, rng)
+        guesses.append(guess)
+        reports.append(report)
+        key = mami.calculate_key(hidden_code, guess)
+        samplespace = mami.update_samplespace(samplespace, guess, key)
+    return len(guesses), reports
@@ -0,0 +1,189 @@
+"""
+Benchmarks of the implementations of Knuth's algorithm for different game sizes:
+the list engine (mami.py with codes as lists), the table engine (mami.py with codes as
+numbers and a key table), and the NumPy engine (vectorizing.py).
+
+Records wall time and peak memory (as seen by tracemalloc) of the essential steps to
+mami_benchmark.json and flags regressions against the results stored there.
+Run with --update to store the new results as the baseline.
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+import mami
+
+BENCHMARK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mami_benchmark.json')
+
+# (pegs, colors) benchmarked by default:
+GAME_SIZES = [(2, 4), (3, 4), (3, 6), (4, 4), (4, 5), (4, 6)]
+
+# largest number of possible codes for which all games are played with each engine
+SWEEP_LIMITS = {'list': 256, 'table': 625, 'numpy': 1296}
+
+ENGINES = ['list', 'table', 'numpy']
+
+
+def measure(function, *args):
+    """
+    Calls the function twice, first to time it and then to find its peak memory use
+    (tracemalloc slows it down, so it's not timed)
+    Returns dict with wall time (in seconds) and peak memory (in bytes)
+    """
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'Time': seconds, 'Peak memory': peak}
+
+
+def second_turn(pegs, colors):
+    """
+    Returns the first guess and the samplespace (as lists) after the first guess answered by the key
+    with the largest preimage, which is the state benchmarked for best_guess and filtering
+    """
+    full_samplespace = mami.make_full_samplespace(pegs, colors)
+    possible_keys = mami.make_possible_keys(pegs, colors)
+    first_guess = mami.best_guess(full_samplespace, full_samplespace, possible_keys, [])[0]
+    partitioning = {}
+    for code in full_samplespace:
+        partitioning.setdefault(mami.calculate_key(code, first_guess), []).append(code)
+    return first_guess, max(partitioning.values(), key=len)
+
+
+def benchmark_list_engine(pegs, colors, sweep=True):
+    full_samplespace = mami.make_full_samplespace(pegs, colors)
+    possible_keys = mami.make_possible_keys(pegs, colors)
+    first_guess, samplespace = second_turn(pegs, colors)
+    second_guess = mami.best_guess(samplespace, full_samplespace, possible_keys, [first_guess])[0]
+    key = mami.calculate_key(samplespace[-1], second_guess)
+    results = {
+        'calculate_key': measure(lambda: [mami.calculate_key(code, first_guess) for code in full_samplespace]),
+        'maximal_error': measure(mami.maximal_error, first_guess, full_samplespace, possible_keys),
+        'best_guess': measure(mami.best_guess, samplespace, full_samplespace, possible_keys, [first_guess]),
+        'filtering': measure(lambda: [code for code in samplespace if mami.calculate_key(code, second_guess) == key]),
+        }
+    if sweep:
+        results['find_maximum_number_of_guesses'] = measure(mami.find_maximum_number_of_guesses, pegs, colors)
+    return results
+
+
+def benchmark_table_engine(pegs, colors, sweep=True):
+    full_samplespace = mami.make_full_samplespace(pegs, colors)
+    possible_keys = mami.make_possible_keys(pegs, colors)
+    results = {'make_key_table': measure(mami.make_key_table, pegs, colors)}
+    key_table = mami.make_key_table(pegs, colors)
+    partition_index = mami.make_partition_index(key_table, possible_keys)
+    first_guess, samplespace = second_turn(pegs, colors)
+    first_guess = mami.code_to_int(first_guess, colors)
+    samplespace = [mami.code_to_int(code, colors) for code in samplespace]
+    second_guess = mami.best_guess(samplespace, full_samplespace, possible_keys, [first_guess], key_table)[0]
+    row = mami.key_table_row(second_guess, key_table)
+    key = row[samplespace[-1]]
+    samplespace_bits = partition_index[first_guess][mami.key_table_row(first_guess, key_table)[samplespace[0]]]
+    results.update({
+        'calculate_key': measure(lambda: [mami.key_table_row(first_guess, key_table)[code] for code in range(len(full_samplespace))]),
+        'maximal_error': measure(mami.maximal_error, first_guess, range(len(full_samplespace)), possible_keys, key_table),
+        'best_guess': measure(mami.best_guess, samplespace, full_samplespace, possible_keys, [first_guess], key_table),
+        'filtering': measure(lambda: mami.bits_to_codes(samplespace_bits & partition_index[second_guess][key])),
+        })
+    if sweep:
+        results['find_maximum_number_of_guesses'] = measure(mami.find_maximum_number_of_guesses, pegs, colors, None,
+                                                            key_table, None, partition_index)
+    return results
+
+
+def benchmark_numpy_engine(pegs, colors, sweep=True):
+    import numpy as np
+    import vectorizing
+    n = colors**pegs
+    digits = vectorizing.make_possible_digits(colors, pegs)
+    histograms = vectorizing.make_color_histograms(digits, colors)
+    results = {'make_key_table': measure(vectorizing.make_key_matrix, colors, pegs)}
+    allkeys = vectorizing.make_key_matrix(colors, pegs)
+    partition_index = vectorizing.make_partition_index(allkeys, pegs)
+    first_guess = np.argmin(vectorizing.max_partitions(allkeys, np.arange(n), pegs))
+    key = np.argmax(np.bincount(allkeys[:, first_guess])) # the key with the largest preimage
+    possible = partition_index[first_guess, key]
+    possibilities = vectorizing.bitset_to_numbers(possible, n)
+    second_guess = np.argmin(vectorizing.max_partitions(allkeys, possibilities, pegs))
+    second_key = allkeys[possibilities[-1], second_guess]
+    results.update({
+        'calculate_key': measure(vectorizing.calculate_key_compact, digits, digits[first_guess:first_guess+1],
+                                 histograms, histograms[first_guess:first_guess+1]),
+        'maximal_error': measure(lambda: np.max(np.bincount(allkeys[:, first_guess]))),
+        'best_guess': measure(vectorizing.max_partitions, allkeys, possibilities, pegs),
+        'filtering': measure(lambda: vectorizing.bitset_to_numbers(possible & partition_index[second_guess, second_key], n)),
+        })
+    if sweep:
+        results['find_maximum_number_of_guesses'] = measure(vectorizing.play_all_games, colors, pegs)
+    return results
+
+
+BENCHMARKS = {'list': benchmark_list_engine, 'table': benchmark_table_engine, 'numpy': benchmark_numpy_engine}
+
+
+def run_benchmarks(sizes=GAME_SIZES, engines=ENGINES, verbose=True):
+    """
+    Returns list of dicts (one per engine, game size, and function) with wall time and peak memory
+    """
+    records = []
+    for pegs, colors in sizes:
+        for engine in engines:
+            if verbose:
+                print('Benchmarking {} engine: {} pegs, {} colors'.format(engine, pegs, colors))
+            sweep = colors**pegs <= SWEEP_LIMITS[engine]
+            for function, result in BENCHMARKS[engine](pegs, colors, sweep).items():
+                records.append({'Engine': engine, 'Pegs': pegs, 'Colors': colors, 'Function': function, **result})
+    return records
+
+
+def find_regressions(records, baseline, tolerance=1.5, minimum_time=0.01):
+    """
+    Compares benchmark results to a baseline (both lists of dicts as from run_benchmarks)
+    Returns list of dicts describing each measurement that is more than 'tolerance' times slower
+    (ignoring times below minimum_time seconds in the baseline) or uses more than 'tolerance'
+    times the memory
+    """
+    stored = {(record['Engine'], record['Pegs'], record['Colors'], record['Function']): record for record in baseline}
+    regressions = []
+    for record in records:
+        old = stored.get((record['Engine'], record['Pegs'], record['Colors'], record['Function']))
+        if old is None:
+            continue
+        for measurement in ['Time', 'Peak memory']:
+            if measurement == 'Time' and old['Time'] < minimum_time:
+                continue
+            if record[measurement] > tolerance*old[measurement]:
+                regressions.append({'Engine': record['Engine'], 'Pegs': record['Pegs'], 'Colors': record['Colors'],
+                                    'Function': record['Function'], 'Measurement': measurement,
+                                    'Baseline': old[measurement], 'Now': record[measurement]})
+    return regressions
+
+
+def load_benchmarks(filename=BENCHMARK_FILE):
+    with open(filename, 'r') as file:
+        return json.load(file)
+
+
+def save_benchmarks(records, filename=BENCHMARK_FILE):
+    with open(filename, 'w') as file:
+        json.dump(records, file, indent=1)
+
+
+if __name__ == '__main__':
+    records = run_benchmarks()
+    if os.path.exists(BENCHMARK_FILE):
+        regressions = find_regressions(records, load_benchmarks())
+        for regression in regressions:
+            print('Regression: {Engine} engine, {Pegs} pegs, {Colors} colors, {Function}: '
+                  '{Measurement} {Baseline:.4g} -> {Now:.4g}'.format(**regression))
+        if not regressions:
+            print('No regressions')
+    if '--update' in sys.argv[1:] or not os.path.exists(BENCHMARK_FILE):
+        save_benchmarks(records)
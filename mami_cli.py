@@ -0,0 +1,207 @@
+"""
+Command-line entry point for all of the project:
+
+    python mami_cli.py play [--pegs P] [--colors C] [--engine list|table|numpy|auto] [--hints] [--computer]
+    python mami_cli.py hint [GUESS:KEY ...] [--pegs P] [--colors C] [--engine list|table] [--tree-dir D]
+    python mami_cli.py solve [--pegs P] [--colors C] [--engine list|table|numpy] [--jobs N] [--key-dir D]
+                             [--max-memory M [--force]]
+    python mami_cli.py estimate [--pegs P] [--colors C] [--precision D] [--seed S] [--jobs N] [--engine E]
+    python mami_cli.py sweep [--pegs P --colors C] [--engine list|table] [--jobs N] [--file F]
+    python mami_cli.py bench [--pegs P --colors C] [--engine list|table|numpy] [--update]
+
+A GUESS:KEY is a guess and the key it got, e.g. 0,0,1,1:1,0 for the guess [0, 0, 1, 1] answered
+by 1 black and 0 white key pegs. The engines are the list engine (mami.py with codes as lists, and
+a strategy tree where it helps), the table engine (mami.py with codes as numbers and a key table),
+and the NumPy engine (vectorizing.py). NumPy and the other modules are only imported when needed,
+so playing and hints start right away. With --max-memory (e.g. 200M), solve picks the engine and
+block size that fit in the budget (cf. mami_planner.py) instead of --engine.
+"""
+
+import argparse
+import json
+import sys
+import time
+import mami
+
+ENGINES = ['list', 'table', 'numpy']
+
+
+def parse_history(items, pegs):
+    """
+    Returns the guesses and keys from strings GUESS:KEY like 0,0,1,1:1,0
+    """
+    guesses = []
+    keys = []
+    for item in items:
+        guess, key = item.split(':')
+        guess = [int(color) for color in guess.split(',')]
+        key = tuple(int(pegs) for pegs in key.split(','))
+        if len(guess) != pegs or len(key) != 2:
+            raise ValueError('Not a guess of {} pegs and a key: {}'.format(pegs, item))
+        guesses.append(guess)
+        keys.append(key)
+    return guesses, keys
+
+
+def play(args):
+    import mami_playgame
+    if args.computer:
+        mami_playgame.codebreaker(args.pegs, args.colors, engine=args.engine)
+    else:
+        mami_playgame.game(args.pegs, args.colors, args.engine, args.hints)
+
+
+def hint(args):
+    import mami_tables
+    guesses, keys = parse_history(args.history, args.pegs)
+    tables = mami_tables.GameTables(args.pegs, args.colors, args.strategy, key_table=(args.engine == 'table'),
+                                    tree_directory=args.tree_dir)
+    consistent, guess, exact = tables.hint(guesses, keys, with_exact=True)
+    print('Consistent codes: {}'.format(consistent))
+    if guess is None:
+        print('No code gives those keys')
+    else:
+        print('Next guess: {}{}'.format(guess, '' if exact else ' (approximate)'))
+
+
+def solve(args):
+    start = time.perf_counter()
+    if args.max_memory is not None:
+        import mami_planner
+        plan = mami_planner.make_plan(args.pegs, args.colors, mami_planner.parse_memory(args.max_memory))
+        if not plan['Fits'] and not args.force:
+            raise ValueError('nothing fits in {} (the list engine needs about {:.1f} MB); '
+                             'give --force to run it anyway'.format(args.max_memory, plan['Estimated peak']/2**20))
+        result = mami_planner.run_plan(plan, args.key_dir)
+        print(mami_planner.format_plan(result.pop('Plan')), file=sys.stderr)
+        result['Engine'] = plan['Engine']
+        print(json.dumps(result))
+        return
+    if args.engine == 'numpy':
+        import numpy as np
+        import vectorizing
+        attempts = vectorizing.play_all_games(args.colors, args.pegs, workers=args.jobs, key_directory=args.key_dir)
+        guesses, counts = np.unique(attempts, return_counts=True)
+        result = {'Guesses': int(attempts.max()), 'Average': float(attempts.mean()),
+                  'Histogram': {int(times): int(count) for times, count in zip(guesses, counts)}}
+    else:
+        key_table = None
+        if args.engine == 'table' and args.key_dir is not None:
+            import mami_keyfile
+            key_table = mami_keyfile.load_key_file(args.pegs, args.colors, 'index', 'mami', args.key_dir).reshape(-1)
+        elif args.engine == 'table':
+            key_table = mami.make_key_table(args.pegs, args.colors)
+        result = mami.solve_all_codes(args.pegs, args.colors, args.strategy, key_table)
+        del result['Hardest codes']
+    result['Time'] = time.perf_counter() - start
+    print(json.dumps(result))
+
+
+def estimate(args):
+    import mami_montecarlo
+    def progress(stats):
+        low, high = stats.confidence_interval(args.confidence)
+        print('{} games: average {:.4f} ({:.4f} to {:.4f})'.format(stats.count, stats.mean, low, high), file=sys.stderr)
+    result = mami_montecarlo.evaluate(args.pegs, args.colors, args.seed, args.precision, args.confidence,
+                                      workers=args.jobs, engine=args.engine, on_batch=progress)
+    print(json.dumps(result))
+
+
+def sweep(args):
+    import mami_sweep
+    sizes = mami_sweep.SWEEP_SIZES if args.pegs is None else [(args.pegs, args.colors)]
+    if args.jobs > 1:
+        import mami_scheduler
+        results = mami_scheduler.run_scheduled_sweep(sizes, args.file, args.strategy, args.jobs, engine=args.engine)
+    else:
+        results = mami_sweep.run_sweep(sizes, args.file, args.strategy, engine=args.engine)
+    if args.pegs is None:
+        mami_sweep.write_outputs(results)
+    else:
+        print(json.dumps(results[0]))
+
+
+def bench(args):
+    import mami_benchmark
+    sizes = mami_benchmark.GAME_SIZES if args.pegs is None else [(args.pegs, args.colors)]
+    engines = mami_benchmark.ENGINES if args.engine is None else [args.engine]
+    records = mami_benchmark.run_benchmarks(sizes, engines)
+    regressions = mami_benchmark.find_regressions(records, mami_benchmark.load_benchmarks())
+    for regression in regressions:
+        print('Regression: {Engine} engine, {Pegs} pegs, {Colors} colors, {Function}: '
+              '{Measurement} {Baseline:.4g} -> {Now:.4g}'.format(**regression))
+    if not regressions:
+        print('No regressions')
+    if args.update:
+        mami_benchmark.save_benchmarks(records)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Mastermind with any number of pegs and colors')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    size = argparse.ArgumentParser(add_help=False)
+    size.add_argument('--pegs', type=int, default=4)
+    size.add_argument('--colors', type=int, default=6)
+    all_sizes = argparse.ArgumentParser(add_help=False) # no size means the default sizes
+    all_sizes.add_argument('--pegs', type=int)
+    all_sizes.add_argument('--colors', type=int)
+    strategy = argparse.ArgumentParser(add_help=False)
+    strategy.add_argument('--strategy', choices=list(mami.STRATEGIES), default='knuth')
+    commands = {}
+    commands['play'] = subparsers.add_parser('play', parents=[size], help='play as codebreaker against the computer')
+    commands['play'].add_argument('--engine', choices=ENGINES + ['auto'], help='engine calculating the keys')
+    commands['play'].add_argument('--hints', action='store_true', help='type h instead of a guess for a hint')
+    commands['play'].add_argument('--computer', action='store_true',
+                                  help='the computer breaks a code you hold (you type the keys)')
+    commands['hint'] = subparsers.add_parser('hint', parents=[size, strategy],
+                                             help="the computer codebreaker's next guess")
+    commands['hint'].add_argument('history', nargs='*', metavar='GUESS:KEY')
+    commands['hint'].add_argument('--engine', choices=['list', 'table'], default='list')
+    commands['hint'].add_argument('--tree-dir', default='strategy_trees', help='directory of strategy trees')
+    commands['solve'] = subparsers.add_parser('solve', parents=[size, strategy], help='play against all hidden codes')
+    commands['solve'].add_argument('--engine', choices=ENGINES, default='table')
+    commands['solve'].add_argument('--jobs', type=int, default=1, help='number of worker processes (NumPy engine)')
+    commands['solve'].add_argument('--key-dir', help='directory of key files (cf. mami_keyfile.py) for the table '
+                                   'and NumPy engines, written the first time')
+    commands['solve'].add_argument('--max-memory', metavar='M',
+                                   help='memory budget like 200M or 2G; picks the engine that fits (knuth strategy)')
+    commands['solve'].add_argument('--force', action='store_true',
+                                   help='with --max-memory, run the list engine even if it does not fit')
+    commands['estimate'] = subparsers.add_parser('estimate', parents=[size],
+                                                 help='Monte Carlo estimate of the average number of guesses')
+    commands['estimate'].add_argument('--precision', type=float, default=0.01,
+                                      help='stop when the confidence interval is this close to the average')
+    commands['estimate'].add_argument('--confidence', type=float, default=0.95)
+    commands['estimate'].add_argument('--seed', type=int)
+    commands['estimate'].add_argument('--jobs', type=int, default=1, help='number of worker processes')
+    commands['estimate'].add_argument('--engine', choices=ENGINES + ['auto'], default='auto')
+    commands['sweep'] = subparsers.add_parser('sweep', parents=[all_sizes, strategy],
+                                              help='resumable run through the game sizes (cf. mami_sweep.py)')
+    commands['sweep'].add_argument('--engine', choices=['list', 'table'], default='list')
+    commands['sweep'].add_argument('--jobs', type=int, default=1,
+                                   help='number of worker processes (with more than one, the sizes are scheduled '
+                                   'by estimated cost, cf. mami_scheduler.py)')
+    commands['sweep'].add_argument('--file', default='mami_sweep.jsonl')
+    commands['bench'] = subparsers.add_parser('bench', parents=[all_sizes], help='benchmark the engines')
+    commands['bench'].add_argument('--engine', choices=ENGINES)
+    commands['bench'].add_argument('--update', action='store_true', help='store the results as the baseline')
+    for command in ['play', 'hint', 'solve', 'estimate', 'sweep', 'bench']:
+        commands[command].set_defaults(run=globals()[command])
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if args.command in ['sweep', 'bench'] and (args.pegs is None) != (args.colors is None):
+        parser.error('give both --pegs and --colors, or neither')
+    if args.command == 'solve' and (args.engine == 'numpy' or args.max_memory) and args.strategy != 'knuth':
+        parser.error('the NumPy engine only has the knuth strategy')
+    try:
+        args.run(args)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
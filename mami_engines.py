@@ -0,0 +1,307 @@
+"""
+Engines: one interface to the implementations of the game, so that the drivers
+(find_maximum_number_of_guesses, test_game_randomized, mami_playgame) can use whichever is
+fastest for a game size without changing:
+
+* ListEngine: mami.py with codes as lists
+* TableEngine: mami.py with codes as numbers and a key table
+* NumpyEngine: vectorizing.py, with codes as numbers, their digits and color histograms,
+  and (if it fits in memory) the key matrix
+
+Each engine has its own (native) format for codes and samplespaces, and converts to and from
+codes as lists and codes as numbers (numbered as in mami.code_to_int, for all engines).
+Keys are always their indices in mami.make_possible_keys (whatever encoding the engine uses
+internally), and best_guess makes the same choices (Knuth's algorithm with its tie-breaks)
+in every engine.
+
+    >>> engine = get_engine('auto', 4, 6)
+    >>> samplespace = engine.filter(engine.full_samplespace(), engine.from_lists([[0, 0, 1, 1]])[0], 3)
+"""
+
+import mami
+import mami_tables
+
+ENGINES = ['list', 'table', 'numpy']
+
+# from these numbers of codes on, the table and NumPy engines are faster than the list engine
+# at playing all hidden codes (measured: about 2x and 5x at 27 codes, 2x and 35x at 625), cf. choose_engine:
+TABLE_ENGINE_SIZE = 10
+NUMPY_ENGINE_SIZE = 25
+# largest number of codes for which the NumPy engine keeps the key matrix (n*n bytes):
+KEY_MATRIX_SIZE = 8000
+
+
+class ListEngine:
+    """
+    Codes as lists, samplespaces as lists of codes
+    """
+    name = 'list'
+
+    def __init__(self, pegs=4, colors=6):
+        self.pegs = pegs
+        self.colors = colors
+        self.possible_keys = mami.make_possible_keys(pegs, colors)
+        self.key_indices = {key: index for index, key in enumerate(self.possible_keys)}
+        self.all_codes = mami.make_full_samplespace(pegs, colors)
+
+    def full_samplespace(self):
+        return self.all_codes
+
+    def from_lists(self, codes):
+        return [list(code) for code in codes]
+
+    def to_lists(self, codes):
+        return [list(code) for code in codes]
+
+    def from_numbers(self, numbers):
+        return [mami.int_to_code(number, self.pegs, self.colors) for number in numbers]
+
+    def to_numbers(self, codes):
+        return [mami.code_to_int(code, self.colors) for code in codes]
+
+    def keys(self, codes, guesses):
+        """
+        Returns the keys (as indices) of all pairs: entry [i][j] is the key of codes[i] against guesses[j]
+        """
+        return [[self.key_indices[mami.calculate_key(code, guess)] for guess in guesses] for code in codes]
+
+    def partition_counts(self, samplespace, guesses=None):
+        """
+        Returns the partition sizes (in the order of the keys) of the samplespace for each guess
+        (every code if guesses isn't given)
+        """
+        if guesses is None:
+            guesses = self.all_codes
+        return [mami.partition_sizes(guess, samplespace, self.possible_keys) for guess in guesses]
+
+    def filter(self, samplespace, guess, key):
+        """
+        Returns the codes in the samplespace giving the key (an index) against the guess
+        """
+        return mami.update_samplespace(samplespace, guess, self.possible_keys[key])
+
+    def size(self, samplespace):
+        return len(samplespace)
+
+    def best_guess(self, samplespace, guesses=None):
+        """
+        Returns Knuth's guess given the samplespace (and the guesses so far, if given)
+        together with its max error (None if there are at most 2 codes), cf. mami.best_guess
+        """
+        return mami.best_guess(samplespace, self.all_codes, self.possible_keys, guesses)
+
+
+class TableEngine(ListEngine):
+    """
+    Codes as numbers, samplespaces as lists of numbers, with a key table (cf. mami.make_key_table)
+    """
+    name = 'table'
+
+    def __init__(self, pegs=4, colors=6, key_table=None):
+        super().__init__(pegs, colors)
+        self.key_table = key_table if key_table is not None else mami.make_key_table(pegs, colors)
+
+    def full_samplespace(self):
+        return list(range(len(self.all_codes)))
+
+    def from_lists(self, codes):
+        return [mami.code_to_int(code, self.colors) for code in codes]
+
+    def to_lists(self, codes):
+        return [self.all_codes[code] for code in codes]
+
+    def from_numbers(self, numbers):
+        return [int(number) for number in numbers]
+
+    def to_numbers(self, codes):
+        return list(codes)
+
+    def keys(self, codes, guesses):
+        rows = [mami.key_table_row(guess, self.key_table) for guess in guesses]
+        return [[row[code] for row in rows] for code in codes]
+
+    def partition_counts(self, samplespace, guesses=None):
+        if guesses is None:
+            guesses = range(len(self.all_codes))
+        return [mami.partition_sizes(guess, samplespace, self.possible_keys, self.key_table) for guess in guesses]
+
+    def filter(self, samplespace, guess, key):
+        return mami.update_samplespace(samplespace, guess, key, self.key_table)
+
+    def best_guess(self, samplespace, guesses=None):
+        return mami.best_guess(samplespace, self.all_codes, self.possible_keys, guesses, self.key_table)
+
+
+class NumpyEngine:
+    """
+    Codes as numbers, samplespaces as ndarrays of numbers; keys are found with the compact representation
+    of vectorizing.py (digits and color histograms), and looked up in the key matrix if it's kept
+    """
+    name = 'numpy'
+
+    def __init__(self, pegs=4, colors=6, key_matrix=None, block_size=256):
+        """
+        key_matrix: the keys (indices) of all pairs of codes as ndarray shape (n, n), e.g. from a key file
+        (cf. mami_keyfile), or True or False for computing them or not (by default if n <= KEY_MATRIX_SIZE)
+        """
+        import numpy as np
+        import vectorizing
+        self.np = np
+        self.vectorizing = vectorizing
+        self.pegs = pegs
+        self.colors = colors
+        self.block_size = block_size
+        self.possible_keys = mami.make_possible_keys(pegs, colors)
+        n = colors**pegs
+        # the digits in the order of mami.code_to_int (first peg most significant):
+        self.digits = vectorizing.make_possible_digits(colors, pegs)[:, ::-1].copy()
+        self.histograms = vectorizing.make_color_histograms(self.digits, colors)
+        # from the encoding black + white*(pegs+1) of vectorizing.py to the indices of the keys:
+        self.key_indices = np.zeros((pegs + 1)**2, dtype=np.uint8)
+        for index, (black, white) in enumerate(self.possible_keys):
+            self.key_indices[black + white*(pegs + 1)] = index
+        if key_matrix is None:
+            key_matrix = n <= KEY_MATRIX_SIZE
+        if key_matrix is True:
+            key_matrix = self.compute_keys(np.arange(n), np.arange(n))
+        self.key_matrix = key_matrix if key_matrix is not False else None
+
+    def compute_keys(self, codes, guesses):
+        keys = self.vectorizing.calculate_key_compact(self.digits[codes], self.digits[guesses], self.histograms[codes],
+                                                      self.histograms[guesses], self.block_size)
+        return self.key_indices[keys]
+
+    def full_samplespace(self):
+        return self.np.arange(self.colors**self.pegs)
+
+    def from_lists(self, codes):
+        return self.np.array([mami.code_to_int(code, self.colors) for code in codes], dtype=int)
+
+    def to_lists(self, codes):
+        return [self.digits[code].tolist() for code in codes]
+
+    def from_numbers(self, numbers):
+        return self.np.asarray(numbers, dtype=int)
+
+    def to_numbers(self, codes):
+        return [int(code) for code in codes]
+
+    def keys(self, codes, guesses):
+        codes = self.np.asarray(codes)
+        guesses = self.np.asarray(guesses)
+        if self.key_matrix is not None:
+            return self.key_matrix[self.np.ix_(codes, guesses)]
+        return self.compute_keys(codes, guesses)
+
+    def partition_counts(self, samplespace, guesses=None):
+        """
+        Returns ndarray shape (no. of guesses, no. of keys) with the partition sizes of the samplespace
+        for each guess (every code if guesses isn't given), block_size guesses at a time
+        """
+        np = self.np
+        if guesses is None:
+            guesses = np.arange(self.colors**self.pegs)
+        guesses = np.asarray(guesses)
+        no_keys = len(self.possible_keys)
+        counts = np.empty((len(guesses), no_keys), dtype=np.int64)
+        for start in range(0, len(guesses), self.block_size):
+            block = guesses[start:start + self.block_size]
+            keys = self.keys(samplespace, block).T # shape (guesses in block, samplespace)
+            offsets = keys + no_keys*np.arange(len(block)).reshape(-1, 1)
+            counts[start:start + len(block)] = np.bincount(offsets.ravel(),
+                                                           minlength=len(block)*no_keys).reshape(-1, no_keys)
+        return counts
+
+    def filter(self, samplespace, guess, key):
+        samplespace = self.np.asarray(samplespace)
+        return samplespace[self.keys(samplespace, [guess])[:, 0] == key]
+
+    def size(self, samplespace):
+        return len(samplespace)
+
+    def best_guess(self, samplespace, guesses=None):
+        """
+        Returns Knuth's guess (the first code with the smallest max error, preferring codes in the samplespace)
+        together with its max error (None if there are at most 2 codes)
+        """
+        np = self.np
+        if len(samplespace) < 3:
+            return int(samplespace[0]), None
+        max_errors = self.partition_counts(samplespace).max(axis=1)
+        smallest = max_errors.min()
+        in_samplespace = np.flatnonzero(max_errors[samplespace] == smallest)
+        if len(in_samplespace):
+            return int(samplespace[in_samplespace[0]]), int(smallest)
+        return int(np.argmax(max_errors == smallest)), int(smallest)
+
+
+def numpy_available():
+    try:
+        import numpy
+        return True
+    except ImportError:
+        return False
+
+
+def choose_engine(pegs=4, colors=6):
+    """
+    Returns the name of the engine that's fastest at playing all hidden codes of the size:
+    the list engine for tiny games, the table engine while the key table is small, and NumPy
+    (if it's installed) from there on
+    """
+    n = colors**pegs
+    if n < TABLE_ENGINE_SIZE:
+        return 'list'
+    if n < NUMPY_ENGINE_SIZE or not numpy_available():
+        return 'table' if n <= mami_tables.KEY_TABLE_SIZE else 'list'
+    return 'numpy'
+
+
+def get_engine(engine='auto', pegs=4, colors=6, key_directory=None):
+    """
+    Returns an engine for the size: the engine itself if one is given,
+    else by name ('list', 'table', 'numpy', or 'auto' for choose_engine)
+    If key_directory is given, the table and NumPy engines memory-map their keys from a key file
+    there (cf. mami_keyfile), which is written the first time, instead of computing them
+    """
+    if not isinstance(engine, str):
+        return engine
+    if engine == 'auto':
+        engine = choose_engine(pegs, colors)
+    if engine not in ENGINES:
+        raise ValueError('Unknown engine: {} (the engines are: {})'.format(engine, ', '.join(ENGINES)))
+    if key_directory is not None and engine != 'list':
+        import mami_keyfile
+        keys = mami_keyfile.load_key_file(pegs, colors, 'index', 'mami', key_directory)
+        if engine == 'table':
+            return TableEngine(pegs, colors, keys.reshape(-1))
+        return NumpyEngine(pegs, colors, keys)
+    return {'list': ListEngine, 'table': TableEngine, 'numpy': NumpyEngine}[engine](pegs, colors)
+
+
+def play_game(engine, hidden_code, first_guess=None):
+    """
+    Plays one game with Knuth's algorithm against the hidden code (in the engine's format)
+    and returns the number of guesses used
+    """
+    solved = engine.possible_keys.index((engine.pegs, 0))
+    samplespace = engine.full_samplespace()
+    guesses = []
+    guess = first_guess if first_guess is not None else engine.best_guess(samplespace)[0]
+    while True:
+        guesses.append(guess)
+        key = engine.keys([hidden_code], [guess])[0][0]
+        if key == solved:
+            return len(guesses)
+        samplespace = engine.filter(samplespace, guess, key)
+        guess = engine.best_guess(samplespace, guesses)[0]
+
+
+def play_games(engine, numbers, first_guess=None):
+    """
+    Plays one game against each of the hidden codes given as numbers (cf. mami.code_to_int)
+    and returns the list of the numbers of guesses used
+    """
+    if first_guess is None:
+        first_guess = engine.best_guess(engine.full_samplespace())[0]
+    return [play_game(engine, code, first_guess) for code in engine.from_numbers(numbers)]
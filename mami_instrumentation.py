@@ -0,0 +1,168 @@
+"""
+Opt-in instrumentation of mami.py: counts calls of calculate_key, times each call of
+best_guess and each update of the samplespace, records the size of the samplespace at
+every turn, and reports progress and ETA while running through the hidden codes.
+
+The functions in mami are only replaced by instrumented ones inside a
+'with Instrumentation():' block, so mami runs exactly as fast as before otherwise.
+Games played in worker processes or with an engine (find_maximum_number_of_guesses with
+workers > 1 or engine) are only counted (with their numbers of guesses, for the progress),
+as they don't go through the functions in this process.
+"""
+
+import inspect
+import json
+import time
+import mami
+
+
+class Instrumentation:
+    """
+    Context manager instrumenting mami while active
+
+    >>> with Instrumentation(progress_every=100) as instrumentation:
+    ...     mami.find_maximum_number_of_guesses(4, 6)
+    >>> instrumentation.report()
+    """
+    INSTRUMENTED = ['calculate_key', 'best_guess', 'update_samplespace', 'update_samplespace_bits',
+                    'computer_as_codebreaker', 'find_maximum_number_of_guesses']
+
+    def __init__(self, progress_every=None, output=print):
+        """
+        If progress_every is given, progress and ETA are passed to 'output' (as a string)
+        every time that number of hidden codes have been played
+        """
+        self.progress_every = progress_every
+        self.output = output
+        self.calculate_key_calls = 0
+        self.best_guess_times = []
+        self.filtering_times = []
+        self.games = []
+        self.game = None # the game being played
+        self.total = None # no. of hidden codes to play in find_maximum_number_of_guesses
+        self.sweep_start = None
+        self.originals = {}
+
+    def __enter__(self):
+        for name in self.INSTRUMENTED:
+            self.originals[name] = getattr(mami, name)
+            setattr(mami, name, getattr(self, '_' + name))
+        return self
+
+    def __exit__(self, *exception):
+        for name, function in self.originals.items():
+            setattr(mami, name, function)
+        self.originals = {}
+        return False
+
+    # the instrumented versions of the functions in mami:
+
+    def _calculate_key(self, code, guess):
+        self.calculate_key_calls += 1
+        return self.originals['calculate_key'](code, guess)
+
+    def _best_guess(self, samplespace, *args):
+        start = time.perf_counter()
+        result = self.originals['best_guess'](samplespace, *args)
+        seconds = time.perf_counter() - start
+        self.best_guess_times.append(seconds)
+        if self.game is not None:
+            self.game['Turns'].append({'Samplespace': len(samplespace), 'best_guess time': seconds})
+        return result
+
+    def _record_filtering(self, seconds, size):
+        self.filtering_times.append(seconds)
+        if self.game is not None:
+            self.game['Samplespace sizes'].append(size)
+            if self.game['Turns']:
+                self.game['Turns'][-1]['Filtering time'] = seconds
+
+    def _update_samplespace(self, *args):
+        start = time.perf_counter()
+        result = self.originals['update_samplespace'](*args)
+        self._record_filtering(time.perf_counter() - start, len(result))
+        return result
+
+    def _update_samplespace_bits(self, *args):
+        start = time.perf_counter()
+        result = self.originals['update_samplespace_bits'](*args)
+        self._record_filtering(time.perf_counter() - start, result.bit_count())
+        return result
+
+    def _computer_as_codebreaker(self, hidden_code, *args):
+        game = {'Hidden code': hidden_code, 'Turns': [], 'Samplespace sizes': []}
+        self.game = game
+        start = time.perf_counter()
+        try:
+            game['Guesses'] = self.originals['computer_as_codebreaker'](hidden_code, *args)
+        finally:
+            self.game = None
+        game['Time'] = time.perf_counter() - start
+        self._add_game(game)
+        return game['Guesses']
+
+    def _add_game(self, game):
+        self.games.append(game)
+        if self.progress_every and self.total and len(self.games) % self.progress_every == 0:
+            self.output(self.progress_message())
+
+    def _find_maximum_number_of_guesses(self, *args, **kwargs):
+        arguments = inspect.signature(self.originals['find_maximum_number_of_guesses']).bind(*args, **kwargs)
+        arguments.apply_defaults()
+        pegs, colors = arguments.arguments['pegs'], arguments.arguments['colors']
+        self.total = len(self.games) + colors**pegs - len(arguments.arguments['done'] or {})
+        self.sweep_start = (time.perf_counter(), len(self.games))
+        workers, on_done = arguments.arguments['workers'], arguments.arguments['on_done']
+        if arguments.arguments['engine'] is not None or (workers is not None and workers > 1):
+            # the games aren't played by computer_as_codebreaker in this process, so they're counted by chunk:
+            def count_games(numbers, times):
+                for number, guesses in zip(numbers, times):
+                    self._add_game({'Hidden code': mami.int_to_code(number, pegs, colors), 'Guesses': guesses})
+                if on_done is not None:
+                    on_done(numbers, times)
+            arguments.arguments['on_done'] = count_games
+        try:
+            return self.originals['find_maximum_number_of_guesses'](*arguments.args, **arguments.kwargs)
+        finally:
+            self.total = None
+
+    def progress(self):
+        """
+        Returns dict with the no. of hidden codes played and to play in the current
+        find_maximum_number_of_guesses, the time elapsed, and the estimated time left (in seconds)
+        """
+        if self.sweep_start is None:
+            return None
+        started, games_before = self.sweep_start
+        done = len(self.games) - games_before
+        total = (self.total if self.total is not None else len(self.games)) - games_before
+        elapsed = time.perf_counter() - started
+        eta = elapsed/done*(total - done) if done else None
+        return {'Done': done, 'Total': total, 'Elapsed': elapsed, 'ETA': eta}
+
+    def progress_message(self):
+        """
+        Returns the progress as a line of text (ETA: - until a hidden code has been played)
+        """
+        progress = self.progress()
+        if progress is None:
+            return 'Hidden codes: no run through all hidden codes yet'
+        return 'Hidden codes: {}/{}, elapsed: {:.1f} s, ETA: {}'.format(
+               progress['Done'], progress['Total'], progress['Elapsed'],
+               '-' if progress['ETA'] is None else '{:.1f} s'.format(progress['ETA']))
+
+    def report(self):
+        """
+        Returns the collected data as a dict (which can be saved as JSON)
+        """
+        return {'calculate_key calls': self.calculate_key_calls,
+                'best_guess': {'Calls': len(self.best_guess_times), 'Time': sum(self.best_guess_times),
+                               'Max time': max(self.best_guess_times, default=0)},
+                'Filtering': {'Calls': len(self.filtering_times), 'Time': sum(self.filtering_times),
+                              'Max time': max(self.filtering_times, default=0)},
+                'Games': self.games,
+                'Progress': self.progress()}
+
+    def save_report(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.report(), file)
@@ -0,0 +1,133 @@
+"""
+Key tables on disk: the keys of all pairs of codes of a game size are computed once and written
+to a binary file, which later runs open with np.memmap instead of computing them again. The pages
+are read lazily by the OS (so opening is instant, and only the rows used are read), and processes
+on the same host share them through the page cache.
+
+The file is a header of HEADER_SIZE bytes followed by the n*n keys (uint8, n = colors**pegs), row
+by row: entry (code, guess) is at HEADER_SIZE + code*n + guess. The header holds a magic string,
+the format version, the pegs and colors, and how keys and codes are numbered:
+* key encoding 'index': the index of the key in mami.make_possible_keys (as in mami.make_key_table),
+  'vectorizing': black + white*(pegs+1) (as in vectorizing.calculate_key_compact)
+* code ordering 'mami': the first peg is the most significant digit (mami.code_to_int),
+  'vectorizing': the first peg is the least significant digit (vectorizing.make_possible_digits)
+
+    >>> allkeys = load_key_file(4, 6) # vectorizing.make_key_matrix(6, 4), written the first time
+    >>> key_table = load_key_file(4, 6, 'index', 'mami').reshape(-1) # for mami.key_table_row
+"""
+
+import os
+import struct
+import numpy as np
+import mami
+import vectorizing
+
+KEY_FILE_DIRECTORY = 'key_tables'
+MAGIC = b'MAMIKEYS'
+VERSION = 1
+HEADER_SIZE = 64 # so the body is aligned
+HEADER_FORMAT = '<8sHHHBB'
+KEY_ENCODINGS = ['index', 'vectorizing']
+CODE_ORDERINGS = ['mami', 'vectorizing']
+
+
+def key_file_name(pegs=4, colors=6, encoding='vectorizing', ordering='vectorizing', directory=KEY_FILE_DIRECTORY):
+    return os.path.join(directory, 'keys_{}x{}_{}_{}.bin'.format(pegs, colors, encoding, ordering))
+
+
+def make_ordered_digits(pegs=4, colors=6, ordering='vectorizing'):
+    """
+    Returns the digits and color histograms of all codes, in the given code ordering
+    """
+    digits = vectorizing.make_possible_digits(colors, pegs)
+    if ordering == 'mami':
+        digits = digits[:, ::-1].copy()
+    return digits, vectorizing.make_color_histograms(digits, colors)
+
+
+def compute_key_rows(start, stop, pegs=4, colors=6, encoding='vectorizing', ordering='vectorizing', block_size=256,
+                     digits=None, histograms=None):
+    """
+    Returns ndarray shape (stop - start, colors**pegs) of uint8 with rows start to stop of the key table
+    The digits and histograms (cf. make_ordered_digits) are made if not given
+    """
+    if digits is None or histograms is None:
+        digits, histograms = make_ordered_digits(pegs, colors, ordering)
+    keys = vectorizing.calculate_key_compact(digits[start:stop], digits, histograms[start:stop], histograms, block_size)
+    if encoding == 'index':
+        key_indices = np.zeros((pegs + 1)**2, dtype=np.uint8)
+        for index, (black, white) in enumerate(mami.make_possible_keys(pegs, colors)):
+            key_indices[black + white*(pegs + 1)] = index
+        keys = key_indices[keys]
+    return keys
+
+
+def write_key_file(filename, pegs=4, colors=6, encoding='vectorizing', ordering='vectorizing', block_size=256):
+    """
+    Computes the key table block_size rows at a time (so only one block is in memory) and writes it to the file
+    The file is written under a temporary name and renamed when complete, so an interrupted run leaves no partial file
+    """
+    if encoding not in KEY_ENCODINGS or ordering not in CODE_ORDERINGS:
+        raise ValueError('Unknown key encoding or code ordering: {}, {}'.format(encoding, ordering))
+    n = colors**pegs
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, pegs, colors, KEY_ENCODINGS.index(encoding),
+                         CODE_ORDERINGS.index(ordering))
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = '{}.{}.tmp'.format(filename, os.getpid()) # so processes can write the same file at once
+    digits, histograms = make_ordered_digits(pegs, colors, ordering)
+    with open(temporary, 'wb') as file:
+        file.write(header.ljust(HEADER_SIZE, b'\0'))
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            file.write(compute_key_rows(start, stop, pegs, colors, encoding, ordering, block_size,
+                                        digits, histograms).tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, filename)
+
+
+def read_header(filename):
+    """
+    Returns dict with the pegs, colors, key encoding, and code ordering of a key file
+    (ValueError if it isn't a complete key file of this version)
+    """
+    with open(filename, 'rb') as file:
+        header = file.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a key file: {}'.format(filename))
+    magic, version, pegs, colors, encoding, ordering = struct.unpack_from(HEADER_FORMAT, header)
+    if version != VERSION:
+        raise ValueError('Key file {} has version {}, not {}'.format(filename, version, VERSION))
+    if os.path.getsize(filename) != HEADER_SIZE + (colors**pegs)**2:
+        raise ValueError('Key file {} is truncated'.format(filename))
+    return {'Pegs': pegs, 'Colors': colors, 'Key encoding': KEY_ENCODINGS[encoding],
+            'Code ordering': CODE_ORDERINGS[ordering]}
+
+
+def open_key_file(filename, pegs=None, colors=None, encoding=None, ordering=None):
+    """
+    Returns the key table in the file as a read-only np.memmap shape (n, n)
+    The pegs, colors, encoding, and ordering (those given) are checked against the header
+    """
+    header = read_header(filename)
+    for heading, expected in [('Pegs', pegs), ('Colors', colors), ('Key encoding', encoding),
+                              ('Code ordering', ordering)]:
+        if expected is not None and header[heading] != expected:
+            raise ValueError('Key file {} has {} {}, not {}'.format(filename, heading.lower(), header[heading],
+                                                                   expected))
+    n = header['Colors']**header['Pegs']
+    return np.memmap(filename, dtype=np.uint8, mode='r', offset=HEADER_SIZE, shape=(n, n))
+
+
+def load_key_file(pegs=4, colors=6, encoding='vectorizing', ordering='vectorizing', directory=KEY_FILE_DIRECTORY,
+                  block_size=256):
+    """
+    Returns the key table of the size (cf. open_key_file) from the directory, writing it first
+    (block_size rows at a time) if it isn't there
+    """
+    filename = key_file_name(pegs, colors, encoding, ordering, directory)
+    if not os.path.exists(filename):
+        write_key_file(filename, pegs, colors, encoding, ordering, block_size)
+    return open_key_file(filename, pegs, colors, encoding, ordering)
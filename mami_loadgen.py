@@ -0,0 +1,96 @@
+"""
+Load generator for mami_server.py: opens many connections at once, each playing games where
+every guess is the server's hint, and reports throughput and latency of the requests.
+With random guesses, each game starts with that many random guesses (each followed by a hint
+request, as a player asking after their own guess would), so the hints are off the strategy
+tree and have to be searched for, instead of looked up.
+
+Run with: python mami_loadgen.py [clients] [games per client] [pegs] [colors] [port] [random guesses]
+(start the server first)
+"""
+
+import asyncio
+import json
+import random
+import sys
+import time
+import mami_server
+
+
+async def request(reader, writer, latencies, **message):
+    start = time.perf_counter()
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    latencies.setdefault(message['command'], []).append(time.perf_counter() - start)
+    if 'error' in reply:
+        raise RuntimeError(reply['error'])
+    return reply
+
+
+async def client(games, pegs, colors, latencies, host='127.0.0.1', port=mami_server.PORT, random_guesses=0,
+                 seed=None):
+    """
+    Plays the games over one connection, letting the server's hints make the guesses
+    (after random_guesses random ones, drawn with the seed)
+    Returns list of the number of guesses used in each game
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    attempts = []
+    try:
+        for game in range(games):
+            session = (await request(reader, writer, latencies, command='new', pegs=pegs, colors=colors))['session']
+            solved = False
+            for turn in range(random_guesses):
+                guess = [rng.randrange(colors) for peg in range(pegs)]
+                reply = await request(reader, writer, latencies, command='guess', session=session, guess=guess)
+                solved = reply['solved']
+                if solved:
+                    break
+                await request(reader, writer, latencies, command='hint', session=session)
+            while not solved:
+                guess = (await request(reader, writer, latencies, command='hint', session=session))['guess']
+                reply = await request(reader, writer, latencies, command='guess', session=session, guess=guess)
+                solved = reply['solved']
+            await request(reader, writer, latencies, command='end', session=session)
+            attempts.append(reply['guesses'])
+    finally:
+        writer.close()
+    return attempts
+
+
+def percentile(times, fraction):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(fraction*len(times)))]
+
+
+async def generate_load(clients=100, games=10, pegs=4, colors=6, host='127.0.0.1', port=mami_server.PORT,
+                        random_guesses=0):
+    """
+    Runs the clients concurrently (each with random_guesses random guesses at the start of each game)
+    Returns dict with the number of games and requests, the requests per second,
+    the max number of guesses, and the median, 99th percentile and max latency (in seconds) per command
+    """
+    latencies = {}
+    start = time.perf_counter()
+    results = await asyncio.gather(*[client(games, pegs, colors, latencies, host, port, random_guesses, index)
+                                     for index in range(clients)])
+    seconds = time.perf_counter() - start
+    requests = sum(len(times) for times in latencies.values())
+    return {'Games': clients*games, 'Requests': requests, 'Time': seconds, 'Requests per second': requests/seconds,
+            'Max guesses': max(max(attempts) for attempts in results),
+            'Latency': {command: {'Median': percentile(times, 0.5), '99th percentile': percentile(times, 0.99),
+                                  'Max': max(times)} for command, times in latencies.items()}}
+
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    defaults = [100, 10, 4, 6, mami_server.PORT, 0]
+    clients, games, pegs, colors, port, random_guesses = arguments + defaults[len(arguments):]
+    result = asyncio.run(generate_load(clients, games, pegs, colors, port=port, random_guesses=random_guesses))
+    print('{Games} games, {Requests} requests in {Time:.2f} s ({Requests per second:.0f} requests/s), '
+          'max {Max guesses} guesses'.format(**result))
+    for command, latency in result['Latency'].items():
+        print('{:>5}: median {:.2f} ms, 99th percentile {:.2f} ms, max {:.2f} ms'.format(
+            command, 1000*latency['Median'], 1000*latency['99th percentile'], 1000*latency['Max']))
@@ -0,0 +1,198 @@
+"""
+Monte Carlo estimate of the average number of guesses of Knuth's algorithm, for game sizes
+too large to play against every hidden code (cf. find_maximum_number_of_guesses).
+
+The hidden codes are drawn as a seeded array of code numbers (cf. mami.code_to_int), a batch
+at a time, and each batch is played at once: the hidden codes are grouped by the keys they have
+given so far (the codebreaker's samplespace is the same within a group), so each guess is found
+once per group rather than once per hidden code, and the keys of a whole group against the guess
+come from one call to the engine (cf. mami_engines). The guesses found are kept between batches.
+
+The running mean, variance, and confidence interval are updated after each batch, and the
+run stops when the confidence interval is narrow enough. Each batch has its own random stream
+(spawned from the seed with numpy.random.SeedSequence), so batches can be played by worker
+processes, and the result for a seed is the same with any number of workers. NumPy is only
+imported for the statistics and the random streams, so play_batch (used by mami.test_game_randomized)
+runs with the list and table engines without it.
+
+    >>> result = evaluate(5, 7, seed=1, precision=0.01)
+"""
+
+import math
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+import mami_engines
+
+BATCH_SIZE = 256
+MAX_GAMES = 10**6
+# no stopping before this many games, so the variance is estimated well enough:
+MIN_GAMES = 2*BATCH_SIZE
+
+
+class RunningStats:
+    """
+    Count, mean, and variance of a stream of numbers (Welford's algorithm, batch by batch),
+    with the confidence interval of the mean (normal approximation)
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.squares = 0.0 # sum of squared deviations from the mean
+        self.minimum = None
+        self.maximum = None
+        self.histogram = {}
+
+    def add(self, values):
+        """
+        Adds a batch of numbers
+        """
+        import numpy as np
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        count = len(values)
+        mean = float(values.mean())
+        squares = float(((values - mean)**2).sum())
+        delta = mean - self.mean
+        total = self.count + count
+        self.squares += squares + delta**2*self.count*count/total
+        self.mean += delta*count/total
+        self.count = total
+        self.minimum = float(values.min()) if self.minimum is None else min(self.minimum, float(values.min()))
+        self.maximum = float(values.max()) if self.maximum is None else max(self.maximum, float(values.max()))
+        for value, times in zip(*np.unique(values, return_counts=True)):
+            self.histogram[int(value)] = self.histogram.get(int(value), 0) + int(times)
+
+    def variance(self):
+        """
+        The sample variance (0 for fewer than 2 numbers)
+        """
+        return self.squares/(self.count - 1) if self.count > 1 else 0.0
+
+    def half_width(self, confidence=0.95):
+        """
+        Half the width of the confidence interval of the mean (inf for fewer than 2 numbers)
+        """
+        if self.count < 2:
+            return float('inf')
+        z = statistics.NormalDist().inv_cdf((1 + confidence)/2)
+        return z*math.sqrt(self.variance()/self.count)
+
+    def confidence_interval(self, confidence=0.95):
+        half_width = self.half_width(confidence)
+        return self.mean - half_width, self.mean + half_width
+
+
+def play_batch(engine, numbers, first_guess, guess_cache=None):
+    """
+    Plays one game against each of the hidden codes given as numbers, all at once (cf. the module docstring),
+    and returns the list of the numbers of guesses used
+    guess_cache is a dict {keys so far: guess} kept between calls with the same engine
+    """
+    if guess_cache is None:
+        guess_cache = {}
+    solved = engine.possible_keys.index((engine.pegs, 0))
+    hidden_codes = engine.from_numbers(numbers)
+    times = [0]*len(numbers)
+    # the groups of hidden codes with the same keys so far: (keys so far, guesses so far, samplespace, indices)
+    groups = [((), [first_guess], engine.full_samplespace(), list(range(len(numbers))))]
+    while groups:
+        next_groups = []
+        for history, guesses, samplespace, indices in groups:
+            guess = guesses[-1]
+            keys = engine.keys([hidden_codes[index] for index in indices], [guess])
+            by_key = {}
+            for index, row in zip(indices, keys):
+                by_key.setdefault(int(row[0]), []).append(index)
+            for key, members in by_key.items():
+                if key == solved:
+                    for index in members:
+                        times[index] = len(guesses)
+                    continue
+                next_samplespace = engine.filter(samplespace, guess, key)
+                next_history = history + (key,)
+                if next_history not in guess_cache:
+                    guess_cache[next_history] = engine.best_guess(next_samplespace, guesses)[0]
+                next_groups.append((next_history, guesses + [guess_cache[next_history]], next_samplespace, members))
+        groups = next_groups
+    return times
+
+
+def draw_codes(seed_sequence, size, pegs, colors):
+    """
+    Returns the code numbers of a batch of random hidden codes from the random stream of the seed sequence
+    """
+    import numpy as np
+    return np.random.default_rng(seed_sequence).integers(0, colors**pegs, size).tolist()
+
+
+# the engine, first guess, and guess cache of a worker process, set once in each worker:
+_worker_game = None
+
+def _init_worker(pegs, colors, engine, first_guess):
+    global _worker_game
+    _worker_game = (mami_engines.get_engine(engine, pegs, colors), first_guess, {})
+
+def _play_batch_in_worker(seed_sequence, size):
+    engine, first_guess, guess_cache = _worker_game
+    return play_batch(engine, draw_codes(seed_sequence, size, engine.pegs, engine.colors), first_guess, guess_cache)
+
+
+def evaluate(pegs=4, colors=6, seed=None, precision=0.01, confidence=0.95, batch_size=BATCH_SIZE,
+             max_games=MAX_GAMES, min_games=MIN_GAMES, workers=None, engine='auto', on_batch=None):
+    """
+    Plays batches of random hidden codes with Knuth's algorithm until the confidence interval of the
+    average number of guesses is at most precision wide on each side (or max_games have been played)
+    With workers > 1, that many processes play batches (several at a time, in the order they'd be
+    played without workers, and those played after the stopping point are discarded)
+    on_batch (if given) is called with the running statistics (RunningStats) after each batch
+    Returns dict with the estimate, its confidence interval, and the histogram of the games played
+    """
+    import numpy as np
+    start = time.perf_counter()
+    seed_sequence = np.random.SeedSequence(seed)
+    engine_name = engine if isinstance(engine, str) else None
+    engine = mami_engines.get_engine(engine, pegs, colors)
+    first_guess = engine.best_guess(engine.full_samplespace())[0]
+    stats = RunningStats()
+    def batches():
+        while stats.count < max_games:
+            yield seed_sequence.spawn(1)[0], min(batch_size, max_games - stats.count)
+    def done():
+        return (stats.count >= max_games or
+                stats.count >= min_games and stats.half_width(confidence) <= precision)
+    executor = None
+    try:
+        if workers is None or workers <= 1 or engine_name is None:
+            guess_cache = {}
+            for batch_seed, size in batches():
+                stats.add(play_batch(engine, draw_codes(batch_seed, size, pegs, colors), first_guess, guess_cache))
+                if on_batch is not None:
+                    on_batch(stats)
+                if done():
+                    break
+        else:
+            executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                           initargs=(pegs, colors, engine.name, first_guess))
+            # a batch size per batch (not depending on how far the running batches get), so results match the serial run:
+            pending = []
+            spawned = 0
+            while not done():
+                while len(pending) < 2*workers and spawned < max_games:
+                    size = min(batch_size, max_games - spawned)
+                    pending.append(executor.submit(_play_batch_in_worker, seed_sequence.spawn(1)[0], size))
+                    spawned += size
+                stats.add(pending.pop(0).result())
+                if on_batch is not None:
+                    on_batch(stats)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    low, high = stats.confidence_interval(confidence)
+    return {'Pegs': pegs, 'Colors': colors, 'Engine': engine.name, 'Seed': seed_sequence.entropy,
+            'Games': stats.count, 'Average': stats.mean, 'Variance': stats.variance(),
+            'Confidence': confidence, 'Confidence interval': [low, high],
+            'Converged': stats.half_width(confidence) <= precision,
+            'Minimum': int(stats.minimum), 'Maximum': int(stats.maximum),
+            'Histogram': dict(sorted(stats.histogram.items())), 'Time': time.perf_counter() - start}
@@ -0,0 +1,331 @@
+"""
+Exact optimal strategies for the codebreaker, to compare Knuth's algorithm against:
+the smallest maximal number of guesses (for any game size small enough for a key table),
+and the smallest average number of guesses (for small game sizes only).
+
+The search is over samplespaces (the codes consistent with the guesses and keys so far).
+Results are kept in a transposition table keyed by the samplespace as a bitset of code numbers,
+mapped to its smallest image under the symmetries of the game (permutations of the pegs and
+of the colors) where that's cheap, so samplespaces reached by different or symmetric
+sequences of guesses are only searched once. The table evicts the least recently used
+entries once it's full. Only one guess from each symmetry class (cf. mami.symmetry_classes)
+is tried, and the search is pruned with these lower bounds:
+* with w guesses left, at most f(w) codes can be told apart, where f(1) = 1 and
+  f(w) = 1 + (K-1)*f(w-1) for K valid keys (a guess splits the samplespace into at most
+  K-1 parts, plus the guess itself if it's the hidden code)
+* after a first guess with max error mu >= 2, at least mami.find_lower_bound(mu, pegs) guesses are needed
+* the sum of the numbers of guesses over n codes is at least that of guessing 1 code
+  with 1 guess, K-1 codes with 2 guesses, (K-1)**2 codes with 3 guesses, and so on
+"""
+
+import itertools
+import time
+from collections import OrderedDict
+import mami
+
+# largest number of symmetries times codes for which the symmetries are stored as maps of code numbers:
+SYMMETRY_TABLE_SIZE = 2*10**6
+# largest number of symmetries times size of the samplespace for which the samplespace is mapped to its canonical form:
+CANONICAL_WORK = 10**5
+# largest number of codes for which the smallest average number of guesses is searched for by default:
+AVERAGE_SIZE = 256
+
+
+def max_codes(guesses, no_keys):
+    """
+    Returns the largest number of codes that can be told apart with the number of guesses (f above)
+    """
+    codes = 0
+    for guess in range(guesses):
+        codes = 1 + (no_keys - 1)*codes
+    return codes
+
+
+def guesses_lower_bound(size, no_keys):
+    """
+    Returns the smallest number of guesses that can find any of 'size' codes (size >= 1)
+    """
+    guesses = 1
+    while max_codes(guesses, no_keys) < size:
+        guesses += 1
+    return guesses
+
+
+def total_lower_bound(size, no_keys):
+    """
+    Returns a lower bound for the sum over 'size' codes of the number of guesses needed to find each
+    """
+    total = 0
+    guesses = 1
+    codes = 1 # the most codes that can be found with exactly 'guesses' guesses
+    while size > 0:
+        total += guesses*min(size, codes)
+        size -= codes
+        guesses += 1
+        codes *= no_keys - 1
+    return total
+
+
+class TranspositionTable:
+    """
+    Dict of at most max_entries entries, evicting the least recently used entry when full
+    """
+    def __init__(self, max_entries=10**6):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class OptimalSolver:
+    """
+    Search for optimal strategies for one game size (cf. worst_case and average)
+    """
+    def __init__(self, pegs=4, colors=6, max_entries=10**6):
+        self.pegs = pegs
+        self.colors = colors
+        self.full_samplespace = mami.make_full_samplespace(pegs, colors)
+        self.possible_keys = mami.make_possible_keys(pegs, colors)
+        self.no_keys = len(self.possible_keys)
+        self.solved = self.possible_keys.index((pegs, 0))
+        self.key_table = mami.make_key_table(pegs, colors)
+        self.table = TranspositionTable(max_entries)
+        self.nodes = 0
+        self.symmetries = self.make_symmetries()
+
+    def make_symmetries(self):
+        """
+        Returns the symmetries of the game other than the identity, each as the list of the images
+        of the code numbers (or an empty list if there are too many to store)
+        """
+        count = 1
+        for number in range(2, self.pegs + 1):
+            count *= number
+        for number in range(2, self.colors + 1):
+            count *= number
+        if count*len(self.full_samplespace) > SYMMETRY_TABLE_SIZE:
+            return []
+        symmetries = []
+        for permutation in itertools.permutations(range(self.pegs)):
+            for recoloring in itertools.permutations(range(self.colors)):
+                image = []
+                for code in self.full_samplespace:
+                    mapped = [0]*self.pegs
+                    for index in range(self.pegs):
+                        mapped[permutation[index]] = recoloring[code[index]]
+                    image.append(mami.code_to_int(mapped, self.colors))
+                symmetries.append(image)
+        return symmetries[1:] # the first one is the identity
+
+    def canonical(self, samplespace):
+        """
+        Returns the key of the samplespace (list of code numbers) in the transposition table:
+        the smallest of the bitsets of its images under the symmetries (or just its bitset if that's too much work)
+        """
+        bits = 0
+        for code in samplespace:
+            bits |= 1 << code
+        if len(self.symmetries)*len(samplespace) > CANONICAL_WORK:
+            return bits
+        for image in self.symmetries:
+            image_bits = 0
+            for code in samplespace:
+                image_bits |= 1 << image[code]
+            if image_bits < bits:
+                bits = image_bits
+        return bits
+
+    def candidates(self, history):
+        """
+        Returns the guesses worth trying (as numbers) after the guesses in history:
+        one from each symmetry class
+        """
+        return [mami.code_to_int(code, self.colors)
+                for code in mami.symmetry_classes(self.full_samplespace,
+                                                  [self.full_samplespace[guess] for guess in history], self.colors)]
+
+    def partition(self, guess, samplespace):
+        """
+        Returns the parts of the samplespace given by the guess, except the part of the solved key,
+        as a list of non-empty lists (largest first), or None if the guess gives no information
+        """
+        row = mami.key_table_row(guess, self.key_table)
+        parts = [[] for key in self.possible_keys]
+        for code in samplespace:
+            parts[row[code]].append(code)
+        if len(parts[row[samplespace[0]]]) == len(samplespace) and row[samplespace[0]] != self.solved:
+            return None
+        parts[self.solved] = []
+        return sorted((part for part in parts if part), key=len, reverse=True)
+
+    def scored_guesses(self, samplespace, history):
+        """
+        Returns the useful candidates as (max part size, not in samplespace, guess, parts), best first
+        """
+        members = set(samplespace)
+        scored = []
+        for guess in self.candidates(history):
+            parts = self.partition(guess, samplespace)
+            if parts is not None:
+                scored.append((len(parts[0]) if parts else 0, guess not in members, guess, parts))
+        scored.sort(key=lambda item: item[:3])
+        return scored
+
+    def solvable(self, samplespace, guesses, history=()):
+        """
+        Returns whether every code in the samplespace (list of code numbers) can be found
+        with at most the number of guesses
+        """
+        size = len(samplespace)
+        if size <= 2:
+            return guesses >= size
+        if max_codes(guesses, self.no_keys) < size:
+            return False
+        self.nodes += 1
+        key = ('worst case', self.canonical(samplespace))
+        known = self.table.get(key) # (most guesses known not to be enough, fewest known to be enough)
+        if known is None:
+            known = (0, float('inf'))
+        if guesses <= known[0]:
+            return False
+        if guesses >= known[1]:
+            return True
+        history = list(history)
+        result = False
+        for max_part, outside, guess, parts in self.scored_guesses(samplespace, history):
+            if max_part > max_codes(guesses - 1, self.no_keys):
+                break # and so are the rest
+            if all(self.solvable(part, guesses - 1, history + [guess]) for part in parts):
+                result = True
+                break
+        known = self.table.get(key) or known
+        self.table.put(key, (known[0], min(known[1], guesses)) if result else (max(known[0], guesses), known[1]))
+        return result
+
+    def worst_case(self):
+        """
+        Returns dict with the smallest maximal number of guesses of any strategy, and
+        for each first guess (one from each symmetry class) its max error and the smallest
+        maximal number of guesses of any strategy starting with it
+        """
+        start = time.perf_counter()
+        full = list(range(len(self.full_samplespace)))
+        first_guesses = []
+        for max_error, outside, guess, parts in self.scored_guesses(full, []):
+            # any strategy starting with the guess needs at least this many guesses:
+            bound = mami.find_lower_bound(max_error, self.pegs) if max_error >= 2 else max_error + 1
+            if max_error:
+                bound = max(bound, 1 + guesses_lower_bound(max_error, self.no_keys))
+            guesses = bound
+            while not all(self.solvable(part, guesses - 1, [guess]) for part in parts):
+                guesses += 1
+            first_guesses.append({'Initial guess': self.full_samplespace[guess], 'Max error': max_error,
+                                  'Guesses': guesses})
+        return {'Pegs': self.pegs, 'Colors': self.colors,
+                'Guesses': min(first_guess['Guesses'] for first_guess in first_guesses),
+                'First guesses': first_guesses, 'Nodes': self.nodes, 'Time': time.perf_counter() - start}
+
+    def total_guesses(self, samplespace, history=(), budget=float('inf')):
+        """
+        Returns the smallest possible sum over the codes in the samplespace of the number of guesses needed
+        to find them (if that's budget or more, some number at least budget is returned instead)
+        """
+        size = len(samplespace)
+        if size <= 2:
+            return 2*size - 1
+        self.nodes += 1
+        key = ('average', self.canonical(samplespace))
+        known = self.table.get(key) # (lower bound, whether it's exact)
+        if known is not None and (known[1] or known[0] >= budget):
+            return known[0]
+        history = list(history)
+        scored = []
+        for max_part, outside, guess, parts in self.scored_guesses(samplespace, history):
+            bounds = [total_lower_bound(len(part), self.no_keys) for part in parts]
+            scored.append((size + sum(bounds), outside, guess, parts, bounds))
+        scored.sort(key=lambda item: item[:3])
+        best = budget
+        exact = False
+        for lower_bound, outside, guess, parts, bounds in scored:
+            if lower_bound >= best:
+                break # and so are the rest
+            total = lower_bound
+            for part, bound in zip(parts, bounds):
+                total += self.total_guesses(part, history + [guess], best - total + bound) - bound
+                if total >= best:
+                    break
+            else:
+                best = total
+                exact = True
+        if not exact and known is not None:
+            best = max(best, known[0])
+        self.table.put(key, (best, exact))
+        return best
+
+    def average(self):
+        """
+        Returns dict with the smallest average number of guesses of any strategy
+        """
+        start = time.perf_counter()
+        total = self.total_guesses(list(range(len(self.full_samplespace))))
+        return {'Pegs': self.pegs, 'Colors': self.colors, 'Total': total, 'Average': total/len(self.full_samplespace),
+                'Nodes': self.nodes, 'Time': time.perf_counter() - start}
+
+
+def compare_with_knuth(pegs=4, colors=6, average=None, max_entries=10**6):
+    """
+    Returns dict comparing Knuth's algorithm (cf. mami.solve_all_codes) with the optimal strategies:
+    the maximal number of guesses of each, the first guesses of optimal strategies, and (if average,
+    which by default it is for at most AVERAGE_SIZE codes) the average number of guesses of each
+    """
+    if average is None:
+        average = colors**pegs <= AVERAGE_SIZE
+    solver = OptimalSolver(pegs, colors, max_entries)
+    knuth = mami.solve_all_codes(pegs, colors, key_table=solver.key_table)
+    worst_case = solver.worst_case()
+    result = {'Pegs': pegs, 'Colors': colors, 'Knuth guesses': knuth['Guesses'], 'Optimal guesses': worst_case['Guesses'],
+              'Optimal initial guesses': [first_guess['Initial guess'] for first_guess in worst_case['First guesses']
+                                          if first_guess['Guesses'] == worst_case['Guesses']],
+              'Knuth average': knuth['Average']}
+    if average:
+        result['Optimal average'] = solver.average()['Average']
+    result['Knuth optimal'] = (result['Knuth guesses'] == result['Optimal guesses']
+                               and result.get('Optimal average', knuth['Average']) == knuth['Average'])
+    result['Nodes'] = solver.nodes
+    result['Transposition table'] = {'Entries': len(solver.table), 'Hits': solver.table.hits,
+                                     'Evictions': solver.table.evictions}
+    return result
+
+
+if __name__ == '__main__':
+    headings = ['Pegs', 'Colors', 'Knuth guesses', 'Optimal guesses', 'Knuth average', 'Optimal average']
+    results = []
+    for pegs, colors in [(pegs, colors) for pegs in range(2, 5) for colors in range(2, 7)]:
+        start = time.perf_counter()
+        result = compare_with_knuth(pegs, colors)
+        result['Knuth average'] = round(result['Knuth average'], 4)
+        result['Optimal average'] = round(result['Optimal average'], 4) if 'Optimal average' in result else '-'
+        results.append(result)
+        print('{} pegs, {} colors: Knuth {} guesses, optimal {} guesses ({:.1f} s)'.format(
+            pegs, colors, result['Knuth guesses'], result['Optimal guesses'], time.perf_counter() - start))
+    print(mami.json_to_mdtable(headings, results))
@@ -0,0 +1,152 @@
+"""
+Memory-budget planner: given a budget (e.g. --max-memory 200M), estimates the memory each structure
+of a run through all hidden codes of a game size needs, and picks the fastest way of playing that
+fits, so large sizes run slower instead of being killed for running out of memory:
+
+* in-memory: vectorizing.py with the key matrix (n*n bytes) and partition index (n*n*(no. of keys)/8 bytes)
+* memmap: vectorizing.py with the key matrix memory-mapped from a key file (cf. mami_keyfile.py), where
+  the pages are file-backed page cache the OS can drop, and no partition index
+* list: mami.py with codes as lists (a few hundred bytes per code, but much slower)
+
+The block size (the number of guesses scored at a time) is the largest that fits in what's left of the
+budget, and the dtype of the partition counts is the smallest that can hold n. run_plan plays the games
+as planned and reports the measured peak (traced by tracemalloc during the run), and the max RSS of the
+process so far. If nothing fits, the plan is the list engine marked as not fitting.
+
+    >>> plan = make_plan(5, 6, parse_memory('100M'))
+    >>> result = run_plan(plan)
+"""
+
+import resource
+import time
+import tracemalloc
+import mami
+import mami_engines
+
+PLANS = ['in-memory', 'memmap', 'list']
+BLOCK_SIZES = [1024, 512, 256, 128, 64, 32, 16, 8, 4, 2, 1]
+UNITS = {'': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30}
+# bytes per (guess in block, code) while scoring a block of guesses (cf. vectorizing.partition_counts):
+# the keys (uint8), their offsets (int64), and the flattened offsets (int64)
+SCORING_BYTES = 17
+# bytes per code of the list engine (the code as a list in the full samplespace and in samplespaces)
+LIST_CODE_BYTES = 300
+
+
+def parse_memory(text):
+    """
+    Returns the number of bytes in a string like 512M, 2G, 100K, or 1000000
+    """
+    text = str(text).strip().upper().rstrip('B')
+    unit = text[-1:] if text[-1:] in UNITS else ''
+    try:
+        return int(float(text[:len(text) - len(unit)])*UNITS[unit])
+    except ValueError:
+        raise ValueError('Not an amount of memory: {}'.format(text))
+
+
+def counts_dtype(n):
+    """
+    Returns the name of the smallest unsigned dtype that can hold the partition counts of n codes
+    """
+    for dtype, bits in [('uint8', 8), ('uint16', 16), ('uint32', 32)]:
+        if n < 2**bits:
+            return dtype
+    return 'uint64'
+
+
+def estimate_footprints(pegs, colors, plan='in-memory', block_size=256):
+    """
+    Returns dict {structure: bytes} with the estimated memory of each structure of the plan
+    """
+    n = colors**pegs
+    if plan == 'list':
+        return {'Codes as lists': n*LIST_CODE_BYTES}
+    block_size = min(block_size, n)
+    no_keys = pegs*(pegs + 1) + 1 # the keys as encoded in vectorizing.py, including some that can't occur
+    dtype_bytes = int(counts_dtype(n)[4:])//8
+    footprints = {}
+    if plan == 'in-memory':
+        footprints['Key matrix'] = n*n
+        footprints['Partition index'] = n*no_keys*((n + 7)//8)
+    footprints['Digits and histograms'] = n*(pegs + colors + pegs*colors)
+    footprints['Partition counts'] = n*no_keys*dtype_bytes + n*8
+    # the largest of the blocks of: computing keys, building the partition index, and scoring guesses
+    blocks = block_size*n*max(pegs + colors + 5, SCORING_BYTES)
+    if plan == 'in-memory':
+        # a bool for each key of each pair in the block, and their packed copy, plus the keys of the block;
+        # the bools of the previous block are only freed once those of the next one are made:
+        previous_block = min(block_size, n - block_size)
+        blocks = max(blocks, no_keys*n*max(block_size + previous_block, block_size*9/8) + block_size*n)
+    footprints['Blocks'] = int(blocks)
+    return footprints
+
+
+def make_plan(pegs, colors, max_memory):
+    """
+    Returns the plan for the size within max_memory bytes: dict with the engine, block size, dtype of the counts,
+    the estimated footprints and peak, and whether it fits (if nothing does, it's the list engine anyway)
+    The NumPy plans are only considered if NumPy is installed
+    """
+    plans = PLANS if mami_engines.numpy_available() else ['list']
+    for plan in plans:
+        for block_size in BLOCK_SIZES if plan != 'list' else [None]:
+            footprints = estimate_footprints(pegs, colors, plan, block_size)
+            if sum(footprints.values()) <= max_memory or plan == 'list':
+                return {'Pegs': pegs, 'Colors': colors, 'Max memory': max_memory, 'Engine': plan,
+                        'Block size': block_size, 'Counts dtype': counts_dtype(colors**pegs) if plan != 'list' else None,
+                        'Footprints': footprints, 'Estimated peak': sum(footprints.values()),
+                        'Fits': sum(footprints.values()) <= max_memory}
+
+
+def run_plan(plan, key_directory=None):
+    """
+    Plays all hidden codes of the size as planned (the memmap plan writes its key file to key_directory,
+    by default mami_keyfile.KEY_FILE_DIRECTORY, the first time), and returns dict with the max and average number of guesses, the time, and the plan
+    with the measured peaks: traced allocations (tracemalloc) during the run and the max RSS of the process
+    so far (which includes anything run before in the process)
+    """
+    pegs, colors = plan['Pegs'], plan['Colors']
+    start = time.perf_counter()
+    tracemalloc.start()
+    try:
+        if plan['Engine'] == 'list':
+            full_samplespace = mami.make_full_samplespace(pegs, colors)
+            possible_keys = mami.make_possible_keys(pegs, colors)
+            first_guess = mami.best_guess(full_samplespace, full_samplespace, possible_keys, [])[0]
+            attempts = mami.play_games(full_samplespace, first_guess, full_samplespace, possible_keys, pegs, colors)
+        else:
+            import numpy as np
+            import mami_keyfile
+            import vectorizing
+            key_directory = key_directory or mami_keyfile.KEY_FILE_DIRECTORY
+            attempts = vectorizing.play_all_games(colors, pegs, plan['Block size'],
+                                                  key_directory=key_directory if plan['Engine'] == 'memmap' else None,
+                                                  use_partition_index=(plan['Engine'] == 'in-memory'),
+                                                  counts_dtype=np.dtype(plan['Counts dtype'])).tolist()
+        traced_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    report = dict(plan)
+    report['Measured peak'] = traced_peak
+    # the peak of the whole process, so it includes what ran before this plan:
+    report['Process max RSS so far'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024 # in kilobytes on Linux
+    return {'Guesses': max(attempts), 'Average': sum(attempts)/len(attempts),
+            'Time': time.perf_counter() - start, 'Plan': report}
+
+
+def format_plan(plan):
+    """
+    Returns the plan (with the measured peaks, if there) as lines of text
+    """
+    lines = ['{} pegs, {} colors within {:.1f} MB: {} engine{}{}'.format(
+             plan['Pegs'], plan['Colors'], plan['Max memory']/2**20, plan['Engine'],
+             ', block size {}, counts as {}'.format(plan['Block size'], plan['Counts dtype'])
+             if plan['Block size'] else '', '' if plan['Fits'] else ' (does not fit)')]
+    for structure, size in plan['Footprints'].items():
+        lines.append('  {}: {:.2f} MB'.format(structure, size/2**20))
+    lines.append('  Estimated peak: {:.2f} MB'.format(plan['Estimated peak']/2**20))
+    for measurement in ['Measured peak', 'Process max RSS so far']:
+        if measurement in plan:
+            lines.append('  {}: {:.2f} MB'.format(measurement, plan[measurement]/2**20))
+    return '\n'.join(lines)
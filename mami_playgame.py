@@ -1,21 +1,29 @@
 """
 © 2020 Sara Arklint sara@arklint.dk
 
-Play Mastermind (as code breaker) with random hidden code and any number of spaces and colors.
+Play Mastermind (as code breaker) with random hidden code and any number of spaces and colors,
+with hints from the computer if you like, or let the computer break a code you hold.
+The hints and the computer's guesses come from the tables of the game size (cf. mami_tables.py),
+loaded when the game starts: Knuth's next guess is looked up in the strategy tree, or searched
+for with the NumPy engine (or approximately for the largest games), in well under 50 ms for 4 pegs
+and 6 colors, and for 5 pegs and 7 colors.
 """
 
 from mami import calculate_key
 from mami import make_code
+from mami import make_possible_keys
 
-# Prompt for guess
-def get_guess(pegs = 4, colors = 6):
+# Prompt for guess (None if a hint is asked for instead)
+def get_guess(pegs = 4, colors = 6, hints = False):
     allowed = [str(number) for number in list(range(colors))]
     reply = "no"
     while not reply == "":
         guess = []
         counter = 0
         while len(guess) < pegs:
-            number = input("Type the color (number between 0 and {colors}) of peg no. {peg}: ".format(peg = counter + 1, colors = colors - 1))
+            number = input("Type the color (number between 0 and {colors}) of peg no. {peg}{hint}: ".format(peg = counter + 1, colors = colors - 1, hint = " (or h for a hint)" if hints and counter == 0 else ""))
+            if hints and counter == 0 and number == "h":
+                return None
             if number in allowed:
                 guess.append(int(number))
                 counter += 1
@@ -24,26 +32,98 @@ def get_guess(pegs = 4, colors = 6):
         reply = input("Your guess: {}. Hit enter if correct; type anything otherwise.".format(guess))
     return guess
 
+# Prompt for key (black and white pegs) to the computer's guess
+def get_key(pegs = 4, colors = 6):
+    possible_keys = make_possible_keys(pegs, colors)
+    while True:
+        try:
+            black = int(input("Type the number of black pegs: "))
+            white = int(input("Type the number of white pegs: "))
+        except ValueError:
+            print("That's not a number!")
+            continue
+        if (black, white) in possible_keys:
+            return black, white
+        print("No guess can get {} black and {} white pegs!".format(black, white))
+
+# Load the tables for hints and the computer's guesses (cf. mami_tables.GameTables)
+# with the strategy tree read from (or saved to) tree_directory
+# The NumPy engine is only used (and NumPy imported) if it's the engine given, or 'auto' picks it
+def load_tables(pegs = 4, colors = 6, tree_directory = 'strategy_trees', engine = None):
+    import mami_tables
+    if engine == 'auto':
+        import mami_engines
+        engine = mami_engines.choose_engine(pegs, colors)
+    print("Loading the tables for {} pegs and {} colors...".format(pegs, colors))
+    return mami_tables.GameTables(pegs, colors, key_table=False, engine=(getattr(engine, 'name', engine) == 'numpy'),
+                                  tree_directory=tree_directory)
+
  # Play Super Mastermind (with computer as code maker) with random guess
-def game():
-    pegs = int(input("Type the number of pegs: "))
-    colors = int(input("Type the number of colors: "))
+# The keys are calculated by the engine if one is given (cf. mami_engines.get_engine, e.g. 'auto')
+# With hints=True, typing h instead of a guess shows the number of codes still possible and Knuth's next guess
+# (or an approximation of it, for the largest games)
+def game(pegs=None, colors=None, engine=None, hints=False, tree_directory='strategy_trees'):
+    if pegs is None:
+        pegs = int(input("Type the number of pegs: "))
+    if colors is None:
+        colors = int(input("Type the number of colors: "))
     code = make_code(pegs,colors)
+    if engine is not None:
+        import mami_engines
+        engine = mami_engines.get_engine(engine, pegs, colors)
+        hidden_code = engine.from_lists([code])[0]
+    tables = load_tables(pegs, colors, tree_directory, engine) if hints else None
     black = 0
     guesses = []
     keys = []
     while black < pegs:
-        guess = get_guess(pegs, colors)
+        guess = get_guess(pegs, colors, hints)
+        if guess is None:
+            consistent, suggestion, exact = tables.hint(guesses, keys, with_exact=True)
+            print("Hint: {} possible codes left; {} would guess {}".format(
+                  consistent, "Knuth's algorithm" if exact else "an approximation of Knuth's algorithm", suggestion))
+            continue
         print("Your guesses:")
         for index in range(len(guesses)): # print previous guesses and keys
             print("Guess: {} (black pegs: {}, white pegs: {})".format(guesses[index],*keys[index]))
         guesses.append(guess)
-        black, white = calculate_key(code, guess)
+        if engine is not None:
+            black, white = engine.possible_keys[engine.keys([hidden_code], engine.from_lists([guess]))[0][0]]
+        else:
+            black, white = calculate_key(code, guess)
         keys.append([black, white])
         if black == pegs:
             print("Correct! You guessed that it was {} in {} attempts.".format(code, len(guesses)))
         else:
             print("Guess: {} (black pegs: {}, white pegs: {})".format(guess, black, white))
 
-            
-game()
\ No newline at end of file
+# Play with the computer as code breaker against a code you hold (and give the keys to its guesses)
+# Its guesses are searched for with the NumPy engine if that's the engine given (or 'auto' picks it)
+# Returns the number of guesses used, or None if no code gives the keys typed
+def codebreaker(pegs=None, colors=None, tree_directory='strategy_trees', engine=None):
+    if pegs is None:
+        pegs = int(input("Type the number of pegs: "))
+    if colors is None:
+        colors = int(input("Type the number of colors: "))
+    tables = load_tables(pegs, colors, tree_directory, engine)
+    guesses = []
+    keys = []
+    black = 0
+    while black < pegs:
+        consistent, guess = tables.hint(guesses, keys)
+        if guess is None:
+            print("No code gives all those keys, so one of them must be wrong!")
+            return None
+        guesses.append(guess)
+        print("My guess no. {}: {} ({} possible codes left)".format(len(guesses), guess, consistent))
+        black, white = get_key(pegs, colors)
+        keys.append((black, white))
+    print("I guessed your code {} in {} attempts.".format(guesses[-1], len(guesses)))
+    return len(guesses)
+
+
+if __name__ == '__main__':
+    if input("Type c to let the computer break your code, or hit enter to guess: ") == "c":
+        codebreaker(engine='auto')
+    else:
+        game(engine='auto', hints=True)
@@ -0,0 +1,205 @@
+"""
+Parallel sweep through game sizes (cf. mami_sweep.py) scheduled by estimated cost, so a pool of
+workers is kept busy instead of waiting for the largest size while the small ones are long done.
+
+The cost of each size is estimated from colors**pegs with a power law fitted to the benchmark
+times of find_maximum_number_of_guesses (cf. mami_benchmark.py). Sizes estimated to cost more
+than their share of the work are split into chunks of hidden codes, and the jobs (sizes and chunks)
+are handed to the workers largest first, so the small jobs fill in at the end. The ETA of the whole
+sweep is the time so far scaled by the estimated cost left.
+
+The strategy trees (list engine) and key tables (table engine) are loaded or built once, before
+any job is handed out, and each worker gets them once, when it starts, with the key tables in
+shared memory (cf. mami_shared.py), so no two processes build the same table or tree.
+
+The sweep file is the same as for run_sweep: each chunk played is appended as a checkpoint, and
+each size as it's finished, so an interrupted sweep resumes either way, and the results (and so
+mami_output.txt and mami_table.txt) are the same as when the sizes are run one by one.
+
+    >>> mami_sweep.write_outputs(run_scheduled_sweep(workers=4))
+"""
+
+import contextlib
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import mami
+import mami_sweep
+
+# cost model without benchmarks: seconds = COST_SCALE*(colors**pegs)**COST_EXPONENT
+COST_SCALE = 2.5e-5
+COST_EXPONENT = 2.0
+# the largest jobs are about 1/JOBS_PER_WORKER of a worker's share of the estimated cost:
+JOBS_PER_WORKER = 4
+
+
+def fit_cost_model(benchmarks, engine='list'):
+    """
+    Returns (scale, exponent) of the power law seconds = scale*(colors**pegs)**exponent fitted (least squares
+    on the logarithms) to the times of find_maximum_number_of_guesses for the engine in the benchmark records
+    (cf. mami_benchmark.run_benchmarks), or the defaults if there are fewer than two sizes
+    (the list engine is benchmarked without strategy trees, so its times are too large, but only
+    the ratios between the sizes matter for the schedule and the ETA)
+    """
+    points = [(math.log(record['Colors']**record['Pegs']), math.log(record['Time'])) for record in benchmarks
+              if record['Engine'] == engine
+              and record['Function'] == 'find_maximum_number_of_guesses' and record['Time'] > 0]
+    if len({x for x, y in points}) < 2:
+        return COST_SCALE, COST_EXPONENT
+    mean_x = sum(x for x, y in points)/len(points)
+    mean_y = sum(y for x, y in points)/len(points)
+    exponent = (sum((x - mean_x)*(y - mean_y) for x, y in points) /
+                sum((x - mean_x)**2 for x, y in points))
+    return math.exp(mean_y - exponent*mean_x), exponent
+
+
+def estimate_cost(pegs, colors, model=(COST_SCALE, COST_EXPONENT)):
+    scale, exponent = model
+    return scale*(colors**pegs)**exponent
+
+
+def load_cost_model(engine='list'):
+    """
+    Returns the cost model fitted to the stored benchmarks (the defaults if there are none)
+    """
+    import mami_benchmark
+    try:
+        return fit_cost_model(mami_benchmark.load_benchmarks(), engine)
+    except (OSError, ValueError):
+        return COST_SCALE, COST_EXPONENT
+
+
+def plan_jobs(sizes, workers=1, model=(COST_SCALE, COST_EXPONENT), done=None):
+    """
+    Returns the jobs of the sweep, largest first: dicts with the size, the hidden codes (as numbers)
+    to play, and the estimated cost, where a size is split into chunks (every k'th hidden code,
+    so the chunks are about equally hard) if it costs more than its share of the work
+    done is {(pegs, colors): {hidden code number: guesses}} with hidden codes already played;
+    a size with all of them played still gets a job without hidden codes (for its first guess)
+    """
+    done = done or {}
+    costs = {(pegs, colors): estimate_cost(pegs, colors, model) for pegs, colors in sizes}
+    target = sum(costs.values())/(JOBS_PER_WORKER*max(1, workers))
+    jobs = []
+    for pegs, colors in sizes:
+        numbers = [number for number in range(colors**pegs) if number not in done.get((pegs, colors), {})]
+        chunks = max(1, min(len(numbers), math.ceil(costs[(pegs, colors)]/target)))
+        for chunk in range(chunks):
+            jobs.append({'Pegs': pegs, 'Colors': colors, 'Hidden codes': numbers[chunk::chunks],
+                         'Cost': costs[(pegs, colors)]*max(1, len(numbers[chunk::chunks]))/colors**pegs})
+    jobs.sort(key=lambda job: -job['Cost'])
+    return jobs
+
+
+def prepare_size(pegs, colors, strategy='knuth', engine='list', tree_directory='strategy_trees',
+                 partition_index=True):
+    """
+    Returns the description of the size (cf. mami.describe_game) and what mami.play_games needs besides
+    the hidden codes, with a strategy tree from tree_directory (list engine) or key table (table engine),
+    and with partition_index=True also its partition index (which can't be shared with workers)
+    """
+    if engine == 'table':
+        tree = None
+        key_table = mami.make_key_table(pegs, colors)
+        partition_index = (mami.make_partition_index(key_table, mami.make_possible_keys(pegs, colors))
+                           if partition_index else None)
+    else:
+        tree = mami.load_strategy_tree(pegs, colors, mami.strategy_tree_filename(pegs, colors, tree_directory, strategy),
+                                       strategy)
+        key_table = partition_index = None
+    description, first_guess, full_samplespace, possible_keys = mami.describe_game(pegs, colors, tree, strategy)
+    if key_table is not None:
+        first_guess = mami.code_to_int(first_guess, colors)
+    return description, (first_guess, full_samplespace, possible_keys, pegs, colors, tree, key_table, partition_index,
+                         strategy)
+
+
+def play_job(prepared, numbers):
+    """
+    Plays the hidden codes (numbers) of a prepared size (cf. prepare_size)
+    Returns the description of the size and the list of the numbers of guesses
+    """
+    description, game = prepared
+    hidden_codes = numbers if game[6] is not None else [game[1][number] for number in numbers]
+    return description, mami.play_games(hidden_codes, *game)
+
+
+# the prepared sizes {(pegs, colors): (description, game)} of a worker process, set once in each worker:
+_worker_sizes = None
+
+def _init_worker(sizes):
+    global _worker_sizes
+    for description, game in sizes.values():
+        if game[6] is not None: # the key table is in shared memory (cf. mami_shared)
+            import mami_shared
+            game[6] = mami_shared.attach(game[6])
+    _worker_sizes = {size: (description, tuple(game)) for size, (description, game) in sizes.items()}
+
+def _play_job_in_worker(pegs, colors, numbers):
+    return play_job(_worker_sizes[(pegs, colors)], numbers)
+
+
+def run_scheduled_sweep(sizes=mami_sweep.SWEEP_SIZES, filename=mami_sweep.SWEEP_FILE, strategy='knuth', workers=None,
+                        verbose=True, engine='list', model=None, tree_directory='strategy_trees'):
+    """
+    Sweeps through the sizes with the jobs (cf. plan_jobs) spread over the workers, skipping the sizes already
+    finished in the file and the hidden codes in its checkpoints (with the strategy trees in tree_directory)
+    Returns list of the results for the sizes (in the order of the sizes)
+    """
+    start = time.perf_counter()
+    games, checkpoints = mami_sweep.read_sweep(filename)
+    todo = [(pegs, colors) for pegs, colors in sizes if (pegs, colors, strategy) not in games]
+    done = {(pegs, colors): dict(checkpoints.get((pegs, colors, strategy), {})) for pegs, colors in todo}
+    if model is None:
+        model = load_cost_model(engine)
+    jobs = plan_jobs(todo, workers or 1, model, done)
+    jobs_left = {size: 0 for size in todo}
+    for job in jobs:
+        jobs_left[(job['Pegs'], job['Colors'])] += 1
+    total_cost = sum(job['Cost'] for job in jobs)
+    if verbose:
+        print('{} sizes done already, {} jobs for {} sizes (estimated {:.1f} seconds of work)'.format(
+              len(sizes) - len(todo), len(jobs), len(todo), total_cost))
+    serial = workers is None or workers <= 1
+    # the strategy trees and key tables are loaded or built here once, before any job is handed out:
+    prepared = {(pegs, colors): prepare_size(pegs, colors, strategy, engine, tree_directory, serial)
+                for pegs, colors in todo}
+    with contextlib.ExitStack() as stack:
+        if serial:
+            results = ((job, play_job(prepared[(job['Pegs'], job['Colors'])], job['Hidden codes'])) for job in jobs)
+        else:
+            # the workers get them once each, with the key tables in shared memory (cf. mami_shared):
+            worker_sizes = {}
+            for size, (description, game) in prepared.items():
+                game = list(game)
+                if game[6] is not None:
+                    import mami_shared
+                    game[6] = stack.enter_context(mami_shared.SharedTable(game[6])).descriptor()
+                worker_sizes[size] = (description, game)
+            executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(worker_sizes,))
+            stack.callback(executor.shutdown, cancel_futures=True)
+            futures = {executor.submit(_play_job_in_worker, job['Pegs'], job['Colors'], job['Hidden codes']): job
+                       for job in jobs}
+            results = ((futures[future], future.result()) for future in as_completed(futures))
+        cost_done = 0
+        for finished, (job, (description, times)) in enumerate(results, 1):
+            pegs, colors = job['Pegs'], job['Colors']
+            if job['Hidden codes']:
+                mami_sweep.append_record({'Pegs': pegs, 'Colors': colors, 'Strategy': strategy,
+                                          'Hidden codes': job['Hidden codes'], 'Guesses': times}, filename)
+                done[(pegs, colors)].update(zip(job['Hidden codes'], times))
+            jobs_left[(pegs, colors)] -= 1
+            if jobs_left[(pegs, colors)] == 0:
+                game = dict(description)
+                game['Guesses'] = max(done[(pegs, colors)].values())
+                games[(pegs, colors, strategy)] = mami_sweep.finish_size(game, pegs, colors, filename)
+            cost_done += job['Cost']
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print('[{}/{}] {} pegs, {} colors, {} hidden codes{}; ETA {:.1f} seconds'.format(
+                      finished, len(jobs), pegs, colors, len(job['Hidden codes']),
+                      ' (size finished)' if jobs_left[(pegs, colors)] == 0 else '',
+                      elapsed*(total_cost - cost_done)/cost_done if cost_done else 0))
+    if verbose:
+        print('Runtime (in seconds): {:.2f}'.format(time.perf_counter() - start))
+    return [games[(pegs, colors, strategy)] for pegs, colors in sizes]
@@ -0,0 +1,169 @@
+"""
+Local Mastermind server hosting many games at once (asyncio, plain TCP on localhost).
+
+The protocol is one JSON object per line in each direction. Requests:
+
+    {"command": "new", "pegs": 4, "colors": 6}      -> {"session": 1, "pegs": 4, "colors": 6}
+    {"command": "guess", "session": 1, "guess": [0, 0, 1, 1]}
+                                                    -> {"key": [1, 0], "guesses": 1, "solved": false}
+    {"command": "hint", "session": 1}               -> {"consistent": 256, "guess": [1, 2, 3, 3], "exact": true}
+    {"command": "end", "session": 1}                -> {"code": [3, 1, 4, 1], "guesses": 1}
+
+The hidden code of a session is made by make_code, and a hint is the computer codebreaker's
+next guess given the guesses and keys of the session so far ("exact" is false if it was found
+approximately). All sessions of the same size share the tables from mami_tables.get_tables
+(with the NumPy engine, if it's installed, for hints off the strategy tree), which are built
+(in a thread, so other sessions aren't blocked) the first time a game of that size is started.
+Games are limited to MAX_CODES codes, the sizes with precomputed tables. Errors are answered with {"error": message}.
+
+Run with: python mami_server.py [port]
+"""
+
+import asyncio
+import itertools
+import json
+import sys
+import mami
+import mami_tables
+
+PORT = 8642
+MAX_PEGS = 8
+MAX_COLORS = 12
+# largest number of codes of a game: the sizes with a strategy tree, key table, and partition index
+# (cf. mami_tables), so hints are lookups, or (off the tree) a search with the NumPy engine taking
+# a few milliseconds for 4 pegs and 6 colors, instead of a search in pure Python
+MAX_CODES = mami_tables.TREE_SIZE
+
+
+class GameServer:
+    """
+    The sessions (games) of the server
+    """
+    def __init__(self, strategy='knuth', tree_directory='strategy_trees'):
+        self.strategy = strategy
+        self.tree_directory = tree_directory
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+        self.requests = 0
+        self.size_tables = {} # (pegs, colors) -> GameTables
+
+    async def tables(self, pegs, colors):
+        """
+        Returns the shared tables for the game size (building them in a thread if needed)
+        """
+        if (pegs, colors) not in self.size_tables:
+            loop = asyncio.get_running_loop()
+            self.size_tables[(pegs, colors)] = await loop.run_in_executor(None, mami_tables.get_tables,
+                                                                          pegs, colors, self.strategy,
+                                                                          self.tree_directory, True)
+        return self.size_tables[(pegs, colors)]
+
+    async def new(self, request):
+        pegs = int(request.get('pegs', 4))
+        colors = int(request.get('colors', 6))
+        if not (1 <= pegs <= MAX_PEGS and 2 <= colors <= MAX_COLORS):
+            raise ValueError('Game size must be 1-{} pegs and 2-{} colors'.format(MAX_PEGS, MAX_COLORS))
+        if colors**pegs > MAX_CODES:
+            raise ValueError('Game size must have at most {} codes, not {}**{}'.format(MAX_CODES, colors, pegs))
+        await self.tables(pegs, colors)
+        session = next(self.session_ids)
+        self.sessions[session] = {'pegs': pegs, 'colors': colors, 'code': mami.make_code(pegs, colors),
+                                  'guesses': [], 'keys': [], 'samplespace': None, 'narrowed': 0,
+                                  'hint lock': asyncio.Lock()}
+        return {'session': session, 'pegs': pegs, 'colors': colors}
+
+    def session(self, request):
+        session = self.sessions.get(request.get('session'))
+        if session is None:
+            raise ValueError('No such session: {}'.format(request.get('session')))
+        return session
+
+    async def guess(self, request):
+        session = self.session(request)
+        guess = request.get('guess')
+        if not (isinstance(guess, list) and len(guess) == session['pegs']
+                and all(isinstance(color, int) and 0 <= color < session['colors'] for color in guess)):
+            raise ValueError('A guess must be a list of {} colors between 0 and {}'.format(session['pegs'],
+                                                                                          session['colors'] - 1))
+        key = mami.calculate_key(session['code'], guess)
+        session['guesses'].append(guess)
+        session['keys'].append(key)
+        return {'key': list(key), 'guesses': len(session['guesses']), 'solved': key[0] == session['pegs']}
+
+    @staticmethod
+    def session_hint(tables, session, count):
+        """
+        Returns the hint for the first count guesses of the session
+        Without a partition index (large games) the codes consistent with the session's guesses are kept
+        in the session and narrowed down by the new guesses only
+        (guesses made while this runs in its thread are left for the next hint)
+        """
+        guesses, keys = session['guesses'][:count], session['keys'][:count]
+        if tables.partition_index is not None:
+            return tables.hint(guesses, keys, with_exact=True)
+        if session['samplespace'] is None:
+            session['samplespace'] = tables.full_samplespace
+        narrowed = session['narrowed']
+        if narrowed < count:
+            session['samplespace'] = tables.consistent_codes(guesses[narrowed:], keys[narrowed:],
+                                                             session['samplespace'])
+            session['narrowed'] = count
+        return tables.hint(guesses, keys, session['samplespace'], with_exact=True)
+
+    async def hint(self, request):
+        session = self.session(request)
+        tables = await self.tables(session['pegs'], session['colors'])
+        async with session['hint lock']: # one hint at a time per session, as they share its samplespace
+            count = len(session['guesses'])
+            if tables.tree_node(session['guesses'], session['keys']) is not None:
+                consistent, guess, exact = tables.hint(session['guesses'], session['keys'],
+                                                       with_exact=True) # fast, so not in a thread
+            else:
+                loop = asyncio.get_running_loop()
+                consistent, guess, exact = await loop.run_in_executor(None, self.session_hint, tables, session, count)
+        return {'consistent': consistent, 'guess': guess, 'exact': exact}
+
+    async def end(self, request):
+        session = self.session(request)
+        del self.sessions[request['session']]
+        return {'code': session['code'], 'guesses': len(session['guesses'])}
+
+    COMMANDS = ['new', 'guess', 'hint', 'end']
+
+    async def respond(self, line):
+        """
+        Returns the reply (dict) to a request (line of JSON)
+        """
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or request.get('command') not in self.COMMANDS:
+                raise ValueError('Unknown command; the commands are: {}'.format(', '.join(self.COMMANDS)))
+            return await getattr(self, request['command'])(request)
+        except (ValueError, TypeError) as error:
+            return {'error': str(error)}
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self.respond(line)
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=PORT):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    print('Serving Mastermind on 127.0.0.1:{}'.format(port))
+    asyncio.run(GameServer().serve(port=port))
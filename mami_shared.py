@@ -0,0 +1,71 @@
+"""
+Tables shared between worker processes through multiprocessing.shared_memory, so that a run
+with many workers keeps one copy of the key table (or key matrix and partition index of the
+NumPy engine) instead of one per worker.
+
+The parent process copies the table into shared memory once (SharedTable, used as a context
+manager so the memory is freed when the run is over, also after an error) and hands its
+descriptor to the workers, which attach to it without copying (attach). The workers get
+a read-only view: a memoryview for a bytearray, and a NumPy array for a NumPy array.
+"""
+
+from multiprocessing import shared_memory
+
+
+class SharedTable:
+    """
+    A copy of a table (a bytes-like object, or a NumPy array) in shared memory
+
+    >>> with SharedTable(key_table) as shared:
+    ...     pool = ProcessPoolExecutor(workers, initializer=attach, initargs=(shared.descriptor(),))
+    """
+    def __init__(self, table):
+        if hasattr(table, 'dtype'): # a NumPy array
+            self.shape = table.shape
+            self.dtype = table.dtype.str
+            data = memoryview(table.tobytes() if not table.flags.c_contiguous else table).cast('B')
+        else:
+            self.shape = None
+            self.dtype = None
+            data = memoryview(table).cast('B')
+        self.nbytes = data.nbytes
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, self.nbytes))
+        self.memory.buf[:self.nbytes] = data
+
+    def descriptor(self):
+        """
+        Returns what a worker needs to attach to the table (cf. attach)
+        """
+        return (self.memory.name, self.nbytes, self.shape, self.dtype)
+
+    def close(self):
+        """
+        Frees the shared memory (the workers' views stay valid until they exit)
+        """
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+        return False
+
+
+# the shared memory attached to in this process (kept open for as long as the process uses its views):
+_attached = {}
+
+def attach(descriptor):
+    """
+    Returns a read-only view of the shared table with the descriptor (cf. SharedTable.descriptor),
+    without copying it: a memoryview of bytes, or a NumPy array if the table is one
+    """
+    name, nbytes, shape, dtype = descriptor
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    view = _attached[name].buf[:nbytes].toreadonly()
+    if shape is None:
+        return view
+    import numpy as np
+    return np.ndarray(shape, dtype=dtype, buffer=view)
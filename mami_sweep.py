@@ -0,0 +1,153 @@
+"""
+Resumable sweep through game sizes: runs find_maximum_number_of_guesses for each size and
+appends the results to a JSON Lines file as they're found, so an interrupted sweep (a crash,
+Ctrl-C, or a preempted job) picks up where it stopped when it's run again.
+
+Each line of the file is one of two kinds of records:
+* a checkpoint: the hidden codes (as numbers, cf. mami.code_to_int) of a chunk played in a size
+  not yet finished, and their numbers of guesses (keys Pegs, Colors, Strategy, Hidden codes, Guesses)
+* a finished size: the dict from find_maximum_number_of_guesses together with Pegs, Colors,
+  Lower bound, and Knuth ok (as in mami_output.txt)
+Sizes already finished are skipped, and hidden codes in checkpoints aren't played again.
+mami_output.txt and mami_table.txt are written from the finished sizes in the file.
+"""
+
+import json
+import os
+import sys
+import time
+import mami
+
+SWEEP_FILE = 'mami_sweep.jsonl'
+
+# the sizes of the sweep in mami.py (pegs, colors):
+SWEEP_SIZES = [(pegs, colors) for pegs in range(2, 5) for colors in range(2, 7)]
+
+TABLE_HEADINGS = ['Pegs', 'Colors', 'Guesses', 'Lower bound', 'Initial guess', 'Max error',
+                  'Possible codes', 'Valid keys']
+
+
+def append_record(record, filename=SWEEP_FILE):
+    """
+    Appends the record (dict) as a line to the file, making sure it's on disk before returning
+    If the file ends in a line cut off by an interruption, the record starts on a new line
+    (so it isn't lost with the cut-off line when the file is read)
+    """
+    with open(filename, 'ab+') as file:
+        line = json.dumps(record).encode() + b'\n'
+        if file.seek(0, os.SEEK_END) > 0:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b'\n':
+                line = b'\n' + line
+        file.write(line)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def read_sweep(filename=SWEEP_FILE):
+    """
+    Returns the finished sizes as {(pegs, colors, strategy): game} and the checkpoints
+    of the unfinished sizes as {(pegs, colors, strategy): {hidden code number: guesses}}
+    A last line cut off by an interruption is ignored
+    """
+    games = {}
+    checkpoints = {}
+    if not os.path.exists(filename):
+        return games, checkpoints
+    with open(filename, 'r') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError: # the line being written when the sweep was interrupted
+                continue
+            size = (record['Pegs'], record['Colors'], record['Strategy'])
+            if 'Hidden codes' in record:
+                checkpoints.setdefault(size, {}).update(zip(record['Hidden codes'], record['Guesses']))
+            else:
+                games[size] = record
+    for size in games:
+        checkpoints.pop(size, None)
+    return games, checkpoints
+
+
+def sweep_size(pegs, colors, filename=SWEEP_FILE, strategy='knuth', workers=None, done=None, engine='list',
+               tree_directory='strategy_trees'):
+    """
+    Runs through all hidden codes of the size (except those in done, cf. find_maximum_number_of_guesses),
+    appending a checkpoint to the file after each chunk of hidden codes and the result when finished
+    With the list engine the guesses are looked up in the strategy tree (from tree_directory), and with the table engine
+    they're searched for with a key table and partition index
+    Returns the result
+    """
+    def checkpoint(hidden_codes, guesses):
+        append_record({'Pegs': pegs, 'Colors': colors, 'Strategy': strategy,
+                       'Hidden codes': hidden_codes, 'Guesses': guesses}, filename)
+    if engine == 'table':
+        tree = None
+        key_table = mami.make_key_table(pegs, colors)
+        partition_index = mami.make_partition_index(key_table, mami.make_possible_keys(pegs, colors))
+    else:
+        tree = mami.load_strategy_tree(pegs, colors, mami.strategy_tree_filename(pegs, colors, tree_directory, strategy),
+                                       strategy)
+        key_table = partition_index = None
+    game = mami.find_maximum_number_of_guesses(pegs, colors, tree, key_table, workers, partition_index, strategy,
+                                               done, checkpoint)
+    return finish_size(game, pegs, colors, filename)
+
+
+def finish_size(game, pegs, colors, filename=SWEEP_FILE):
+    """
+    Adds the size and the lower bound to the result from find_maximum_number_of_guesses
+    and appends it to the file as a finished size
+    Returns the result
+    """
+    game['Pegs'] = pegs
+    game['Colors'] = colors
+    game['Lower bound'] = mami.find_lower_bound(game['Max error'], pegs)
+    game['Knuth ok'] = (game['Lower bound'] == game['Guesses'])
+    append_record(game, filename)
+    return game
+
+
+def run_sweep(sizes=SWEEP_SIZES, filename=SWEEP_FILE, strategy='knuth', workers=None, verbose=True, engine='list',
+              tree_directory='strategy_trees'):
+    """
+    Sweeps through the sizes, skipping those already finished in the file and resuming
+    the unfinished one from its checkpoints
+    Returns list of the results for the sizes
+    """
+    games, checkpoints = read_sweep(filename)
+    results = []
+    for pegs, colors in sizes:
+        if (pegs, colors, strategy) in games:
+            if verbose:
+                print('Game: {} pegs, {} colors (done already)'.format(pegs, colors))
+            results.append(games[(pegs, colors, strategy)])
+            continue
+        done = checkpoints.get((pegs, colors, strategy))
+        if verbose:
+            print('Game: {} pegs, {} colors{}'.format(pegs, colors,
+                  ' (resuming after {} hidden codes)'.format(len(done)) if done else ''))
+        start = time.perf_counter()
+        results.append(sweep_size(pegs, colors, filename, strategy, workers, done, engine, tree_directory))
+        if verbose:
+            print('Runtime (in seconds): {:.2f}'.format(time.perf_counter() - start))
+    return results
+
+
+def write_outputs(results, output_file='mami_output.txt', table_file='mami_table.txt', headings=TABLE_HEADINGS):
+    """
+    Writes the results as JSON to output_file and as an md table to table_file
+    (the strategy is left out of the results of Knuth's algorithm, as in the original mami_output.txt)
+    """
+    results = [{heading: value for heading, value in result.items()
+                if not (heading == 'Strategy' and value == 'knuth')} for result in results]
+    with open(output_file, 'w') as file:
+        file.write(json.dumps(results))
+    with open(table_file, 'w') as file:
+        file.write(mami.json_to_mdtable(headings, results))
+
+
+if __name__ == '__main__':
+    filename = sys.argv[1] if len(sys.argv) > 1 else SWEEP_FILE
+    write_outputs(run_sweep(filename=filename))
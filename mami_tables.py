@@ -0,0 +1,167 @@
+"""
+Precomputed tables for a game size (number of pegs and colors), shared by all games of that size:
+the key table, the partition index, and the strategy tree (cf. mami.py).
+With them, the number of codes consistent with a history of guesses and keys, and the computer
+codebreaker's next guess, are found in milliseconds for the standard game.
+For larger games, the tables that would be too large to build are skipped, and hints fall back
+on the approximate version of Knuth's algorithm (cf. mami_approximate.py).
+"""
+
+import random
+import threading
+import mami
+import mami_approximate
+
+# largest number of codes for which the key table (n*n bytes) and partition index are built:
+KEY_TABLE_SIZE = 2000
+# largest number of codes for which the strategy tree is built (or loaded from strategy_trees/):
+TREE_SIZE = 1300
+# largest len(samplespace)*(number of codes) for which a hint off the strategy tree is exact:
+EXACT_HINT_WORK = 2*10**5
+# time budget (in seconds) for an approximate hint:
+HINT_TIME_BUDGET = 0.03
+# largest len(samplespace)*(number of codes) for which a hint off the strategy tree is exact with the NumPy
+# engine and its key matrix (about 20 ns each, so about 40 ms):
+ENGINE_HINT_WORK = 2*10**6
+
+
+class GameTables:
+    """
+    The precomputed tables for one game size, cf. get_tables
+    """
+    def __init__(self, pegs=4, colors=6, strategy='knuth', key_table=True, engine=False, key_directory=None,
+                 tree_directory='strategy_trees'):
+        """
+        With key_table=False, the key table and partition index aren't built even for small games
+        (which saves a couple of seconds when only a few hints are needed)
+        With engine=True (and NumPy installed), the codes consistent with a history are found with the
+        NumPy engine (cf. mami_engines), and hints off the strategy tree are exact for larger samplespaces
+        when its key matrix fits in memory (read from a key file in key_directory if given, cf. mami_keyfile)
+        The strategy tree is read from (or built and saved to) tree_directory
+        """
+        self.pegs = pegs
+        self.colors = colors
+        self.strategy = strategy
+        n = colors**pegs
+        self.full_samplespace = mami.make_full_samplespace(pegs, colors) if n <= KEY_TABLE_SIZE \
+            else mami.LazySamplespace(pegs, colors)
+        self.possible_keys = mami.make_possible_keys(pegs, colors)
+        self.key_index = {key: index for index, key in enumerate(self.possible_keys)}
+        self.key_table = None
+        self.partition_index = None
+        self.tree = None
+        if key_table and n <= KEY_TABLE_SIZE:
+            self.key_table = mami.make_key_table(pegs, colors)
+            self.partition_index = mami.make_partition_index(self.key_table, self.possible_keys)
+        if n <= TREE_SIZE:
+            self.tree = mami.load_strategy_tree(pegs, colors, mami.strategy_tree_filename(pegs, colors, tree_directory,
+                                                                                          strategy), strategy)
+        self.engine = None
+        if engine:
+            import mami_engines
+            if mami_engines.numpy_available():
+                self.engine = mami_engines.get_engine('numpy', pegs, colors,
+                                                      key_directory if n <= mami_engines.KEY_MATRIX_SIZE else None)
+
+    def consistent_codes(self, guesses, keys, samplespace=None):
+        """
+        Returns the codes (lists) that would have given the keys (tuples) to the guesses
+        If samplespace is given, only the codes in it are considered
+        """
+        if samplespace is None and self.partition_index is not None:
+            samplespace_bits = (1 << len(self.full_samplespace)) - 1 # all codes
+            for guess, key in zip(guesses, keys):
+                samplespace_bits &= self.partition_index[mami.code_to_int(guess, self.colors)][self.key_index[tuple(key)]]
+            return [self.full_samplespace[code] for code in mami.bits_to_codes(samplespace_bits)]
+        if self.engine is not None:
+            numbers = self.engine.full_samplespace() if samplespace is None else self.engine.from_lists(samplespace)
+            for guess, key in zip(guesses, keys):
+                numbers = self.engine.filter(numbers, self.engine.from_lists([guess])[0], self.key_index[tuple(key)])
+            return self.engine.to_lists(numbers)
+        if samplespace is None:
+            samplespace = self.full_samplespace
+        for guess, key in zip(guesses, keys):
+            samplespace = mami.update_samplespace(samplespace, guess, tuple(key))
+        return list(samplespace)
+
+    def count_consistent(self, guesses, keys):
+        """
+        Returns the number of codes that would have given the keys to the guesses
+        """
+        if self.partition_index is None:
+            return len(self.consistent_codes(guesses, keys))
+        samplespace_bits = (1 << len(self.full_samplespace)) - 1
+        for guess, key in zip(guesses, keys):
+            samplespace_bits &= self.partition_index[mami.code_to_int(guess, self.colors)][self.key_index[tuple(key)]]
+        return samplespace_bits.bit_count()
+
+    def tree_node(self, guesses, keys):
+        """
+        Returns the node of the strategy tree reached by the guesses and keys,
+        or None if the guesses left the tree (or there's no tree)
+        """
+        node = self.tree
+        for guess, key in zip(guesses, keys):
+            if node is None or node['guess'] != list(guess):
+                return None
+            node = node['children'].get(tuple(key))
+        return node
+
+    def hint(self, guesses, keys, samplespace=None, with_exact=False):
+        """
+        Given the guesses and keys so far, returns the number of codes consistent with them
+        and the codebreaker's next guess (None if no code is consistent)
+        The guess is looked up in the strategy tree if the guesses so far followed it;
+        otherwise it's searched for (approximately, if the search would be slow, with random samples
+        seeded by the guesses and keys, so they're the same for the same history)
+        If the codes consistent with the guesses and keys are already known, they can be passed as samplespace
+        With with_exact=True, also returns whether the guess is the strategy's (False if it was found approximately)
+        """
+        consistent, guess, exact = self._hint(guesses, keys, samplespace)
+        return (consistent, guess, exact) if with_exact else (consistent, guess)
+
+    def _hint(self, guesses, keys, samplespace):
+        node = self.tree_node(guesses, keys)
+        if node is not None:
+            return (len(samplespace) if samplespace is not None else self.count_consistent(guesses, keys),
+                    node['guess'], True)
+        if samplespace is None:
+            samplespace = self.consistent_codes(guesses, keys)
+        if not samplespace:
+            return 0, None, True
+        if len(samplespace) < 3:
+            return len(samplespace), samplespace[0], True
+        if (self.engine is not None and self.engine.key_matrix is not None and self.strategy == 'knuth'
+                and len(samplespace)*len(self.full_samplespace) <= ENGINE_HINT_WORK):
+            guess = self.engine.best_guess(self.engine.from_lists(samplespace))[0]
+            return len(samplespace), self.engine.to_lists([guess])[0], True
+        if self.key_table is not None and len(samplespace)*len(self.full_samplespace) <= EXACT_HINT_WORK:
+            guess = mami.best_guess([mami.code_to_int(code, self.colors) for code in samplespace],
+                                    self.full_samplespace, self.possible_keys,
+                                    [mami.code_to_int(guess, self.colors) for guess in guesses],
+                                    self.key_table, self.strategy)[0]
+            return len(samplespace), self.full_samplespace[guess], True
+        if len(samplespace)*len(self.full_samplespace) <= EXACT_HINT_WORK:
+            return len(samplespace), mami.best_guess(samplespace, self.full_samplespace, self.possible_keys,
+                                                     [list(guess) for guess in guesses], None, self.strategy)[0], True
+        rng = random.Random(repr(([list(guess) for guess in guesses], [tuple(key) for key in keys])))
+        guess, report = mami_approximate.best_guess_approximate(samplespace, self.full_samplespace, self.possible_keys,
+                                                                [list(guess) for guess in guesses], candidates=200,
+                                                                sample=200, time_budget=HINT_TIME_BUDGET,
+                                                                exact_work=0, rng=rng)
+        return len(samplespace), guess, report['Exact']
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+def get_tables(pegs=4, colors=6, strategy='knuth', tree_directory='strategy_trees', engine=False):
+    """
+    Returns the GameTables for the game size (built the first time they're asked for,
+    and shared afterwards), with the NumPy engine if engine=True (cf. GameTables)
+    """
+    with _tables_lock:
+        if (pegs, colors, strategy, tree_directory, engine) not in _tables:
+            _tables[(pegs, colors, strategy, tree_directory, engine)] = GameTables(pegs, colors, strategy, engine=engine,
+                                                                                   tree_directory=tree_directory)
+        return _tables[(pegs, colors, strategy, tree_directory, engine)]
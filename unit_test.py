@@ -4,7 +4,33 @@ Unit testing of mami.py and vectorizing.py with unittest
 import unittest
 import mami
 import vectorizing
+import mami_benchmark
+import mami_instrumentation
+import mami_approximate
+import mami_tables
+import mami_server
+import mami_loadgen
+import mami_sweep
+import mami_cli
+import mami_optimal
+import mami_shared
+import mami_engines
+import mami_montecarlo
+import mami_keyfile
+import mami_playgame
+import mami_scheduler
+import mami_planner
+import io # for testing mami_cli
+import contextlib
+import subprocess
+import sys
+import os
+import asyncio # for testing mami_server
+import threading
+import json
 import numpy as np # for testing vectorizing
+import tempfile # for testing files written
+from unittest import mock # for testing mami_playgame
 
 
 class TestLowerBound(unittest.TestCase):
@@ -117,6 +143,621 @@ class TestFullSamplespace(unittest.TestCase):
     def test_number_of_codes(self):
         self.assertEqual(len(self.full_samplespace),self.length)
 
+class TestLazySamplespace(unittest.TestCase):
+    def setUp(self):
+        self.pegs = 3
+        self.colors = 5
+        self.lazy = mami.LazySamplespace(self.pegs, self.colors)
+        self.full_samplespace = mami.make_full_samplespace(self.pegs, self.colors)
+
+    def test_same_codes(self):
+        """
+        Check that the lazy samplespace has the same codes in the same order as the list
+        """
+        self.assertEqual(len(self.lazy), len(self.full_samplespace))
+        self.assertEqual(list(self.lazy), self.full_samplespace)
+        for number in [0, 1, 42, -1]:
+            self.assertEqual(self.lazy[number], self.full_samplespace[number])
+
+    def test_in(self):
+        self.assertTrue([4, 0, 2] in self.lazy)
+        self.assertFalse([5, 0, 2] in self.lazy)
+        self.assertFalse([0, 2] in self.lazy)
+
+class TestCodeNumbers(unittest.TestCase):
+    def test_numbers_are_indices(self):
+        """
+        Check that the number of a code is its index in the full samplespace
+        """
+        full_samplespace = mami.make_full_samplespace(3, 4)
+        for number, code in enumerate(full_samplespace):
+            self.assertEqual(mami.code_to_int(code, 4), number)
+            self.assertEqual(mami.int_to_code(number, 3, 4), code)
+
+class TestSymmetryClasses(unittest.TestCase):
+    def setUp(self):
+        self.full_samplespace = mami.make_full_samplespace(4, 6)
+        self.possible_keys = mami.make_possible_keys(4, 6)
+
+    def test_initial_classes(self):
+        """
+        Check that the standard game starts with the 5 classes AAAA, AABB, AAAB, AABC, ABCD
+        """
+        self.assertEqual(mami.symmetry_classes(self.full_samplespace, []),
+                         [[0, 0, 0, 0], [0, 0, 0, 1], [0, 0, 1, 1], [0, 0, 1, 2], [0, 1, 2, 3]])
+
+    def test_same_best_guess(self):
+        """
+        Check that best_guess gives the same guess and max error with and without symmetry reduction
+        """
+        guesses = [[0, 0, 1, 1]]
+        for key in [(0, 0), (1, 1), (0, 2)]:
+            with self.subTest(key=key):
+                samplespace = [code for code in self.full_samplespace if mami.calculate_key(code, guesses[0]) == key]
+                self.assertEqual(mami.best_guess(samplespace, self.full_samplespace, self.possible_keys, guesses),
+                                 mami.best_guess(samplespace, self.full_samplespace, self.possible_keys))
+
+class TestKeyTable(unittest.TestCase):
+    def setUp(self):
+        self.pegs = 3
+        self.colors = 4
+        self.full_samplespace = mami.make_full_samplespace(self.pegs, self.colors)
+        self.possible_keys = mami.make_possible_keys(self.pegs, self.colors)
+        self.key_table = mami.make_key_table(self.pegs, self.colors)
+
+    def test_keys(self):
+        """
+        Check that the key table agrees with calculate_key on all pairs of codes
+        """
+        n = len(self.full_samplespace)
+        self.assertEqual(len(self.key_table), n*n)
+        for code_number, code in enumerate(self.full_samplespace):
+            for guess_number, guess in enumerate(self.full_samplespace):
+                self.assertEqual(self.possible_keys[self.key_table[code_number*n + guess_number]],
+                                 mami.calculate_key(code, guess))
+
+    def test_same_games(self):
+        """
+        Check that playing all games with code numbers gives the same result as with lists
+        """
+        self.assertEqual(mami.find_maximum_number_of_guesses(self.pegs, self.colors, key_table=self.key_table),
+                         mami.find_maximum_number_of_guesses(self.pegs, self.colors))
+
+class TestPartitionIndex(unittest.TestCase):
+    def setUp(self):
+        self.pegs = 3
+        self.colors = 4
+        self.possible_keys = mami.make_possible_keys(self.pegs, self.colors)
+        self.key_table = mami.make_key_table(self.pegs, self.colors)
+        self.partition_index = mami.make_partition_index(self.key_table, self.possible_keys)
+
+    def test_bitsets(self):
+        """
+        Check that narrowing with bitsets gives the same samplespace as with the key table
+        """
+        samplespace = [code for code in range(self.colors**self.pegs)
+                       if mami.key_table_row(5, self.key_table)[code] == 2]
+        bits = self.partition_index[5][2]
+        self.assertEqual(mami.bits_to_codes(bits), samplespace)
+        samplespace = [code for code in samplespace if mami.key_table_row(17, self.key_table)[code] == 1]
+        bits &= self.partition_index[17][1]
+        self.assertEqual(mami.bits_to_codes(bits), samplespace)
+        self.assertEqual(bits.bit_count(), len(samplespace))
+
+    def test_same_games(self):
+        """
+        Check that playing all games with the partition index gives the same result as with lists
+        """
+        self.assertEqual(mami.find_maximum_number_of_guesses(self.pegs, self.colors, key_table=self.key_table,
+                                                             partition_index=self.partition_index),
+                         mami.find_maximum_number_of_guesses(self.pegs, self.colors))
+
+class TestStrategies(unittest.TestCase):
+    def setUp(self):
+        self.full_samplespace = mami.make_full_samplespace(3, 4)
+        self.possible_keys = mami.make_possible_keys(3, 4)
+
+    def test_scores(self):
+        """
+        Check the score of each strategy for a partition of the samplespace
+        """
+        sizes = [4, 0, 2, 2]
+        self.assertEqual(mami.knuth_score(sizes), 4)
+        self.assertEqual(mami.expected_size_score(sizes), 24)
+        self.assertEqual(mami.most_parts_score(sizes), -3)
+        self.assertTrue(mami.entropy_score([2, 2, 2, 2]) < mami.entropy_score([4, 2, 2, 0]))
+
+    def test_knuth_is_max_error(self):
+        """
+        Check that the Knuth strategy scores guesses by their max error
+        """
+        guess, score = mami.best_guess(self.full_samplespace, self.full_samplespace, self.possible_keys,
+                                       strategy='knuth')
+        self.assertEqual(score, mami.maximal_error(guess, self.full_samplespace, self.possible_keys))
+
+    def test_strategy_in_result(self):
+        """
+        Check that the result of a run through all hidden codes names the strategy it was played with
+        """
+        for strategy in mami.STRATEGIES:
+            with self.subTest(strategy=strategy):
+                result = mami.find_maximum_number_of_guesses(2, 3, strategy=strategy)
+                self.assertEqual(result['Strategy'], strategy)
+                self.assertTrue(result['Guesses'] >= 3)
+
+class TestBranchAndBound(unittest.TestCase):
+    def setUp(self):
+        self.full_samplespace = mami.make_full_samplespace(3, 4)
+        self.possible_keys = mami.make_possible_keys(3, 4)
+        self.key_table = mami.make_key_table(3, 4)
+
+    def test_bounded_maximal_error(self):
+        guess = [0, 1, 1]
+        max_error = mami.maximal_error(guess, self.full_samplespace, self.possible_keys)
+        self.assertEqual(mami.maximal_error(guess, self.full_samplespace, self.possible_keys, bound=max_error + 1), max_error)
+        self.assertEqual(mami.maximal_error(guess, self.full_samplespace, self.possible_keys, bound=3), 3)
+        self.assertEqual(mami.maximal_error(5, range(64), self.possible_keys, self.key_table, max_error + 1),
+                         mami.maximal_error(5, range(64), self.possible_keys, self.key_table))
+
+    def scan(self, samplespace):
+        """
+        Knuth's choice by scoring every code (the first code with the smallest max error,
+        preferring codes in the samplespace)
+        """
+        errors = [mami.maximal_error(guess, samplespace, self.possible_keys) for guess in self.full_samplespace]
+        smallest = min(errors)
+        choices = [guess for guess, error in zip(self.full_samplespace, errors) if error == smallest]
+        return next((guess for guess in choices if guess in samplespace), choices[0]), smallest
+
+    def test_same_as_scan(self):
+        """
+        Check that branch and bound chooses the same guesses as scoring every code, also with ties
+        """
+        for guess, key in [([0, 0, 1], (0, 1)), ([0, 1, 2], (1, 1)), ([0, 1, 1], (0, 0)), ([0, 0, 0], (1, 0))]:
+            samplespace = mami.update_samplespace(self.full_samplespace, guess, key)
+            with self.subTest(guess=guess, key=key):
+                expected = self.scan(samplespace)
+                self.assertEqual(mami.bounded_best_guess(self.full_samplespace, samplespace, self.possible_keys), expected)
+                self.assertEqual(mami.best_guess(samplespace, self.full_samplespace, self.possible_keys, [guess]), expected)
+                numbers = [mami.code_to_int(code, 4) for code in samplespace]
+                self.assertEqual(mami.best_guess(numbers, self.full_samplespace, self.possible_keys,
+                                                 [mami.code_to_int(guess, 4)], self.key_table),
+                                 (mami.code_to_int(expected[0], 4), expected[1]))
+
+    def test_lazy_samplespace(self):
+        """
+        Check that branch and bound takes the full sample space without listing it
+        """
+        lazy = mami.LazySamplespace(3, 4)
+        expected = self.scan(self.full_samplespace)
+        self.assertEqual(mami.bounded_best_guess(self.full_samplespace, lazy, self.possible_keys), expected)
+        self.assertEqual(mami.bounded_best_guess(range(len(lazy)), range(len(lazy)), self.possible_keys, self.key_table),
+                         (mami.code_to_int(expected[0], 4), expected[1]))
+
+class TestParallelGames(unittest.TestCase):
+    def test_same_as_serial(self):
+        """
+        Check that splitting the hidden codes between worker processes doesn't change the result
+        """
+        self.assertEqual(mami.find_maximum_number_of_guesses(3, 3, workers=2),
+                         mami.find_maximum_number_of_guesses(3, 3))
+
+    def test_shared_key_table(self):
+        key_table = mami.make_key_table(3, 3)
+        partition_index = mami.make_partition_index(key_table, mami.make_possible_keys(3, 3))
+        self.assertEqual(mami.find_maximum_number_of_guesses(3, 3, None, key_table, 2, partition_index),
+                         mami.find_maximum_number_of_guesses(3, 3))
+
+    def test_numpy_engine(self):
+        self.assertTrue((vectorizing.play_all_games(3, 3, workers=2) == vectorizing.play_all_games(3, 3)).all())
+
+class TestSharedTable(unittest.TestCase):
+    def test_bytes(self):
+        key_table = mami.make_key_table(2, 3)
+        with mami_shared.SharedTable(key_table) as shared:
+            view = mami_shared.attach(shared.descriptor())
+            self.assertEqual(bytes(view), bytes(key_table))
+            self.assertTrue(view.readonly)
+            self.assertEqual(list(mami.key_table_row(4, view)), list(mami.key_table_row(4, key_table)))
+
+    def test_numpy(self):
+        allkeys = vectorizing.make_key_matrix(3, 2)
+        with mami_shared.SharedTable(allkeys) as shared:
+            view = mami_shared.attach(shared.descriptor())
+            self.assertTrue((view == allkeys).all())
+            self.assertEqual(view.dtype, allkeys.dtype)
+            self.assertFalse(view.flags.writeable)
+
+class TestEngines(unittest.TestCase):
+    def setUp(self):
+        self.engines = [mami_engines.get_engine(name, 3, 3) for name in mami_engines.ENGINES]
+
+    def test_conversions(self):
+        codes = [[0, 1, 2], [2, 2, 0]]
+        for engine in self.engines:
+            self.assertEqual(engine.to_lists(engine.from_lists(codes)), codes)
+            self.assertEqual(engine.to_numbers(engine.from_lists(codes)), [5, 24])
+            self.assertEqual(engine.to_lists(engine.from_numbers([5, 24])), codes)
+
+    def test_same_results(self):
+        """
+        Check that the engines agree on keys, partition counts, filtering, and best guesses
+        """
+        full_samplespace = mami.make_full_samplespace(3, 3)
+        possible_keys = mami.make_possible_keys(3, 3)
+        for engine in self.engines:
+            codes = engine.full_samplespace()
+            keys = engine.keys(codes, codes)
+            self.assertEqual([[engine.possible_keys[keys[i][j]] for j in range(27)] for i in range(27)],
+                             [[mami.calculate_key(code, guess) for guess in full_samplespace] for code in full_samplespace])
+            counts = engine.partition_counts(codes, engine.from_numbers([0, 5]))
+            self.assertEqual([list(row) for row in counts],
+                             [mami.partition_sizes(guess, full_samplespace, possible_keys)
+                              for guess in [[0, 0, 0], [0, 1, 2]]])
+            samplespace = engine.filter(codes, engine.from_lists([[0, 0, 1]])[0], possible_keys.index((1, 0)))
+            self.assertEqual(engine.to_lists(samplespace), mami.update_samplespace(full_samplespace, [0, 0, 1], (1, 0)))
+            guess, max_error = engine.best_guess(samplespace)
+            self.assertEqual((engine.to_lists([guess])[0], max_error),
+                             mami.best_guess(mami.update_samplespace(full_samplespace, [0, 0, 1], (1, 0)),
+                                             full_samplespace, possible_keys))
+
+    def test_choose_engine(self):
+        self.assertEqual(mami_engines.choose_engine(1, 3), 'list')
+        self.assertEqual(mami_engines.choose_engine(4, 6), 'numpy')
+        self.assertIsInstance(mami_engines.get_engine('auto', 2, 4), mami_engines.TableEngine)
+        with self.assertRaises(ValueError):
+            mami_engines.get_engine('abacus', 2, 3)
+
+    def test_drivers(self):
+        for pegs, colors in [(2, 3), (3, 3)]:
+            result = mami.find_maximum_number_of_guesses(pegs, colors)
+            for name in mami_engines.ENGINES + ['auto']:
+                self.assertEqual(mami.find_maximum_number_of_guesses(pegs, colors, engine=name), result)
+        maximum, minimum, average = mami.test_game_randomized(10, 2, 3, engine='numpy')
+        self.assertTrue(1 <= minimum <= average <= maximum <= 4)
+
+class TestMonteCarlo(unittest.TestCase):
+    def test_running_stats(self):
+        stats = mami_montecarlo.RunningStats()
+        values = [3, 5, 4, 4, 6, 2, 5]
+        stats.add(values[:3])
+        stats.add(values[3:])
+        self.assertAlmostEqual(stats.mean, sum(values)/len(values))
+        self.assertAlmostEqual(stats.variance(), np.var(values, ddof=1))
+        self.assertEqual(stats.histogram, {2: 1, 3: 1, 4: 2, 5: 2, 6: 1})
+        low, high = stats.confidence_interval()
+        self.assertTrue(low < stats.mean < high)
+
+    def test_play_batch(self):
+        """
+        Check that playing a batch at once gives the same as one game at a time
+        """
+        for name in mami_engines.ENGINES:
+            engine = mami_engines.get_engine(name, 3, 3)
+            first_guess = engine.best_guess(engine.full_samplespace())[0]
+            numbers = [5, 0, 26, 5, 13]
+            self.assertEqual(mami_montecarlo.play_batch(engine, numbers, first_guess),
+                             mami_engines.play_games(engine, numbers, first_guess))
+
+    def test_evaluate(self):
+        """
+        Check that a seed gives the same result with and without workers, and that the estimate is close
+        """
+        result = mami_montecarlo.evaluate(3, 3, seed=7, precision=0.1, batch_size=64)
+        self.assertTrue(result['Converged'])
+        self.assertEqual(sum(result['Histogram'].values()), result['Games'])
+        low, high = result['Confidence interval']
+        exact = mami.solve_all_codes(3, 3)['Average']
+        self.assertTrue(low - 0.1 < exact < high + 0.1)
+        with_workers = mami_montecarlo.evaluate(3, 3, seed=7, precision=0.1, batch_size=64, workers=2)
+        self.assertEqual(with_workers['Average'], result['Average'])
+        self.assertEqual(with_workers['Games'], result['Games'])
+        self.assertEqual(mami_montecarlo.evaluate(3, 3, seed=7, max_games=100, batch_size=64)['Games'], 100)
+
+    def test_minimum_of_randomized_games(self):
+        maximum, minimum, average = mami.test_game_randomized(1, 2, 3)
+        self.assertEqual(minimum, maximum)
+
+class TestKeyFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_formats(self):
+        """
+        Check the key files against the key matrix of vectorizing.py and the key table of mami.py
+        """
+        allkeys = mami_keyfile.load_key_file(3, 4, directory=self.directory.name)
+        self.assertIsInstance(allkeys, np.memmap)
+        self.assertTrue((allkeys == vectorizing.make_key_matrix(4, 3)).all())
+        key_table = mami_keyfile.load_key_file(3, 4, 'index', 'mami', self.directory.name)
+        self.assertEqual(bytes(key_table.reshape(-1)), bytes(mami.make_key_table(3, 4)))
+        filename = mami_keyfile.key_file_name(3, 4, 'index', 'mami', self.directory.name)
+        self.assertEqual(mami_keyfile.read_header(filename),
+                         {'Pegs': 3, 'Colors': 4, 'Key encoding': 'index', 'Code ordering': 'mami'})
+
+    def test_checks(self):
+        filename = os.path.join(self.directory.name, 'keys.bin')
+        mami_keyfile.write_key_file(filename, 2, 3)
+        self.assertEqual(os.listdir(self.directory.name), ['keys.bin'])
+        with self.assertRaises(ValueError):
+            mami_keyfile.open_key_file(filename, pegs=3)
+        with open(filename, 'r+b') as file:
+            file.truncate(mami_keyfile.HEADER_SIZE + 10)
+        with self.assertRaises(ValueError):
+            mami_keyfile.open_key_file(filename)
+
+    def test_engines(self):
+        """
+        Check that games played with keys from a key file are the same
+        """
+        attempts = vectorizing.play_all_games(3, 3, key_directory=self.directory.name)
+        self.assertTrue((attempts == vectorizing.play_all_games(3, 3)).all())
+        for name in ['table', 'numpy']:
+            engine = mami_engines.get_engine(name, 2, 4, key_directory=self.directory.name)
+            self.assertEqual(mami.find_maximum_number_of_guesses(2, 4, engine=engine),
+                             mami.find_maximum_number_of_guesses(2, 4))
+
+class TestPlayGame(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_hints(self):
+        """
+        Check that the hints typed for are shown, and the game goes on afterwards
+        """
+        inputs = iter(['h', '2', '1', '', 'h', '1', '2', ''])
+        output = io.StringIO()
+        with mock.patch('builtins.input', lambda prompt: next(inputs)), \
+             mock.patch.object(mami_playgame, 'make_code', lambda pegs, colors: [1, 2]), \
+             contextlib.redirect_stdout(output):
+            mami_playgame.game(2, 3, hints=True, tree_directory=self.directory.name)
+        tables = mami_tables.GameTables(2, 3, tree_directory=self.directory.name)
+        self.assertIn("Hint: 9 possible codes left; Knuth's algorithm would guess {}".format(tables.hint([], [])[1]),
+                      output.getvalue())
+        self.assertIn("Hint: {} possible codes left; Knuth's algorithm would guess {}".format(
+                      *tables.hint([[2, 1]], [(0, 2)])), output.getvalue())
+        self.assertIn('Correct!', output.getvalue())
+
+    def test_approximate_hint(self):
+        """
+        Check that a hint found approximately isn't passed off as Knuth's
+        """
+        inputs = iter(['2', '2', '', 'h', '1', '2', ''])
+        output = io.StringIO()
+        with mock.patch('builtins.input', lambda prompt: next(inputs)), \
+             mock.patch.object(mami_playgame, 'make_code', lambda pegs, colors: [1, 2]), \
+             mock.patch.object(mami_tables, 'EXACT_HINT_WORK', 0), mock.patch.object(mami_tables, 'ENGINE_HINT_WORK', 0), \
+             contextlib.redirect_stdout(output):
+            mami_playgame.game(2, 3, hints=True, tree_directory=self.directory.name)
+        self.assertIn("Hint: 4 possible codes left; an approximation of Knuth's algorithm would guess", output.getvalue())
+
+    def test_codebreaker(self):
+        """
+        Check that the computer breaks every code in as many guesses as Knuth's algorithm
+        """
+        pegs, colors = 2, 4
+        full_samplespace = mami.make_full_samplespace(pegs, colors)
+        possible_keys = mami.make_possible_keys(pegs, colors)
+        first_guess = mami.best_guess(full_samplespace, full_samplespace, possible_keys, [])[0]
+        for code in full_samplespace:
+            output = io.StringIO()
+            def answer(prompt):
+                guess = json.loads(output.getvalue().strip().split('\n')[-1].split(': ')[1].split(' (')[0])
+                return str(mami.calculate_key(code, guess)[0 if 'black' in prompt else 1])
+            with mock.patch('builtins.input', answer), contextlib.redirect_stdout(output):
+                guesses = mami_playgame.codebreaker(pegs, colors, self.directory.name)
+            self.assertEqual(guesses, mami.computer_as_codebreaker(code, first_guess, full_samplespace, possible_keys,
+                                                                   pegs, colors))
+
+    def test_inconsistent_keys(self):
+        """
+        Check that the computer gives up when no code gives the keys typed
+        """
+        answers = iter(['0', '0', '0', '0'])
+        with mock.patch('builtins.input', lambda prompt: next(answers)), contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(mami_playgame.codebreaker(1, 2, self.directory.name))
+
+class TestPlanner(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(mami_planner.parse_memory('200M'), 200*2**20)
+        self.assertEqual(mami_planner.parse_memory('1.5gb'), 3*2**29)
+        self.assertEqual(mami_planner.parse_memory('1000'), 1000)
+        with self.assertRaises(ValueError):
+            mami_planner.parse_memory('lots')
+        self.assertEqual(mami_planner.counts_dtype(255), 'uint8')
+        self.assertEqual(mami_planner.counts_dtype(1296), 'uint16')
+        self.assertEqual(mami_planner.counts_dtype(6**8), 'uint32')
+
+    def test_plans(self):
+        """
+        Check that the plans get leaner as the budget shrinks, and always fit if anything does
+        """
+        engines = []
+        for max_memory in [10**9, 10**7, 10**6, 10**3]:
+            plan = mami_planner.make_plan(4, 6, max_memory)
+            self.assertEqual(plan['Fits'], plan['Estimated peak'] <= max_memory)
+            engines.append(plan['Engine'])
+        self.assertEqual(engines, ['in-memory', 'in-memory', 'memmap', 'list'])
+        self.assertGreater(mami_planner.make_plan(4, 6, 10**9)['Block size'],
+                           mami_planner.make_plan(4, 6, 10**7)['Block size'])
+
+    def test_run(self):
+        """
+        Check that all plans play the same games
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            for max_memory, engine in [(10**7, 'in-memory'), (3000, 'memmap'), (1000, 'list')]:
+                plan = mami_planner.make_plan(3, 3, max_memory)
+                self.assertEqual(plan['Engine'], engine)
+                result = mami_planner.run_plan(plan, directory)
+                self.assertEqual(result['Guesses'], mami.find_maximum_number_of_guesses(3, 3)['Guesses'])
+                self.assertGreater(result['Plan']['Measured peak'], 0)
+                self.assertIn('Measured peak', mami_planner.format_plan(result['Plan']))
+
+    def test_estimate(self):
+        """
+        Check that the estimated peak of in-memory plans is close to the measured one
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            for max_memory in [10**7, 10**6]:
+                plan = mami_planner.make_plan(4, 4, max_memory)
+                self.assertEqual(plan['Engine'], 'in-memory')
+                measured = mami_planner.run_plan(plan, directory)['Plan']
+                self.assertLess(abs(measured['Measured peak']/measured['Estimated peak'] - 1), 0.1)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_report(self):
+        """
+        Check the report of a run through all hidden codes, and that mami is restored afterwards
+        """
+        calculate_key = mami.calculate_key
+        with mami_instrumentation.Instrumentation() as instrumentation:
+            result = mami.find_maximum_number_of_guesses(2, 3)
+        self.assertIs(mami.calculate_key, calculate_key)
+        report = instrumentation.report()
+        self.assertTrue(report['calculate_key calls'] > 0)
+        self.assertEqual(len(report['Games']), 9)
+        self.assertEqual(max(game['Guesses'] for game in report['Games']), result['Guesses'])
+        for game in report['Games']:
+            self.assertEqual(len(game['Samplespace sizes']), game['Guesses'])
+            self.assertEqual(game['Samplespace sizes'][-1], 1)
+        self.assertEqual(report['Progress']['Done'], 9)
+
+    def test_progress(self):
+        """
+        Check that resumed runs and runs with an engine or workers are counted in the progress
+        """
+        with mami_instrumentation.Instrumentation() as instrumentation:
+            mami.find_maximum_number_of_guesses(2, 3, done={0: 2, 1: 3, 2: 3})
+        self.assertEqual(instrumentation.progress()['Done'], 6)
+        self.assertEqual(instrumentation.progress()['Total'], 6)
+        for kwargs in [{'engine': 'table'}, {'workers': 2}]:
+            on_done = mock.Mock()
+            with mami_instrumentation.Instrumentation() as instrumentation:
+                result = mami.find_maximum_number_of_guesses(2, 3, on_done=on_done, **kwargs)
+            self.assertEqual((instrumentation.progress()['Done'], instrumentation.progress()['Total']), (9, 9))
+            self.assertEqual(max(game['Guesses'] for game in instrumentation.report()['Games']), result['Guesses'])
+            self.assertTrue(on_done.called)
+
+    def test_progress_message_before_run(self):
+        """
+        Check the progress message before any run through all hidden codes
+        """
+        instrumentation = mami_instrumentation.Instrumentation()
+        self.assertEqual(instrumentation.progress_message(), 'Hidden codes: no run through all hidden codes yet')
+
+    def test_progress_message_without_eta(self):
+        """
+        Check the progress message before any hidden code is played (no ETA yet), and after the run
+        """
+        instrumentation = mami_instrumentation.Instrumentation()
+        instrumentation.sweep_start = (0, 0)
+        instrumentation.total = 9
+        self.assertTrue(instrumentation.progress_message().startswith('Hidden codes: 0/9'))
+        self.assertTrue(instrumentation.progress_message().endswith('ETA: -'))
+        with instrumentation:
+            mami.find_maximum_number_of_guesses(2, 3)
+        self.assertTrue(instrumentation.progress_message().endswith('ETA: 0.0 s'))
+
+class TestSolveAllCodes(unittest.TestCase):
+    def test_same_as_one_at_a_time(self):
+        """
+        Check the histogram and hardest codes against playing the hidden codes one at a time
+        """
+        pegs, colors = 3, 4
+        full_samplespace = mami.make_full_samplespace(pegs, colors)
+        possible_keys = mami.make_possible_keys(pegs, colors)
+        first_guess = mami.best_guess(full_samplespace, full_samplespace, possible_keys, [])[0]
+        all_times = mami.play_games(full_samplespace, first_guess, full_samplespace, possible_keys, pegs, colors)
+        result = mami.solve_all_codes(pegs, colors)
+        self.assertEqual(result['Histogram'], {times: all_times.count(times) for times in set(all_times)})
+        self.assertEqual(result['Guesses'], max(all_times))
+        self.assertAlmostEqual(result['Average'], sum(all_times)/len(all_times))
+        self.assertEqual(result['Hardest codes'],
+                         [code for code, times in zip(full_samplespace, all_times) if times == max(all_times)])
+
+    def test_key_table(self):
+        """
+        Check that solving all codes at once with the key table gives the same result as with lists
+        """
+        self.assertEqual(mami.solve_all_codes(3, 3, key_table=mami.make_key_table(3, 3)), mami.solve_all_codes(3, 3))
+
+class TestApproximate(unittest.TestCase):
+    def test_first_guess_classes(self):
+        for pegs, colors in [(4, 6), (3, 2), (5, 3)]:
+            with self.subTest(pegs=pegs, colors=colors):
+                self.assertEqual(mami_approximate.first_guess_classes(pegs, colors),
+                                 mami.symmetry_classes(mami.make_full_samplespace(pegs, colors), []))
+
+    def test_exact_when_small(self):
+        """
+        Check that the exact best guess is used once the samplespace is small
+        """
+        full_samplespace = mami.make_full_samplespace(3, 4)
+        possible_keys = mami.make_possible_keys(3, 4)
+        guess, report = mami_approximate.best_guess_approximate(full_samplespace, full_samplespace, possible_keys, [])
+        self.assertTrue(report['Exact'])
+        self.assertNotIn('Candidates scored', report) # mami.best_guess doesn't score them all
+        self.assertEqual((guess, report['Max error']),
+                         mami.best_guess(full_samplespace, full_samplespace, possible_keys, []))
+
+    def test_game(self):
+        """
+        Check that a game with (mostly) approximate guesses ends with the hidden code, and the reports
+        """
+        hidden_code = [3, 1, 4, 1]
+        times, reports = mami_approximate.computer_as_codebreaker_approximate(hidden_code, 4, 6, candidates=50,
+                                                                              sample=50, exact_work=1000, seed=0)
+        self.assertEqual(times, len(reports))
+        self.assertFalse(reports[0]['Exact'])
+        for report in reports:
+            self.assertTrue(report['Max error'] + report['Error bound'] >= report['Lower bound'])
+
+    def test_sampling_error(self):
+        """
+        Check that the error bound covers all the candidates scored, and vanishes without sampling
+        """
+        self.assertGreater(mami_approximate.sampling_error(50, 1000, 14, candidates=100),
+                           mami_approximate.sampling_error(50, 1000, 14))
+        self.assertAlmostEqual(mami_approximate.sampling_error(50, 1000, 14, candidates=10),
+                               mami_approximate.sampling_error(50, 1000, 140))
+        self.assertEqual(mami_approximate.sampling_error(1000, 1000, 14, candidates=100), 0)
+
+class TestStrategyTree(unittest.TestCase):
+    def setUp(self):
+        self.pegs = 3
+        self.colors = 3
+        self.full_samplespace = mami.make_full_samplespace(self.pegs, self.colors)
+        self.possible_keys = mami.make_possible_keys(self.pegs, self.colors)
+        self.first_guess = mami.best_guess(self.full_samplespace, self.full_samplespace, self.possible_keys)[0]
+        self.tree = mami.make_strategy_tree(self.pegs, self.colors)
+
+    def test_same_as_search(self):
+        """
+        Check that walking the tree uses as many guesses as searching, for all hidden codes
+        """
+        for code in self.full_samplespace:
+            with self.subTest(code=code):
+                args = (code, self.first_guess, self.full_samplespace, self.possible_keys, self.pegs, self.colors)
+                self.assertEqual(mami.computer_as_codebreaker(*args),
+                                 mami.computer_as_codebreaker(*args, tree=self.tree))
+
+    def test_save_and_load(self):
+        """
+        Check that a tree read from file equals the tree written
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            filename = mami.strategy_tree_filename(self.pegs, self.colors, directory)
+            mami.save_strategy_tree(self.tree, self.pegs, self.colors, filename)
+            self.assertEqual(mami.load_strategy_tree(self.pegs, self.colors, filename), self.tree)
+
 class TestVectorizationTranslations(unittest.TestCase):
     def setUp(self):
         self.vectorized = np.array([[[1, 0], [0, 0], [0, 1]],[[0, 0], [1, 1], [0, 0]]])
@@ -203,6 +844,469 @@ class TestCalculateKey(unittest.TestCase):
 
 
 
+class TestCompactCodes(unittest.TestCase):
+    def setUp(self):
+        self.colors = 4
+        self.pegs = 3
+        self.allcodes = vectorizing.make_possible_codes(self.colors, self.pegs)
+        self.digits = vectorizing.make_possible_digits(self.colors, self.pegs)
+        self.histograms = vectorizing.make_color_histograms(self.digits, self.colors)
+
+    def test_digits(self):
+        """
+        Check that the digits and histograms are the same codes as the one-hot encoded ones
+        """
+        self.assertEqual(self.digits.dtype, np.uint8)
+        self.assertTrue((self.digits == vectorizing.translate_from_vectorization(self.allcodes).reshape(-1, self.pegs)).all())
+        self.assertTrue((self.histograms == np.sum(self.allcodes, axis=2)).all())
+
+    def test_keys(self):
+        """
+        Check the compact key calculation against calculate_key, with blocks not dividing the no. of codes
+        """
+        keys = vectorizing.calculate_key_compact(self.digits, self.digits[:10], self.histograms, self.histograms[:10],
+                                                 block_size=7)
+        self.assertTrue((keys == vectorizing.calculate_key(self.allcodes, self.allcodes[:10])).all())
+        self.assertTrue((vectorizing.make_key_matrix(self.colors, self.pegs)
+                         == vectorizing.calculate_key(self.allcodes, self.allcodes)).all())
+
+class TestPartitionCounts(unittest.TestCase):
+    def setUp(self):
+        self.colors = 4
+        self.pegs = 3
+        allcodes = vectorizing.make_possible_codes(self.colors, self.pegs)
+        self.allkeys = vectorizing.calculate_key(allcodes, allcodes)
+        self.possibilities = np.array([1, 5, 7, 20, 33])
+
+    def test_counts(self):
+        """
+        Check partition counts against counting the keys directly, with blocks not dividing the no. of codes
+        """
+        counts = vectorizing.partition_counts(self.allkeys, self.possibilities, self.pegs, block_size=7)
+        for guess in range(self.colors**self.pegs):
+            for key in range(self.pegs*(self.pegs+1)+1):
+                self.assertEqual(counts[guess, key], np.sum(self.allkeys[self.possibilities, guess] == key))
+
+    def test_max_partitions(self):
+        """
+        Check the max error of all guesses in the full samplespace against max_error
+        """
+        maxerrors = vectorizing.max_partitions(self.allkeys, np.arange(self.colors**self.pegs), self.pegs)
+        self.assertEqual(maxerrors[5], vectorizing.max_error(5, self.colors, self.pegs))
+
+class TestVectorizedPartitionIndex(unittest.TestCase):
+    def test_bitsets(self):
+        """
+        Check that the packed bitsets hold the codes giving each key
+        """
+        colors, pegs = 3, 3
+        allcodes = vectorizing.make_possible_codes(colors, pegs)
+        allkeys = vectorizing.calculate_key(allcodes, allcodes)
+        partition_index = vectorizing.make_partition_index(allkeys, pegs, block_size=5)
+        for guess in [0, 7, 26]:
+            for key in range(pegs*(pegs+1)+1):
+                self.assertTrue((vectorizing.bitset_to_numbers(partition_index[guess, key], colors**pegs)
+                                 == np.where(allkeys[:, guess] == key)[0]).all())
+
+class TestBenchmarkRegressions(unittest.TestCase):
+    def setUp(self):
+        self.baseline = [{'Engine': 'list', 'Pegs': 2, 'Colors': 3, 'Function': 'best_guess', 'Time': 0.5, 'Peak memory': 1000},
+                         {'Engine': 'numpy', 'Pegs': 2, 'Colors': 3, 'Function': 'best_guess', 'Time': 0.001, 'Peak memory': 1000}]
+
+    def test_no_regressions(self):
+        self.assertEqual(mami_benchmark.find_regressions(self.baseline, self.baseline), [])
+
+    def test_regressions(self):
+        """
+        Check that slower times and more memory are flagged, except for times too small to be reliable
+        """
+        records = [dict(record, Time=10*record['Time'], **{'Peak memory': 2000}) for record in self.baseline]
+        regressions = mami_benchmark.find_regressions(records, self.baseline)
+        self.assertEqual([(regression['Engine'], regression['Measurement']) for regression in regressions],
+                         [('list', 'Time'), ('list', 'Peak memory'), ('numpy', 'Peak memory')])
+
+class TestGameTables(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tables = mami_tables.get_tables(3, 3, tree_directory=self.directory.name)
+        self.full_samplespace = mami.make_full_samplespace(3, 3)
+        self.possible_keys = mami.make_possible_keys(3, 3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_shared(self):
+        self.assertIs(mami_tables.get_tables(3, 3, tree_directory=self.directory.name), self.tables)
+
+    def test_hint_on_tree(self):
+        """
+        Check that hints follow the strategy tree, and count the consistent codes
+        """
+        tree = self.tables.tree
+        self.assertEqual(self.tables.hint([], []), (27, tree['guess']))
+        key, child = next(iter(tree['children'].items()))
+        samplespace = mami.update_samplespace(self.full_samplespace, tree['guess'], key)
+        self.assertEqual(self.tables.hint([tree['guess']], [key]), (len(samplespace), child['guess']))
+
+    def test_hint_off_tree(self):
+        """
+        Check that hints after guesses off the tree are the best guesses
+        """
+        guesses = [[0, 1, 2]]
+        keys = [(1, 1)]
+        samplespace = mami.update_samplespace(self.full_samplespace, guesses[0], keys[0])
+        self.assertIsNone(self.tables.tree_node(guesses, keys))
+        self.assertEqual(self.tables.consistent_codes(guesses, keys), samplespace)
+        self.assertEqual(self.tables.hint(guesses, keys),
+                         (len(samplespace), mami.best_guess(samplespace, self.full_samplespace, self.possible_keys, guesses)[0]))
+        self.assertEqual(self.tables.hint(guesses, keys, samplespace), self.tables.hint(guesses, keys))
+
+    def test_inconsistent(self):
+        self.assertEqual(self.tables.hint([[0, 1, 2], [0, 1, 2]], [(3, 0), (0, 0)]), (0, None))
+
+    def test_hint_approximate(self):
+        """
+        Check that approximate hints are flagged, and the same for the same history
+        """
+        guesses = [[0, 1, 2]]
+        keys = [(1, 1)]
+        self.assertTrue(self.tables.hint(guesses, keys, with_exact=True)[2])
+        with mock.patch.object(mami_tables, 'EXACT_HINT_WORK', 0):
+            consistent, guess, exact = self.tables.hint(guesses, keys, with_exact=True)
+            self.assertFalse(exact)
+            self.assertEqual(self.tables.hint(guesses, keys, with_exact=True), (consistent, guess, exact))
+
+class TestGameServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def play(self, *requests):
+        """
+        Returns the server's replies to the requests (dicts)
+        """
+        server = mami_server.GameServer(tree_directory=self.directory.name)
+        async def run():
+            return [await server.respond(json.dumps(request)) for request in requests]
+        return asyncio.run(run())
+
+    def test_game(self):
+        """
+        Check that a game played by hints is solved
+        """
+        server = mami_server.GameServer(tree_directory=self.directory.name)
+        async def run():
+            session = (await server.respond(json.dumps({'command': 'new', 'pegs': 3, 'colors': 3})))['session']
+            solved = False
+            while not solved:
+                hint = await server.respond(json.dumps({'command': 'hint', 'session': session}))
+                reply = await server.respond(json.dumps({'command': 'guess', 'session': session, 'guess': hint['guess']}))
+                solved = reply['solved']
+            return reply, await server.respond(json.dumps({'command': 'end', 'session': session})), hint
+        reply, end, hint = asyncio.run(run())
+        self.assertTrue(hint['exact'])
+        self.assertTrue(reply['guesses'] <= 4)
+        self.assertEqual(end['guesses'], reply['guesses'])
+        self.assertEqual(server.sessions, {})
+
+    def test_errors(self):
+        replies = self.play({'command': 'new', 'pegs': 3, 'colors': 3},
+                            {'command': 'guess', 'session': 1, 'guess': [0, 1, 3]},
+                            {'command': 'hint', 'session': 2},
+                            {'command': 'play'},
+                            {'command': 'new', 'pegs': 8, 'colors': 12},
+                            {'command': 'new', 'pegs': 5, 'colors': 5})
+        self.assertEqual(replies[0], {'session': 1, 'pegs': 3, 'colors': 3})
+        for reply in replies[1:]:
+            self.assertIn('error', reply)
+
+    def test_load_off_tree(self):
+        """
+        Check that the load generator's games with random guesses (hints off the strategy tree) are solved
+        """
+        server = mami_server.GameServer(tree_directory=self.directory.name)
+        async def run():
+            listener = await asyncio.start_server(server.handle_client, '127.0.0.1', 0)
+            async with listener:
+                port = listener.sockets[0].getsockname()[1]
+                return await mami_loadgen.generate_load(3, 2, 3, 3, port=port, random_guesses=2)
+        result = asyncio.run(run())
+        self.assertEqual(result['Games'], 6)
+        self.assertIn('hint', result['Latency'])
+        self.assertTrue(server.requests >= result['Requests'])
+
+    def test_guess_during_hint(self):
+        """
+        Check that a guess made while a hint is being searched for is left for the next hint
+        """
+        server = mami_server.GameServer(tree_directory=self.directory.name)
+        # without a key table, so hints narrow the session's samplespace:
+        tables = mami_tables.GameTables(3, 3, key_table=False, tree_directory=self.directory.name)
+        server.size_tables[(3, 3)] = tables
+        started, proceed = threading.Event(), threading.Event()
+        consistent_codes = tables.consistent_codes
+        def slow_consistent_codes(*args):
+            started.set()
+            proceed.wait()
+            return consistent_codes(*args)
+        async def run():
+            loop = asyncio.get_running_loop()
+            session = (await server.respond(json.dumps({'command': 'new', 'pegs': 3, 'colors': 3})))['session']
+            await server.respond(json.dumps({'command': 'guess', 'session': session, 'guess': [2, 2, 2]}))
+            with mock.patch.object(tables, 'consistent_codes', slow_consistent_codes):
+                hint = asyncio.ensure_future(server.respond(json.dumps({'command': 'hint', 'session': session})))
+                await loop.run_in_executor(None, started.wait)
+                await server.respond(json.dumps({'command': 'guess', 'session': session, 'guess': [0, 1, 2]}))
+                proceed.set()
+                first = await hint
+            second = await server.respond(json.dumps({'command': 'hint', 'session': session}))
+            return server.sessions[session], first, second
+        session, first, second = asyncio.run(run())
+        self.assertEqual(first['consistent'], tables.count_consistent(session['guesses'][:1], session['keys'][:1]))
+        self.assertEqual(second['consistent'], tables.count_consistent(session['guesses'], session['keys']))
+        self.assertEqual(session['narrowed'], 2)
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.chunk_size = mami.CHUNK_SIZE
+        mami.CHUNK_SIZE = 5
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'sweep.jsonl')
+        self.tree_directory = os.path.join(self.directory.name, 'strategy_trees')
+
+    def tearDown(self):
+        mami.CHUNK_SIZE = self.chunk_size
+        self.directory.cleanup()
+
+    def test_checkpoints(self):
+        """
+        Check that find_maximum_number_of_guesses reports every hidden code once and skips those done
+        """
+        reported = {}
+        result = mami.find_maximum_number_of_guesses(3, 3, on_done=lambda codes, times: reported.update(zip(codes, times)))
+        self.assertEqual(sorted(reported), list(range(27)))
+        self.assertEqual(max(reported.values()), result['Guesses'])
+        again = []
+        done = {code: 1 for code in range(20)}
+        mami.find_maximum_number_of_guesses(3, 3, done=done, on_done=lambda codes, times: again.extend(codes))
+        self.assertEqual(again, list(range(20, 27)))
+
+    def test_resume(self):
+        """
+        Check that an interrupted sweep resumes from its checkpoints (and a cut-off line)
+        with the same results as an uninterrupted one
+        """
+        expected = mami_sweep.run_sweep([(2, 3), (3, 3)], os.path.join(self.directory.name, 'full.jsonl'), verbose=False,
+                                        tree_directory=self.tree_directory)
+        class Interruption(Exception):
+            pass
+        mami_sweep.run_sweep([(2, 3)], self.filename, verbose=False, tree_directory=self.tree_directory)
+        original = mami_sweep.append_record
+        calls = []
+        def append_then_interrupt(record, filename):
+            original(record, filename)
+            calls.append(record)
+            if len(calls) == 2:
+                raise Interruption()
+        mami_sweep.append_record = append_then_interrupt
+        try:
+            with self.assertRaises(Interruption):
+                mami_sweep.run_sweep([(2, 3), (3, 3)], self.filename, verbose=False, tree_directory=self.tree_directory)
+        finally:
+            mami_sweep.append_record = original
+        with open(self.filename, 'a') as file:
+            file.write('{"Pegs": 3, "Col')
+        games, checkpoints = mami_sweep.read_sweep(self.filename)
+        self.assertEqual(list(games), [(2, 3, 'knuth')])
+        self.assertEqual(sorted(checkpoints[(3, 3, 'knuth')]), list(range(10)))
+        self.assertEqual(mami_sweep.run_sweep([(2, 3), (3, 3)], self.filename, verbose=False,
+                                              tree_directory=self.tree_directory), expected)
+
+    def test_append_after_cut_off_line(self):
+        """
+        Check that a record appended after a cut-off last line is read back
+        """
+        with open(self.filename, 'w') as file:
+            file.write('{"Pegs": 3, "Col')
+        mami_sweep.append_record({'Pegs': 3, 'Colors': 3, 'Strategy': 'knuth', 'Hidden codes': [0, 1],
+                                  'Guesses': [3, 2]}, self.filename)
+        mami_sweep.append_record({'Pegs': 3, 'Colors': 3, 'Strategy': 'knuth', 'Hidden codes': [2],
+                                  'Guesses': [3]}, self.filename)
+        games, checkpoints = mami_sweep.read_sweep(self.filename)
+        self.assertEqual(checkpoints, {(3, 3, 'knuth'): {0: 3, 1: 2, 2: 3}})
+
+    def test_scheduled(self):
+        """
+        Check that the scheduled sweep (with workers, and resumed from a checkpoint) gives the same as the plain one
+        """
+        sizes = [(2, 3), (3, 3), (2, 4)]
+        expected = mami_sweep.run_sweep(sizes, os.path.join(self.directory.name, 'full.jsonl'), verbose=False,
+                                        tree_directory=self.tree_directory)
+        self.assertEqual(mami_scheduler.run_scheduled_sweep(sizes, self.filename, workers=2, verbose=False,
+                                                            tree_directory=self.tree_directory), expected)
+        filename = os.path.join(self.directory.name, 'resumed.jsonl')
+        mami_sweep.append_record({'Pegs': 3, 'Colors': 3, 'Strategy': 'knuth', 'Hidden codes': [0, 1],
+                                  'Guesses': [3, 3]}, filename)
+        self.assertEqual(mami_scheduler.run_scheduled_sweep(sizes, filename, verbose=False, engine='table'), expected)
+        self.assertEqual(mami_scheduler.run_scheduled_sweep(sizes, os.path.join(self.directory.name, 'table.jsonl'),
+                                                            workers=2, verbose=False, engine='table'), expected)
+
+    def test_plan(self):
+        model = (1e-5, 2.0)
+        jobs = mami_scheduler.plan_jobs([(2, 3), (4, 4), (3, 4)], 2, model, {(3, 4): {0: 3}})
+        self.assertEqual([job['Cost'] for job in jobs], sorted((job['Cost'] for job in jobs), reverse=True))
+        self.assertEqual((jobs[0]['Pegs'], jobs[0]['Colors']), (4, 4))
+        self.assertTrue(len([job for job in jobs if job['Pegs'] == 4]) > 1)
+        played = {}
+        for job in jobs:
+            played.setdefault((job['Pegs'], job['Colors']), []).extend(job['Hidden codes'])
+        self.assertEqual(sorted(played[(4, 4)]), list(range(256)))
+        self.assertEqual(sorted(played[(3, 4)]), list(range(1, 64)))
+
+    def test_cost_model(self):
+        benchmarks = [{'Engine': 'table', 'Pegs': pegs, 'Colors': colors, 'Function': 'find_maximum_number_of_guesses',
+                       'Time': 3e-6*(colors**pegs)**2.2} for pegs, colors in [(2, 4), (3, 4), (4, 4)]]
+        scale, exponent = mami_scheduler.fit_cost_model(benchmarks, 'table')
+        self.assertAlmostEqual(exponent, 2.2)
+        self.assertAlmostEqual(scale, 3e-6)
+        self.assertEqual(mami_scheduler.fit_cost_model(benchmarks, 'list'),
+                         (mami_scheduler.COST_SCALE, mami_scheduler.COST_EXPONENT))
+
+    def test_outputs(self):
+        results = mami_sweep.run_sweep([(2, 2)], self.filename, verbose=False, tree_directory=self.tree_directory)
+        output_file = os.path.join(self.directory.name, 'output.txt')
+        mami_sweep.write_outputs(results, output_file, os.path.join(self.directory.name, 'table.txt'))
+        with open(output_file) as file:
+            self.assertEqual(file.read(), '[{"Possible codes": 4, "Valid keys": 5, "Initial guess": [0, 0], '
+                             '"Max error": 2, "Guesses": 3, "Pegs": 2, "Colors": 2, "Lower bound": 3, "Knuth ok": true}]')
+
+    def test_table(self):
+        self.assertEqual(mami.json_to_mdtable(['Pegs', 'Guesses'], [{'Pegs': 2, 'Guesses': 3}, {'Pegs': 3, 'Guesses': 4}]),
+                         '|Pegs|Guesses|\n|:--:|:--:|\n|2|3|\n|3|4|\n')
+
+class TestCommandLine(unittest.TestCase):
+    def run_cli(self, *argv):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            mami_cli.main(list(argv))
+        return output.getvalue()
+
+    def test_parse_history(self):
+        self.assertEqual(mami_cli.parse_history(['0,0,1,1:1,0', '1,2,3,3:0,2'], 4),
+                         ([[0, 0, 1, 1], [1, 2, 3, 3]], [(1, 0), (0, 2)]))
+        with self.assertRaises(ValueError):
+            mami_cli.parse_history(['0,0,1:1,0'], 4)
+
+    def test_hint(self):
+        """
+        Check that the hint for an empty history is the first guess of the strategy tree
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(self.run_cli('hint', '--pegs', '3', '--colors', '3', '--tree-dir', directory),
+                             'Consistent codes: 27\nNext guess: {}\n'.format(
+                             mami_tables.get_tables(3, 3, tree_directory=directory).tree['guess']))
+
+    def test_solve(self):
+        """
+        Check that the engines agree
+        """
+        results = [json.loads(self.run_cli('solve', '--pegs', '3', '--colors', '3', '--engine', engine))
+                   for engine in mami_cli.ENGINES]
+        for result in results[1:]:
+            self.assertEqual((result['Guesses'], result['Histogram']), (results[0]['Guesses'], results[0]['Histogram']))
+        with contextlib.redirect_stderr(io.StringIO()):
+            result = json.loads(self.run_cli('solve', '--pegs', '3', '--colors', '3', '--max-memory', '1M'))
+        self.assertEqual((result['Guesses'], result['Engine']), (results[0]['Guesses'], 'in-memory'))
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            self.run_cli('solve', '--pegs', '4', '--colors', '6', '--max-memory', '100K')
+
+    def test_no_side_effects(self):
+        """
+        Check that importing the library neither imports NumPy nor runs anything
+        """
+        code = 'import sys, mami, mami_playgame, mami_cli, mami_tables; print("numpy" in sys.modules)'
+        self.assertEqual(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout, 'False\n')
+
+    def test_randomized_without_numpy(self):
+        """
+        Check that the randomized test with the list and table engines doesn't import NumPy
+        """
+        code = ('import sys, mami\n'
+                'for engine in ["list", "table"]:\n'
+                '    mami.test_game_randomized(3, 2, 3, engine=engine)\n'
+                'print("numpy" in sys.modules)')
+        self.assertEqual(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout, 'False\n')
+
+    def test_play_without_numpy(self):
+        """
+        Check that playing with hints or against the computer with the list or table engine doesn't import NumPy
+        """
+        code = ('import sys, io, contextlib; from unittest import mock; import mami_cli, mami_playgame\n'
+                'inputs = iter(["1", "0", "h", "0", "1", ""])\n'
+                'with mock.patch("builtins.input", lambda prompt: next(inputs)), '
+                'mock.patch.object(mami_playgame, "make_code", lambda pegs, colors: [0, 1]), '
+                'contextlib.redirect_stdout(io.StringIO()):\n'
+                '    mami_cli.main(["play", "--computer", "--engine", "list", "--pegs", "1", "--colors", "2"])\n'
+                '    mami_cli.main(["play", "--hints", "--engine", "table", "--pegs", "2", "--colors", "2"])\n'
+                'print("numpy" in sys.modules)')
+        with tempfile.TemporaryDirectory() as directory: # for the strategy trees
+            environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+            self.assertEqual(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                            cwd=directory, env=environment).stdout, 'False\n')
+
+class TestOptimal(unittest.TestCase):
+    def test_bounds(self):
+        self.assertEqual([mami_optimal.max_codes(guesses, 5) for guesses in range(1, 4)], [1, 5, 21])
+        self.assertEqual(mami_optimal.guesses_lower_bound(6, 5), 3)
+        self.assertEqual(mami_optimal.total_lower_bound(7, 5), 1 + 4*2 + 2*3)
+
+    def test_transposition_table(self):
+        table = mami_optimal.TranspositionTable(2)
+        table.put('a', 1)
+        table.put('b', 2)
+        table.get('a')
+        table.put('c', 3) # evicts 'b', the least recently used
+        self.assertEqual((table.get('a'), table.get('b'), table.get('c')), (1, None, 3))
+        self.assertEqual(table.evictions, 1)
+
+    def brute_force(self, pegs, colors):
+        """
+        Returns the smallest max and sum of the numbers of guesses, trying every guess in every state
+        """
+        full_samplespace = mami.make_full_samplespace(pegs, colors)
+        def search(samplespace):
+            if len(samplespace) <= 2:
+                return len(samplespace), 2*len(samplespace) - 1
+            best = (float('inf'), float('inf'))
+            for guess in full_samplespace:
+                parts = {}
+                for code in samplespace:
+                    if code != guess:
+                        parts.setdefault(mami.calculate_key(code, guess), []).append(code)
+                if len(parts) == 1 and len(samplespace) == len(next(iter(parts.values()))):
+                    continue # no information
+                results = [search(part) for part in parts.values()]
+                best = (min(best[0], 1 + max(result[0] for result in results)),
+                        min(best[1], len(samplespace) + sum(result[1] for result in results)))
+            return best
+        return search(full_samplespace)
+
+    def test_same_as_brute_force(self):
+        for pegs, colors in [(2, 3), (3, 2), (2, 4)]:
+            with self.subTest(pegs=pegs, colors=colors):
+                solver = mami_optimal.OptimalSolver(pegs, colors)
+                self.assertEqual((solver.worst_case()['Guesses'], solver.total_guesses(list(range(colors**pegs)))),
+                                 self.brute_force(pegs, colors))
+
+    def test_compare_with_knuth(self):
+        result = mami_optimal.compare_with_knuth(2, 3)
+        self.assertEqual((result['Knuth guesses'], result['Optimal guesses'], result['Knuth optimal']), (4, 3, False))
+        self.assertTrue(result['Optimal average'] < result['Knuth average'])
+
 # class TestVectorizations(unittest.TestCase):
 #     def test_format(self):
 #         test_code = make_code_vect(4, 6)
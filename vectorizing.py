@@ -2,10 +2,8 @@
 © 2021 Sara Arklint sara@arklint.dk
 Vectorized implementation (in NumPy) of Mastermind
 """
-from mami import *
-import numpy as np # for vectorizing
 import time
-starttime = time.time()
+import numpy as np # for vectorizing
 
 # This can be implemented better, but I don't think I'll ever use it
 def make_code_vect(pegs=4, colors=6):
@@ -167,6 +165,54 @@ def make_possible_codes(colors=6, pegs=4):
     return np.fromfunction(lambda n,i,j: i == (n // (colors**j)) % colors,
                            (colors**pegs, colors, pegs), dtype=int)
 
+def make_possible_digits(colors=6, pegs=4):
+    """
+    compact alternative to make_possible_codes
+    returns ndarray shape (colors**pegs, pegs) of uint8 with the color of each peg
+    of every code (numbered as in make_possible_codes)
+    """
+    numbers = np.arange(colors**pegs).reshape(-1, 1)
+    return (numbers // colors**np.arange(pegs) % colors).astype(np.uint8)
+
+def make_color_histograms(digits, colors=6):
+    """
+    input m codes as digits (ndarray shape (m, pegs))
+    returns ndarray shape (m, colors) of uint8 with the no. of pegs of each color
+    (what np.sum(code, axis=1) gives for a one-hot encoded code)
+    """
+    return np.sum(digits.reshape(digits.shape[0], -1, 1) == np.arange(colors), axis=1, dtype=np.uint8)
+
+def calculate_key_compact(codes, guesses, code_histograms, guess_histograms, block_size=256):
+    """
+    compact alternative to calculate_key
+    input m codes and n guesses as digits (ndarrays shape (m, pegs) and (n, pegs))
+    and their color histograms (ndarrays shape (m, colors) and (n, colors))
+    returns ndarray shape (m,n) of uint8 with key
+    when pairing a code with a guess
+    and key encoded as black + white*(pegs+1)
+    the codes are handled block_size at a time to limit the memory used
+    """
+    assert codes.shape[1] == guesses.shape[1]
+    pegs = codes.shape[1]
+    m = codes.shape[0]
+    keys = np.empty((m, guesses.shape[0]), dtype=np.uint8)
+    for start in range(0, m, block_size):
+        stop = min(start + block_size, m)
+        black = np.sum(codes[start:stop].reshape(stop - start, 1, pegs) == guesses, axis=2, dtype=np.uint8)
+        blackwhite = np.sum(np.minimum(code_histograms[start:stop].reshape(stop - start, 1, -1), guess_histograms),
+                            axis=2, dtype=np.uint8)
+        keys[start:stop] = blackwhite*(pegs+1) - black*pegs # which is white*(pegs+1) + black
+    return keys
+
+def make_key_matrix(colors=6, pegs=4, block_size=256):
+    """
+    returns ndarray shape (colors**pegs, colors**pegs) of uint8 with the keys of all pairs of codes
+    (the same as calculate_key(allcodes, allcodes), but using the compact representation)
+    """
+    digits = make_possible_digits(colors, pegs)
+    histograms = make_color_histograms(digits, colors)
+    return calculate_key_compact(digits, digits, histograms, histograms, block_size)
+
 def vectorized_code_to_number(code, colors=6):
     return code_to_number(vectorized_code_to_code(code), colors=colors)
 
@@ -187,6 +233,56 @@ def vectorized_code_to_code(code):
     translation_matrix = np.arange(colors).reshape(colors,1)
     return np.sum(code*translation_matrix, axis=0, keepdims=True).reshape(1,-1)
 
+def partition_counts(allkeys, possibilities, pegs=4, block_size=256, dtype=np.int64):
+    """
+    input allkeys (ndarray shape (n, n) from calculate_key on all codes)
+    input possibilities (ndarray with the numbers of the remaining possible codes)
+    returns ndarray shape (n, pegs*(pegs+1)+1) where entry (g, k) is the no. of
+    possibilities giving key k when paired with guess g
+    the guesses are handled block_size at a time, and for each block all counts are
+    found by one bincount (the keys of guess no. i in the block are offset by i times
+    the no. of keys), so memory use is set by block_size and not by n*n*(no. of keys)
+    the counts are at most n, so a dtype smaller than int64 can hold them (cf. mami_planner)
+    """
+    n = allkeys.shape[1]
+    no_keys = pegs*(pegs+1)+1
+    counts = np.empty((n, no_keys), dtype=dtype)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        keys = allkeys[possibilities, start:stop].T # shape (guesses in block, possibilities)
+        offsets = keys + no_keys*np.arange(stop - start).reshape(-1, 1)
+        counts[start:stop] = np.bincount(offsets.ravel(), minlength=(stop - start)*no_keys).reshape(-1, no_keys)
+    return counts
+
+def max_partitions(allkeys, possibilities, pegs=4, block_size=256, dtype=np.int64):
+    """
+    returns ndarray shape (n,) with the max error of each guess relative to the possibilities
+    (i.e., the size of its largest partition), cf. partition_counts
+    """
+    return np.max(partition_counts(allkeys, possibilities, pegs, block_size, dtype), axis=1)
+
+def make_partition_index(allkeys, pegs=4, block_size=256):
+    """
+    input allkeys (ndarray shape (n, n) from calculate_key on all codes)
+    returns ndarray shape (n, pegs*(pegs+1)+1, ceil(n/8)) of uint8 where entry (g, k) is
+    the set of codes giving key k when paired with guess g, as a bitset packed with np.packbits
+    (built block_size guesses at a time)
+    """
+    n = allkeys.shape[1]
+    no_keys = pegs*(pegs+1)+1
+    partition_index = np.empty((n, no_keys, (n + 7) // 8), dtype=np.uint8)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        in_partition = allkeys[:, start:stop].T.reshape(stop - start, 1, n) == np.arange(no_keys).reshape(1, -1, 1)
+        partition_index[start:stop] = np.packbits(in_partition, axis=2)
+    return partition_index
+
+def bitset_to_numbers(bitset, n):
+    """
+    returns ndarray with the numbers of the codes in a bitset (packed with np.packbits) of n codes
+    """
+    return np.flatnonzero(np.unpackbits(bitset, count=n))
+
 def max_error(number, colors=6, pegs=4):
     assert number < colors**pegs
     allcodes = make_possible_codes(colors, pegs)
@@ -209,21 +305,17 @@ def max_error(number, colors=6, pegs=4):
 # print(translate_from_vectorization(guess))
 # print(calculate_key_vect(code, guess))
 
-if __name__ == '__main__':
-
-    # let's play a game...
-    print("let's play a game")
-    colors = 6
-    pegs = 4
-    # hiddencode = 441
-    allcodes = make_possible_codes(colors, pegs)
-    allkeys = calculate_key(allcodes, allcodes)
-    allkeys_multidim = np.fromfunction(lambda n,m,i: i == allkeys[n,m],
-                                       (colors**pegs, colors**pegs, pegs*(pegs+1)+1), dtype=int)
-    maximalguesses = 0
-    firstguess = np.argmin(np.max(np.sum(allkeys_multidim, axis=1), axis=1))
-    verbose = False
-    for hiddencode in range(colors**pegs):
+def play_games(hiddencodes, allkeys, partition_index, firstguess, colors=6, pegs=4, block_size=256, verbose=False,
+               counts_dtype=np.int64):
+    """
+    plays Knuth's algorithm against each of the hidden codes (numbers), given the key matrix,
+    the partition index, and the first guess
+    without a partition index (None), the possibilities are narrowed with the row of the guess
+    in the key matrix (keys are symmetric), which reads n bytes instead of keeping n*n*(no. of keys)/8
+    returns ndarray with the no. of guesses used for each hidden code
+    """
+    attempts = np.zeros(len(hiddencodes), dtype=int)
+    for index, hiddencode in enumerate(hiddencodes):
         if verbose:
             print("\nhidden code:", vectorized_code_to_code(number_to_vectorized_code(hiddencode, colors, pegs)))
         attempt = 1
@@ -231,8 +323,12 @@ if __name__ == '__main__':
             print("guess no. {}: {}".format(attempt, vectorized_code_to_code(number_to_vectorized_code(firstguess, colors, pegs))))
         key = allkeys[hiddencode, firstguess]
         if verbose:
-            print("key no. {}: {}".format(attempt, recover_key(key)))
-        possibilities = np.where(allkeys[:,firstguess] == key)[0]
+            print("key no. {}: {}".format(attempt, recover_key(key, pegs)))
+        if partition_index is not None:
+            possible = partition_index[firstguess, key] # bitset of possibilities
+            possibilities = bitset_to_numbers(possible, colors**pegs)
+        else:
+            possibilities = np.flatnonzero(allkeys[firstguess] == key)
         while key != pegs:
             attempt += 1
             if verbose:
@@ -240,10 +336,8 @@ if __name__ == '__main__':
             if len(possibilities) <= 2:
                 guess = possibilities[0]
             else:
-                ixgrid = np.ix_(range(colors**pegs), possibilities, range(pegs*(pegs+1)+1)) # for restricting allkeys to possibilities
                 ixgrid_onedim = np.ix_(possibilities) # for restricting maxerrors to possibilities
-                errors = np.sum(allkeys_multidim[ixgrid], axis=1)
-                maxerrors = np.max(errors, axis=1)
+                maxerrors = max_partitions(allkeys, possibilities, pegs, block_size, counts_dtype)
                 guess = np.argmin(maxerrors) # first guess realizing min max error
                 guess_poss = ixgrid_onedim[0][np.argmin(maxerrors[ixgrid_onedim])] # first guess realizing smallest max error amongst possibilities
                 if maxerrors[guess] == maxerrors[guess_poss]: # check if the guess amongst possibilities realizes the min max error
@@ -256,13 +350,85 @@ if __name__ == '__main__':
                 print("guess no. {}: {}".format(attempt, vectorized_code_to_code(number_to_vectorized_code(guess, colors, pegs))))
             key = allkeys[hiddencode, guess]
             if verbose:
-                print("key no. {}: {}".format(attempt, recover_key(key)))
-            possibilities = np.intersect1d(possibilities, np.where(allkeys[:,guess] == key)[0])
+                print("key no. {}: {}".format(attempt, recover_key(key, pegs)))
+            if partition_index is not None:
+                possible = possible & partition_index[guess, key]
+                possibilities = bitset_to_numbers(possible, colors**pegs)
+            else:
+                possibilities = possibilities[allkeys[guess][possibilities] == key]
         if verbose:
             print("guessed in {} attempts".format(attempt))
-        if attempt > maximalguesses:
-            maximalguesses = attempt
-        # if hiddencode % colors**2 == 0:
-        #     print(hiddencode, attempt)
-    print('maximal guesses: {}'.format(maximalguesses))
+        attempts[index] = attempt
+    return attempts
+
+# the key matrix and partition index (views of shared memory) and the rest of what play_games needs, set in each worker:
+_worker_game = None
+
+def _init_worker(allkeys, partition_index, *game):
+    global _worker_game
+    import mami_shared
+    if isinstance(allkeys, str): # a key file (cf. mami_keyfile), shared through the page cache
+        import mami_keyfile
+        allkeys = mami_keyfile.open_key_file(allkeys)
+    else:
+        allkeys = mami_shared.attach(allkeys)
+    if partition_index is not None:
+        partition_index = mami_shared.attach(partition_index)
+    _worker_game = (allkeys, partition_index) + game
+
+def _play_games_in_worker(hiddencodes):
+    return play_games(hiddencodes, *_worker_game)
+
+def play_all_games(colors=6, pegs=4, block_size=256, verbose=False, workers=None, key_directory=None,
+                   use_partition_index=True, counts_dtype=np.int64):
+    """
+    plays Knuth's algorithm against every hidden code
+    (scoring guesses block_size at a time, cf. partition_counts)
+    with workers > 1, the hidden codes are split between that many processes, and the key matrix
+    and partition index are built once and shared with them (cf. mami_shared), so there's
+    one copy of them however many workers there are
+    if key_directory is given, the key matrix is memory-mapped from a key file there (cf. mami_keyfile),
+    which is written the first time, instead of being computed, and the workers map the same file
+    with use_partition_index=False, the possibilities are narrowed with the key matrix instead
+    (cf. play_games), and counts_dtype is the dtype of the partition counts (cf. partition_counts),
+    which mami_planner.py chooses to stay within a memory budget
+    returns ndarray shape (colors**pegs,) with the no. of guesses used for each hidden code
+    """
+    key_file = None
+    if key_directory is not None:
+        import mami_keyfile
+        allkeys = mami_keyfile.load_key_file(pegs, colors, directory=key_directory, block_size=block_size)
+        key_file = allkeys.filename
+    else:
+        allkeys = make_key_matrix(colors, pegs, block_size)
+    partition_index = make_partition_index(allkeys, pegs, block_size) if use_partition_index else None
+    firstguess = np.argmin(max_partitions(allkeys, np.arange(colors**pegs), pegs, block_size, counts_dtype))
+    hiddencodes = np.arange(colors**pegs)
+    if workers is None or workers <= 1:
+        return play_games(hiddencodes, allkeys, partition_index, firstguess, colors, pegs, block_size, verbose,
+                          counts_dtype)
+    import contextlib
+    from concurrent.futures import ProcessPoolExecutor
+    import mami_shared
+    chunks = np.array_split(hiddencodes, min(len(hiddencodes), 8*workers))
+    with contextlib.ExitStack() as stack:
+        shared_index = stack.enter_context(mami_shared.SharedTable(partition_index)).descriptor() \
+            if partition_index is not None else None
+        # the workers map the key file themselves, or attach to a shared copy of the key matrix:
+        shared_keys = key_file if key_file is not None else stack.enter_context(mami_shared.SharedTable(allkeys)).descriptor()
+        del allkeys, partition_index # the shared copies are the ones used from here
+        initargs = (shared_keys, shared_index, firstguess, colors, pegs, block_size, False, counts_dtype)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as executor:
+            return np.concatenate(list(executor.map(_play_games_in_worker, chunks)))
+
+if __name__ == '__main__':
+    starttime = time.time()
+
+    # let's play a game...
+    print("let's play a game")
+    colors = 6
+    pegs = 4
+    # hiddencode = 441
+    attempts = play_all_games(colors, pegs)
+    print('maximal guesses: {}'.format(np.max(attempts)))
     print("Runtime (in seconds): {}".format(time.time() - starttime))